@@ -0,0 +1,72 @@
+"""Benchmarks the storage backends at different store sizes.
+
+For each backend and size, times opening the store and looking up one
+key, and updating one key in place. Run from the repository root with:
+
+    python -m benchmarks.backends [--keys N ...] [--updates N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from src.landscape_mini_client.storage import open_storage
+
+
+BACKENDS = {
+    "pickle": "pickle:{}/storage.pickle",
+    "log": "log:{}/storage.log",
+    "sqlite": "sqlite:{}/storage.sqlite",
+}
+
+
+def populate(storage, keys: int):
+    with storage.transaction():
+        for i in range(keys):
+            storage[f"key-{i}"] = {"secure_id": f"{i:032x}", "next_seq": i}
+
+
+def bench(backend: str, keys: int, updates: int):
+    with tempfile.TemporaryDirectory() as directory:
+        spec = BACKENDS[backend].format(directory)
+        populate(open_storage(spec), keys)
+
+        start = time.perf_counter()
+        for i in range(updates):
+            open_storage(spec)[f"key-{i % keys}"]
+        lookup = (time.perf_counter() - start) / updates
+
+        storage = open_storage(spec)
+        start = time.perf_counter()
+        for i in range(updates):
+            storage[f"key-{i % keys}"] = {"secure_id": "updated", "next_seq": i}
+        update = (time.perf_counter() - start) / updates
+
+        size = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)
+        )
+
+    print(
+        f"{backend:>7} {keys:7} keys: open+lookup {lookup * 1000:8.3f} ms, "
+        f"update {update * 1000:8.3f} ms, {size / 1024:9.1f} KiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 1000, 100000])
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    args = parser.parse_args()
+
+    for keys in args.keys:
+        for backend in args.backends:
+            bench(backend, keys, args.updates)
+
+
+if __name__ == "__main__":
+    main()
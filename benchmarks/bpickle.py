@@ -0,0 +1,166 @@
+"""Benchmarks bpickle encoding and decoding of large message batches.
+
+Run from the repository root with:
+
+    python -m benchmarks.bpickle [--messages N] [--repeat N] [--fuzz N]
+
+With --fuzz, also checks N random payloads against the recursive
+implementation in `benchmarks.bpickle_reference`, and compares the speed
+and nesting limits of the two.
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from src.landscape_mini_client.util import bpickle
+
+from . import bpickle_reference
+
+
+def make_payload(messages: int) -> dict:
+    """Builds an exchange payload shaped like a large server response."""
+    return {
+        "server-uuid": "c47a2d3e-5c53-4a2b-9e5c-3d7e8f9a0b1c",
+        "next-expected-sequence": 1234,
+        "next-exchange-token": "9f2c1e58-6b7d-4a7e-8c3b-2e1f0d9c8b7a",
+        "messages": [
+            {
+                "type": "package-ids",
+                "request-id": i,
+                "operation-id": i * 7,
+                "hostname": f"computer-{i}.example.com",
+                "ids": list(range(i % 50)),
+                "hashes": [f"{i:08x}{j:08x}" for j in range(10)],
+                "info": {"release": "22.04", "arch": "amd64", "cores": 8},
+            }
+            for i in range(messages)
+        ],
+    }
+
+
+def bench(messages: int, repeat: int):
+    payload = make_payload(messages)
+    encoded = bpickle.dumps(payload)
+
+    dumps_time = min(
+        timeit.repeat(lambda: bpickle.dumps(payload), number=1, repeat=repeat)
+    )
+    loads_time = min(
+        timeit.repeat(lambda: bpickle.loads(encoded), number=1, repeat=repeat)
+    )
+
+    stream_time = min(timeit.repeat(lambda: stream(encoded), number=1, repeat=repeat))
+    first_time = min(
+        timeit.repeat(lambda: stream(encoded, first=True), number=1, repeat=repeat)
+    )
+
+    size = len(encoded) / 1024 / 1024
+    print(f"{messages} messages, {size:.2f} MiB encoded")
+    print(f"  dumps: {dumps_time * 1000:8.1f} ms  ({size / dumps_time:6.1f} MiB/s)")
+    print(f"  loads: {loads_time * 1000:8.1f} ms  ({size / loads_time:6.1f} MiB/s)")
+    print(f"  stream: {stream_time * 1000:7.1f} ms  ({size / stream_time:6.1f} MiB/s)")
+    print(f"  first message: {first_time * 1000:5.1f} ms")
+
+
+def stream(encoded: bytes, chunk_size: int = 65536, first: bool = False):
+    """Feeds `encoded` to a StreamDecoder as if received in chunks,
+    stopping at the first completed message if `first` is set.
+    """
+    decoder = bpickle.StreamDecoder(keep_messages=False)
+
+    for start in range(0, len(encoded), chunk_size):
+        if decoder.feed(encoded[start : start + chunk_size]) and first:
+            return
+
+
+def random_payload(rng: random.Random, depth: int = 0):
+    """Returns a random value of the types both implementations support."""
+    kind = rng.choice(["dict", "list", "str", "int"] if depth < 6 else ["str", "int"])
+    size = rng.randrange(8)
+
+    if kind == "dict":
+        return {str(rng.random()): random_payload(rng, depth + 1) for _ in range(size)}
+    if kind == "list":
+        return [random_payload(rng, depth + 1) for _ in range(size)]
+    if kind == "str":
+        return "".join(chr(rng.randrange(1, 0x3000)) for _ in range(size))
+
+    return rng.randrange(-(2**40), 2**40)
+
+
+def fuzz(count: int, repeat: int):
+    rng = random.Random(0)
+    payloads = [random_payload(rng) for _ in range(count)]
+    encoded = [bpickle.dumps(payload) for payload in payloads]
+
+    for payload, data in zip(payloads, encoded):
+        if data != bpickle_reference.dumps(payload):
+            sys.exit(f"Encodings differ for {payload!r}")
+        if bpickle.loads(data) != (payload, len(data)):
+            sys.exit(f"Round trip failed for {payload!r}")
+
+    size = sum(map(len, encoded)) / 1024 / 1024
+    print(f"{count} random payloads, {size:.2f} MiB encoded, all identical")
+
+    for name, module in (("recursive", bpickle_reference), ("stack", bpickle)):
+        dumps_time = min(
+            timeit.repeat(
+                lambda: list(map(module.dumps, payloads)), number=1, repeat=repeat
+            )
+        )
+        loads_time = min(
+            timeit.repeat(
+                lambda: list(map(module.loads, encoded)), number=1, repeat=repeat
+            )
+        )
+        print(
+            f"  {name:>9}: dumps {dumps_time * 1000:7.1f} ms, "
+            f"loads {loads_time * 1000:7.1f} ms"
+        )
+
+    for name, module in (("recursive", bpickle_reference), ("stack", bpickle)):
+        print(f"  {name:>9}: max depth {max_depth(module)}")
+
+
+def max_depth(module, limit: int = 1000000) -> str:
+    """Returns the deepest list nesting, up to `limit`, that `module` can
+    round-trip.
+    """
+    depth = 1
+    while depth <= limit:
+        try:
+            module.loads(b"l" * depth + b";" * depth)
+            module.dumps(nested(depth))
+        except RecursionError:
+            return f"< {depth}"
+        depth *= 10
+
+    return f">= {limit}"
+
+
+def nested(depth: int) -> list:
+    payload: list = []
+    for _ in range(depth - 1):
+        payload = [payload]
+
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=0)
+    args = parser.parse_args()
+
+    for messages in args.messages:
+        bench(messages, args.repeat)
+
+    if args.fuzz:
+        fuzz(args.fuzz, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
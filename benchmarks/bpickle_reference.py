@@ -0,0 +1,187 @@
+"""The recursive bpickle implementation that `util.bpickle` replaced,
+kept as the baseline that `benchmarks.bpickle --fuzz` compares against.
+"""
+
+from typing import Any, Callable, Dict, List, Mapping, Tuple, Union
+
+
+DICT = b"d"
+LIST = b"l"
+END = b";"
+
+_DICT_CODE = ord("d")
+_LIST_CODE = ord("l")
+_END_CODE = ord(";")
+
+
+def dumps(payload: Union[dict, list, str, int]) -> bytes:
+    out = bytearray()
+    _dump(payload, out)
+
+    return bytes(out)
+
+
+def _dump(payload: Any, out: bytearray) -> None:
+    try:
+        encoder = _ENCODERS[type(payload)]
+    except KeyError:
+        encoder = _find_encoder(type(payload))
+
+    encoder(payload, out)
+
+
+def _dump_dict(payload: Mapping[str, Any], out: bytearray) -> None:
+    out += DICT
+
+    for k, v in payload.items():
+        _dump(k, out)
+        _dump(v, out)
+
+    out += END
+
+
+def _dump_list(payload: List[Any], out: bytearray) -> None:
+    out += LIST
+
+    for v in payload:
+        _dump(v, out)
+
+    out += END
+
+
+def _dump_str(payload: str, out: bytearray) -> None:
+    encoded = payload.encode()
+    out += b"u%d:%b" % (len(encoded), encoded)
+
+
+def _dump_bytes(payload: bytes, out: bytearray) -> None:
+    out += b"b%d:%b" % (len(payload), payload)
+
+
+def _dump_int(payload: int, out: bytearray) -> None:
+    out += b"i%d;" % payload
+
+
+_ENCODERS: Dict[type, Callable[[Any, bytearray], None]] = {
+    dict: _dump_dict,
+    list: _dump_list,
+    str: _dump_str,
+    bytes: _dump_bytes,
+    int: _dump_int,
+    bool: _dump_int,
+}
+
+
+def _find_encoder(cls: type) -> Callable[[Any, bytearray], None]:
+    """Finds, and caches, the encoder for a subclass of a supported type."""
+    for base in (dict, list, str, bytes, int):
+        if issubclass(cls, base):
+            _ENCODERS[cls] = _ENCODERS[base]
+            return _ENCODERS[base]
+
+    raise ValueError(f"Can't bpickle objects of type {cls.__name__}")
+
+
+def loads(payload: bytes) -> Tuple[Union[dict, list, str, int], int]:
+    """Decodes the value at the start of `payload`.
+
+    Returns the value and the number of bytes it was encoded in.
+    """
+    data, view = _buffers(payload)
+
+    return _load(data, view, 0)
+
+
+def loads_dict(payload: bytes) -> Tuple[dict, int]:
+    return _load_dict(*_buffers(payload), 0)
+
+
+def loads_list(payload: bytes) -> Tuple[list, int]:
+    return _load_list(*_buffers(payload), 0)
+
+
+def _buffers(payload: bytes) -> Tuple[bytes, memoryview]:
+    """Returns `payload` as bytes, for searching, and a memoryview over it,
+    for slicing without copying.
+    """
+    if not isinstance(payload, bytes):
+        payload = bytes(payload)
+
+    return payload, memoryview(payload)
+
+
+# The decoders below all take the payload as bytes and as a memoryview,
+# plus the offset of the value to decode, and return the decoded value and
+# the offset just past it.
+
+
+def _load(data: bytes, view: memoryview, pos: int) -> Tuple[Any, int]:
+    try:
+        decoder = _DECODERS[data[pos]]
+    except KeyError:
+        raise ValueError(f"Unknown bpickle typecode {data[pos:pos + 1]!r} at {pos}")
+
+    return decoder(data, view, pos)
+
+
+def _load_dict(data: bytes, view: memoryview, pos: int) -> Tuple[dict, int]:
+    pos += 1
+    result = {}
+
+    while data[pos] != _END_CODE:
+        key, pos = _load(data, view, pos)
+        value, pos = _load(data, view, pos)
+
+        result[key] = value
+
+    return result, pos + 1
+
+
+def _load_list(data: bytes, view: memoryview, pos: int) -> Tuple[list, int]:
+    pos += 1
+    result = []
+
+    while data[pos] != _END_CODE:
+        value, pos = _load(data, view, pos)
+
+        result.append(value)
+
+    return result, pos + 1
+
+
+def _load_unicode(data: bytes, view: memoryview, pos: int) -> Tuple[str, int]:
+    colon = data.index(b":", pos + 1)
+    end = colon + 1 + int(data[pos + 1 : colon])
+
+    return str(view[colon + 1 : end], "utf-8"), end
+
+
+def _load_bytes(data: bytes, view: memoryview, pos: int) -> Tuple[bytes, int]:
+    colon = data.index(b":", pos + 1)
+    end = colon + 1 + int(data[pos + 1 : colon])
+
+    return bytes(view[colon + 1 : end]), end
+
+
+def _load_bool(data: bytes, view: memoryview, pos: int) -> Tuple[bool, int]:
+    end = pos + 1
+    while data[end : end + 1].isdigit():
+        end += 1
+
+    return bool(int(data[pos + 1 : end])), end
+
+
+def _load_int(data: bytes, view: memoryview, pos: int) -> Tuple[int, int]:
+    end = data.index(b";", pos + 1)
+
+    return int(data[pos + 1 : end]), end + 1
+
+
+_DECODERS: Dict[int, Callable[[bytes, memoryview, int], Tuple[Any, int]]] = {
+    _DICT_CODE: _load_dict,
+    _LIST_CODE: _load_list,
+    ord("u"): _load_unicode,
+    ord("s"): _load_bytes,
+    ord("b"): _load_bool,
+    ord("i"): _load_int,
+}
@@ -0,0 +1,74 @@
+"""Benchmarks the client's exchanges and pings against the mock server.
+
+A client is registered with a `MockServer` running in the same process,
+then sends `--requests` exchanges, each of `--messages` messages, and as
+many pings, one at a time over a kept-alive connection. The throughput
+and latency percentiles of each are reported. Run from the repository
+root with:
+
+    python -m benchmarks.exchange [--requests N] [--messages N]
+        [--latency SECONDS] [--payload-size BYTES]
+"""
+
+import argparse
+import time
+
+from src.landscape_mini_client.messages import MessageClient
+from src.landscape_mini_client.util.mockserver import Faults, MockServer, running
+from src.landscape_mini_client.util.stats import LatencyHistogram
+
+
+def bench(name: str, requests: int, send) -> None:
+    latencies = LatencyHistogram()
+
+    start = time.perf_counter()
+    for i in range(requests):
+        sent = time.perf_counter()
+        status, _ = send(i)
+        latencies.record(time.perf_counter() - sent)
+        assert status == 200, status
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>9}: {requests / elapsed:7.0f} requests/s, {latencies.describe()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--payload-size", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockServer(Faults(latency=args.latency, payload_size=args.payload_size))
+    messages = [{"type": "test", "data": "x" * 100}] * args.messages
+
+    with running(server) as port, MessageClient() as client:
+        url = f"http://localhost:{port}"
+        _, payload = client.send_message(
+            f"{url}/message-system",
+            {"messages": [{"type": "register", "computer_title": "benchmark"}]},
+        )
+        secure_id = payload["messages"][0]["id"].decode()
+        insecure_id = payload["messages"][0]["insecure-id"]
+
+        bench(
+            "exchange",
+            args.requests,
+            lambda i: client.send_message(
+                f"{url}/message-system",
+                {"sequence": i * args.messages, "messages": messages},
+                secure_id=secure_id,
+            ),
+        )
+        bench(
+            "ping",
+            args.requests,
+            lambda _: client.get(f"{url}/ping?insecure_id={insecure_id}"),
+        )
+
+    print(server.stats.describe())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmarks the memory and serialization cost of client identities.
+
+Compares the dictionaries clients used to be stored as, a registration
+info dictionary plus loose sequence and token keys, against `Identity`
+records and their packed form.
+
+Run from the repository root with:
+
+    python -m benchmarks.identity [--clients N]
+"""
+
+import argparse
+import gc
+import pickle
+import timeit
+import tracemalloc
+
+from src.landscape_mini_client.identity import Identity
+
+
+SERVER_HOST = "landscape.example.com"
+SERVER_UUID = "c47a2d3e-5c53-4a2b-9e5c-3d7e8f9a0b1c"
+
+
+def as_dict(i: int) -> dict:
+    return {
+        "registration_info": {
+            "server_host": SERVER_HOST,
+            "server_port": "",
+            "server_uuid": SERVER_UUID,
+            "secure_id": f"{i:032x}",
+            "insecure_id": i,
+        },
+        "next_seq": i % 1000,
+        "next_tok": f"token-{i:026x}",
+    }
+
+
+def as_identity(i: int) -> Identity:
+    return Identity(
+        f"{i:032x}",
+        i,
+        server_host=SERVER_HOST,
+        server_uuid=SERVER_UUID,
+        next_seq=i % 1000,
+        next_tok=f"token-{i:026x}",
+    )
+
+
+def as_packed(i: int) -> bytes:
+    return as_identity(i).pack()
+
+
+def measure(build, clients: int) -> float:
+    """Returns the bytes allocated per client to hold `clients` of them."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    held = [build(i) for i in range(clients)]
+
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+
+    return (after - before) / clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"Memory held per client, over {args.clients} clients:")
+    baseline = None
+    for name, build in (
+        ("dict", as_dict),
+        ("Identity", as_identity),
+        ("packed", as_packed),
+    ):
+        per_client = measure(build, args.clients)
+        baseline = baseline or per_client
+        print(
+            f"  {name:>8}: {per_client:7.1f} bytes "
+            f"({per_client / baseline:.0%} of dict)"
+        )
+
+    record = as_dict(12345)
+    identity = as_identity(12345)
+    print("Stored size per client:")
+    print(f"  {'pickle':>8}: {len(pickle.dumps(record))} bytes")
+    print(f"  {'pack':>8}: {len(identity.pack())} bytes")
+
+    print(f"Serialization time per client, over {args.number} round trips:")
+    for name, func in (
+        ("pickle", lambda: pickle.loads(pickle.dumps(record))),
+        ("pack", lambda: Identity.unpack(identity.pack())),
+    ):
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"  {name:>8}: {seconds / args.number * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
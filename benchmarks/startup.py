@@ -0,0 +1,101 @@
+"""Benchmarks the cold-start time of each command.
+
+Each command is started with '--help', which loads it and every module it
+imports without sending anything, in a fresh interpreter. The wall time
+is the best of `--repeat` runs, and the import time is as reported by
+'python -X importtime', along with the modules that took longest.
+
+Run from the repository root with:
+
+    python -m benchmarks.startup [--repeat N] [--top N] [COMMAND ...]
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from src.landscape_mini_client.__main__ import COMMANDS
+
+
+MAIN = "src.landscape_mini_client"
+
+
+def command_line(command: str) -> List[str]:
+    if command:
+        return [sys.executable, "-m", MAIN, command, "--help"]
+
+    return [sys.executable, "-m", MAIN, "--help"]
+
+
+def wall_time(args: List[str], repeat: int) -> float:
+    """Returns the shortest time `args` took to run, of `repeat` runs."""
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, capture_output=True, check=True)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def import_times(args: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Returns the self and cumulative import time, in microseconds, of
+    each module imported running `args`.
+    """
+    result = subprocess.run(
+        [args[0], "-X", "importtime"] + args[1:],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        # Modules are indented by how deeply they were imported.
+        times[module[1:].rstrip()] = int(self_us), int(cumulative_us)
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("commands", nargs="*")
+    args = parser.parse_args()
+
+    commands = args.commands or [""] + [
+        name for group in COMMANDS.values() for name, _, _ in group
+    ]
+
+    interpreter = wall_time([sys.executable, "-c", "pass"], args.repeat)
+    print(f"{'(interpreter)':>16}: {interpreter * 1000:6.1f} ms")
+
+    for command in commands:
+        line = command_line(command)
+        seconds = wall_time(line, args.repeat)
+        times = import_times(line)
+        imported = sum(self_us for self_us, _ in times.values())
+        slowest = sorted(times.items(), key=lambda item: -item[1][1])
+        # Only report top-level imports, not the modules they import.
+        slowest = [
+            f"{module} {cumulative / 1000:.1f}"
+            for module, (_, cumulative) in slowest
+            if not module.startswith(" ")
+        ][: args.top]
+
+        print(
+            f"{command or '(help)':>16}: {seconds * 1000:6.1f} ms, "
+            f"imports {imported / 1000:5.1f} ms ({', '.join(slowest)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
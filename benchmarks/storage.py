@@ -0,0 +1,64 @@
+"""Benchmarks ClientStorage transactions under multi-process contention.
+
+Each process increments a shared counter in its own transactions, as
+concurrent `ping --increment-id` runs do. Run from the repository root
+with:
+
+    python -m benchmarks.storage [--processes N ...] [--increments N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from src.landscape_mini_client.storage import ClientStorage
+
+
+def increment(loc: str, increments: int):
+    storage = ClientStorage(loc)
+
+    for _ in range(increments):
+        with storage.transaction():
+            storage["last_id"] += 1
+
+
+def bench(processes: int, increments: int):
+    with tempfile.TemporaryDirectory() as directory:
+        loc = os.path.join(directory, "storage.pickle")
+        ClientStorage(loc)["last_id"] = 0
+
+        workers = [
+            multiprocessing.Process(target=increment, args=(loc, increments))
+            for _ in range(processes)
+        ]
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        expected = processes * increments
+        lost = expected - ClientStorage(loc)["last_id"]
+
+    print(
+        f"{processes:3} processes: {expected / elapsed:8.1f} transactions/s, "
+        f"{lost} lost updates"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--increments", type=int, default=500)
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        bench(processes, args.increments)
+
+
+if __name__ == "__main__":
+    main()
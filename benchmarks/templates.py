@@ -0,0 +1,65 @@
+"""Benchmarks rendering message templates against encoding each message.
+
+Run from the repository root with:
+
+    python -m benchmarks.templates [--number N]
+"""
+
+import argparse
+import time
+import timeit
+
+from src.landscape_mini_client.util import bpickle
+from src.landscape_mini_client.util.templates import Slot, TemplateCache
+
+
+def make_message(hostname, timestamp, sequence) -> dict:
+    """Builds an exchange shaped like one a simulated client sends."""
+    return {
+        "server-uuid": "c47a2d3e-5c53-4a2b-9e5c-3d7e8f9a0b1c",
+        "sequence": sequence,
+        "accepted-types": "0123456789abcdef",
+        "messages": [
+            {
+                "type": "register",
+                "hostname": hostname,
+                "account_name": "standalone",
+                "computer_title": "simulated",
+                "registration_password": "",
+                "tags": "fleet,simulated",
+                "container-info": "",
+                "vm-info": "kvm",
+                "timestamp": timestamp,
+                "api": "3.3",
+            }
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    cache = TemplateCache()
+    template_message = make_message(Slot("hostname"), Slot("timestamp"), Slot("seq"))
+
+    def dumps():
+        bpickle.dumps(make_message("computer-1", int(time.time()), 42))
+
+    def render():
+        cache.render(
+            "register",
+            lambda: template_message,
+            hostname="computer-1",
+            timestamp=int(time.time()),
+            seq=42,
+        )
+
+    for name, func in (("dumps", dumps), ("template", render)):
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"{name:>8}: {seconds / args.number * 1e6:6.2f} us per message")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,75 @@ from craft_cli import (
     emit,
 )
 
-from .commands.ping import PingCommand
-from .commands.pingspam import PingspamCommand
-from .commands.register import RegisterCommand
-from .commands.send_message import SendMessageCommand
-from .commands.storage import ClearStorageCommand
+from .commands.lazy import lazy_command
+
+
+# Commands by group, each as its name, help message and "module:Class",
+# imported only once the command is run or its help is shown.
+COMMANDS = {
+    "Register": [
+        (
+            "register",
+            "Register with a Landscape Server instance.",
+            ".register:RegisterCommand",
+        ),
+    ],
+    "Exchange": [
+        (
+            "ping",
+            "Pings the Landscape Server instance to which this client is "
+            "registered.",
+            ".ping:PingCommand",
+        ),
+        (
+            "send_message",
+            "Send an arbitrary message to a Landscape Server instance.",
+            ".send_message:SendMessageCommand",
+        ),
+        (
+            "pingspam",
+            "Pings the Landscape Server instance(s) as quickly as possible with"
+            "insecure ID values drawn from a pool.",
+            ".pingspam:PingspamCommand",
+        ),
+        (
+            "run",
+            "Ping and exchange messages with the Landscape Server instance.",
+            ".run:RunCommand",
+        ),
+    ],
+    "Storage": [
+        (
+            "clear-storage",
+            "Clears this client's local storage.",
+            ".storage:ClearStorageCommand",
+        ),
+        (
+            "migrate-storage",
+            "Copies this client's local storage into another storage backend.",
+            ".storage:MigrateStorageCommand",
+        ),
+    ],
+    "Fleet": [
+        (
+            "fleet-register",
+            "Register many virtual clients with a Landscape Server instance.",
+            ".fleet:FleetRegisterCommand",
+        ),
+        (
+            "fleet-run",
+            "Run the exchanges and pings of a registered fleet of clients.",
+            ".fleet:FleetRunCommand",
+        ),
+    ],
+    "Testing": [
+        (
+            "mock-server",
+            "Run a local stand-in for a Landscape Server instance.",
+            ".mock_server:MockServerCommand",
+        ),
+    ],
+}
 
 
 def main():
@@ -22,9 +86,8 @@ def main():
     )
 
     command_groups = [
-        CommandGroup("Register", [RegisterCommand]),
-        CommandGroup("Exchange", [PingCommand, SendMessageCommand, PingspamCommand]),
-        CommandGroup("Storage", [ClearStorageCommand]),
+        CommandGroup(group, [lazy_command(*command) for command in commands])
+        for group, commands in COMMANDS.items()
     ]
 
     summary = "Minimal subset of user-driven Landscape Client-Server" " interactions."
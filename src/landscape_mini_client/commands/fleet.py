@@ -0,0 +1,597 @@
+import argparse
+import asyncio
+import heapq
+import random
+import sys
+import textwrap
+import time
+from collections.abc import MutableMapping
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from craft_cli import BaseCommand, emit
+
+from ..identity import Identity, text
+from ..messages import API_HEADERS, COMPUTER_ID_HEADER
+from ..metrics import ClientMetrics, add_metrics_arguments, exporting
+from ..storage import STORAGE_HELP, open_storage
+from ..util import bpickle
+from ..util.asynchttp import REQUEST_ERRORS, AsyncHTTPClient
+from ..util.stats import PingStats
+from ..util.templates import Slot, TemplateCache
+from .pingspam import write_summary
+from .register import registration_template
+
+
+DEFAULT_STORAGE = ".lmc-fleet.sqlite"
+# Storage key of the fleet's `FleetServer`, and prefix of the key of each
+# of its identities.
+SERVER_KEY = "fleet-server"
+IDENTITY_PREFIX = "fleet-identity:"
+
+
+class FleetServer(NamedTuple):
+    """The Landscape Server instance a fleet is registered with."""
+
+    protocol: str
+    server_host: str
+    # Either empty, for the protocol's default port, or ":PORT".
+    server_port: str
+    server_uuid: str
+
+    @property
+    def message_url(self) -> str:
+        return f"{self.protocol}://{self.server_host}{self.server_port}/message-system"
+
+    def ping_url(self, port: str = "") -> str:
+        """Returns the ping URL, without the insecure ID."""
+        port = f":{port}" if port else ""
+
+        return f"http://{self.server_host}{port}/ping?insecure_id="
+
+
+class FleetRegisterCommand(BaseCommand):
+    """Registers a fleet of virtual clients with a Landscape Server
+    instance.
+    """
+
+    name = "fleet-register"
+    help_msg = "Register many virtual clients with a Landscape Server instance."
+    overview = textwrap.dedent(
+        """
+        Register a fleet of virtual clients with a Landscape Server instance.
+
+        Each client is registered with the same registration message as
+        'register' sends, titled and named '--title-prefix' followed by its
+        number. Up to '--concurrency' registrations are in flight at once.
+        The identities the server assigns are kept in '--storage', and
+        clients already registered there are skipped, so a fleet can be
+        grown by running this again with a larger '--clients'.
+    """
+    )
+
+    def fill_parser(self, parser):
+        parser.add_argument(
+            "--clients",
+            type=int,
+            required=True,
+            help="Number of virtual clients in the fleet.",
+        )
+        parser.add_argument(
+            "--account-name",
+            required=True,
+            help="Name of your account in Landscape Server.",
+        )
+        parser.add_argument(
+            "--server-host",
+            required=True,
+            help="Domain name or IP address of Landscape Server.",
+        )
+        parser.add_argument(
+            "--title-prefix",
+            default="fleet-",
+            help="Prefix of each client's computer title and hostname.",
+        )
+        parser.add_argument(
+            "--registration-key", default="", help="Landscape registration key."
+        )
+        parser.add_argument(
+            "--tags", default="", help="Tags to add to each client's Landscape record."
+        )
+        parser.add_argument(
+            "--container-info",
+            default="",
+            help="Identifier for what type of container the clients are "
+            "containerized with.",
+        )
+        parser.add_argument(
+            "--vm-info",
+            default="",
+            help="Identifier for what type of virtual machine the clients are "
+            "virtualized with.",
+        )
+        parser.add_argument(
+            "--protocol", default="https", help="Transfer protocol: http or https."
+        )
+        parser.add_argument(
+            "--port",
+            default="",
+            help="Port that the Landscape Server instance is listening on. "
+            "Default is based on protocol.",
+        )
+        parser.add_argument(
+            "--no-verify",
+            action="store_false",
+            dest="verify",
+            help="Do not verify SSL/TLS",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Maximum number of registrations in flight at once.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="How many seconds to wait for the server to respond to each "
+            "registration before giving up",
+        )
+        parser.add_argument(
+            "--storage",
+            default=DEFAULT_STORAGE,
+            help=STORAGE_HELP,
+        )
+
+    def run(self, parsed_args):
+        storage = open_storage(parsed_args.storage)
+        _, identities = load_fleet(storage)
+
+        titles = [
+            f"{parsed_args.title_prefix}{i:05d}" for i in range(parsed_args.clients)
+        ]
+        titles = [title for title in titles if title not in identities]
+        if not titles:
+            emit.message("All clients already registered. Nothing to do.")
+            return
+
+        emit.message(f"Registering {len(titles)} clients...")
+        start = time.monotonic()
+
+        registered, server_uuid, stats = asyncio.run(
+            register_fleet(
+                parsed_args,
+                titles,
+                concurrency=parsed_args.concurrency,
+                timeout=parsed_args.timeout,
+            )
+        )
+
+        elapsed = time.monotonic() - start
+        if registered:
+            port = f":{parsed_args.port}" if parsed_args.port else ""
+            server = FleetServer(
+                parsed_args.protocol, parsed_args.server_host, port, server_uuid
+            )
+            save_fleet(storage, server, registered)
+
+        emit.message(
+            f"Registered {len(registered)} of {len(titles)} clients in "
+            f"{elapsed:.1f}s."
+        )
+        _report(stats)
+
+
+class FleetRunCommand(BaseCommand):
+    """Drives the exchanges and pings of a registered fleet."""
+
+    name = "fleet-run"
+    help_msg = "Run the exchanges and pings of a registered fleet of clients."
+    overview = textwrap.dedent(
+        """
+        Run the message exchanges and pings of a fleet of virtual clients.
+
+        The fleet must first be registered with 'fleet-register'. Every
+        client exchanges messages every '--exchange-interval' seconds and
+        pings every '--ping-interval' seconds, starting at a random offset
+        within each interval so that the load is spread evenly. Up to
+        '--concurrency' requests are in flight at once; how late requests
+        start behind their schedule is reported as the schedule lag.
+
+        Each client's exchange sequence is kept in '--storage' when the
+        run ends.
+
+        Metrics of the requests sent can be served at '/metrics' on
+        '--metrics-port', or written to '--metrics-file' for
+        node_exporter's textfile collector.
+    """
+    )
+
+    def fill_parser(self, parser):
+        parser.add_argument(
+            "--exchange-interval",
+            type=float,
+            default=60.0,
+            help="Seconds between each client's exchanges, or 0 for none.",
+        )
+        parser.add_argument(
+            "--ping-interval",
+            type=float,
+            default=30.0,
+            help="Seconds between each client's pings, or 0 for none.",
+        )
+        parser.add_argument(
+            "--ping-port",
+            default="",
+            help="Port that the Landscape Server pingserver is listening on. "
+            "Default is port 80.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=None,
+            help="Stop after this many seconds. Runs until interrupted by default.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=100,
+            help="Maximum number of requests in flight at once.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="How many seconds to wait for the server to respond to each "
+            "request before giving up",
+        )
+        parser.add_argument(
+            "--no-verify",
+            action="store_false",
+            dest="verify",
+            help="Do not verify SSL/TLS",
+        )
+        parser.add_argument(
+            "--seed",
+            default=None,
+            help="Seed for the clients' start offsets, to make runs reproducible.",
+        )
+        parser.add_argument(
+            "--report-interval",
+            type=float,
+            default=1.0,
+            help="Seconds between progress reports.",
+        )
+        parser.add_argument(
+            "--summary",
+            default=None,
+            help="File to write a summary of the run to when it ends. Written "
+            "as CSV if the name ends in '.csv', otherwise as JSON.",
+        )
+        parser.add_argument(
+            "--storage",
+            default=DEFAULT_STORAGE,
+            help=STORAGE_HELP,
+        )
+        add_metrics_arguments(parser)
+
+    def run(self, parsed_args):
+        storage = open_storage(parsed_args.storage)
+        server, identities = load_fleet(storage)
+
+        if server is None or not identities:
+            emit.message("No fleet registered. Nothing to do.")
+            return
+
+        fleet = list(identities.values())
+        emit.message(f"Running {len(fleet)} clients...")
+
+        try:
+            with exporting(parsed_args) as metrics:
+                stats, elapsed = asyncio.run(
+                    run_fleet(
+                        server,
+                        fleet,
+                        exchange_interval=parsed_args.exchange_interval,
+                        ping_interval=parsed_args.ping_interval,
+                        ping_port=parsed_args.ping_port,
+                        duration=parsed_args.duration,
+                        concurrency=parsed_args.concurrency,
+                        timeout=parsed_args.timeout,
+                        verify=parsed_args.verify,
+                        seed=parsed_args.seed,
+                        report_interval=parsed_args.report_interval,
+                        metrics=metrics,
+                    )
+                )
+        finally:
+            save_fleet(storage, server, fleet)
+
+        emit.message(
+            f"{stats.count} requests completed in {elapsed:.1f}s "
+            f"({stats.count / elapsed if elapsed else 0:.0f} requests/s)."
+        )
+        _report(stats)
+
+        if parsed_args.summary:
+            try:
+                write_summary(parsed_args.summary, stats.summary(elapsed))
+            except OSError as err:
+                print(err, file=sys.stderr)
+
+
+def load_fleet(
+    storage: MutableMapping,
+) -> Tuple[Optional[FleetServer], Dict[str, Identity]]:
+    """Returns the fleet's server, if registered, and its identities by
+    computer title.
+    """
+    server = storage.get(SERVER_KEY)
+    identities = {}
+
+    for key in storage:
+        if key.startswith(IDENTITY_PREFIX):
+            identity = Identity.unpack(storage[key])
+            identities[identity.title] = identity
+
+    return FleetServer(*server) if server else None, identities
+
+
+def save_fleet(
+    storage: MutableMapping, server: FleetServer, identities: List[Identity]
+):
+    """Stores `server` and every identity, packed, in one transaction."""
+    with storage.transaction():
+        storage[SERVER_KEY] = tuple(server)
+
+        for identity in identities:
+            storage[IDENTITY_PREFIX + identity.title] = identity.pack()
+
+
+async def register_fleet(
+    args: argparse.Namespace,
+    titles: List[str],
+    concurrency: int = 50,
+    timeout: Optional[float] = None,
+) -> Tuple[List[Identity], Optional[str], PingStats]:
+    """Registers a client for each of `titles`, as `register` would with
+    `args`, with up to `concurrency` registrations in flight.
+
+    Returns the identities of the clients the server accepted, its UUID,
+    and the registrations' latencies and outcomes.
+    """
+    port = f":{args.port}" if args.port else ""
+    url = f"{args.protocol}://{args.server_host}{port}/message-system"
+    template = registration_template(args)
+    client = AsyncHTTPClient(limit_per_host=concurrency, verify=args.verify)
+    slots = asyncio.Semaphore(concurrency)
+    stats = PingStats()
+    server_uuid = None
+
+    async def register_one(title: str) -> Optional[Identity]:
+        nonlocal server_uuid
+
+        body = template.render(
+            hostname=title, computer_title=title, timestamp=int(time.time())
+        )
+
+        async with slots:
+            start = time.monotonic()
+            try:
+                response = await client.request(
+                    "POST", url, headers=API_HEADERS, body=body, timeout=timeout
+                )
+            except REQUEST_ERRORS as err:
+                stats.record("register", type(err).__name__, time.monotonic() - start)
+                return None
+
+        stats.record("register", str(response.status), time.monotonic() - start)
+        if response.status != 200:
+            return None
+
+        try:
+            payload, _ = bpickle.loads(response.body)
+            message = payload["messages"][0]
+            server_uuid = sys.intern(text(payload["server-uuid"]))
+
+            return Identity(
+                text(message["id"]),
+                message["insecure-id"],
+                server_host=args.server_host,
+                server_port=port,
+                server_uuid=server_uuid,
+                title=title,
+            )
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+            stats.record("register", "BadResponse", 0)
+            return None
+
+    try:
+        # A registration failing in some unforeseen way mustn't lose those
+        # that succeeded.
+        results = await asyncio.gather(
+            *(register_one(title) for title in titles), return_exceptions=True
+        )
+    finally:
+        await client.close()
+
+    for result in results:
+        if isinstance(result, Exception):
+            stats.record("register", type(result).__name__, 0)
+
+    identities = [result for result in results if isinstance(result, Identity)]
+
+    return identities, server_uuid, stats
+
+
+async def run_fleet(
+    server: FleetServer,
+    fleet: List[Identity],
+    exchange_interval: float = 60.0,
+    ping_interval: float = 30.0,
+    ping_port: str = "",
+    duration: Optional[float] = None,
+    concurrency: int = 100,
+    timeout: Optional[float] = None,
+    verify: bool = True,
+    seed: Union[int, str, None] = None,
+    report_interval: float = 1.0,
+    metrics: Optional[ClientMetrics] = None,
+) -> Tuple[PingStats, float]:
+    """Sends each client's exchanges and pings on schedule until `duration`
+    seconds have passed, or forever without one.
+
+    Each identity in `fleet` is updated as its exchange state changes.
+    Returns the requests' latencies and outcomes by kind, "exchange" or
+    "ping", and how long the run lasted. Each request is also recorded in
+    `metrics`, if given.
+    """
+    client = AsyncHTTPClient(limit_per_host=concurrency, verify=verify)
+    templates = TemplateCache()
+    ping_url = server.ping_url(ping_port)
+    slots = asyncio.Semaphore(concurrency)
+    stats = PingStats()
+    rng = random.Random(seed)
+    servers = {
+        "exchange": urlsplit(server.message_url).netloc,
+        "ping": urlsplit(ping_url).netloc,
+    }
+
+    def exchange_message() -> dict:
+        return {
+            "server-uuid": server.server_uuid,
+            "sequence": Slot("sequence"),
+            "messages": [],
+        }
+
+    async def exchange(index: int) -> str:
+        identity = fleet[index]
+        encoding = time.perf_counter()
+        body = templates.render(
+            ("exchange", server.server_uuid),
+            exchange_message,
+            sequence=identity.next_seq,
+        )
+        if metrics is not None:
+            metrics.encode_duration.observe(time.perf_counter() - encoding, "exchange")
+            metrics.sent_bytes.inc("exchange", servers["exchange"], amount=len(body))
+        headers = dict(API_HEADERS)
+        headers[COMPUTER_ID_HEADER] = identity.secure_id
+
+        response = await client.request(
+            "POST", server.message_url, headers=headers, body=body, timeout=timeout
+        )
+
+        if metrics is not None:
+            metrics.received_bytes.inc(
+                "exchange", servers["exchange"], amount=len(response.body)
+            )
+
+        if response.status == 200:
+            decoding = time.perf_counter()
+            payload, _ = bpickle.loads(response.body)
+            if metrics is not None:
+                metrics.decode_duration.observe(
+                    time.perf_counter() - decoding, "exchange"
+                )
+            if not isinstance(payload, dict):
+                raise TypeError(f"Expected a dict, not {type(payload).__name__}")
+            identity.next_seq = payload.get("next-expected-sequence", identity.next_seq)
+            identity.next_tok = text(payload.get("next-exchange-token"))
+
+        return str(response.status)
+
+    async def ping(index: int) -> str:
+        response = await client.request(
+            "POST",
+            f"{ping_url}{fleet[index].insecure_id}",
+            headers=API_HEADERS,
+            timeout=timeout,
+        )
+        if metrics is not None:
+            metrics.received_bytes.inc(
+                "ping", servers["ping"], amount=len(response.body)
+            )
+
+        return str(response.status)
+
+    async def send(kind: str, index: int, due: float):
+        async with slots:
+            start = time.monotonic()
+            stats.lag.record(max(start - due, 0))
+            if metrics is not None:
+                metrics.schedule_lag.observe(max(start - due, 0))
+
+            try:
+                outcome = await (exchange(index) if kind == "exchange" else ping(index))
+            except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+                outcome = "BadResponse"
+            except REQUEST_ERRORS as err:
+                outcome = type(err).__name__
+
+            latency = time.monotonic() - start
+            stats.record(kind, outcome, latency)
+            if metrics is not None:
+                metrics.record(kind, servers[kind], outcome, latency)
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_interval)
+            emit.progress(
+                f"{stats.count} requests, "
+                f"{stats.count / (time.monotonic() - start):.0f} requests/s, "
+                f"latency {stats.latency().describe()}"
+            )
+
+    # (due, client index, kind) of each client's next request of each kind,
+    # first spread evenly across one interval.
+    start = time.monotonic()
+    intervals = {"exchange": exchange_interval, "ping": ping_interval}
+    schedule = [
+        (start + rng.uniform(0, interval), index, kind)
+        for kind, interval in intervals.items()
+        if interval
+        for index in range(len(fleet))
+    ]
+    heapq.heapify(schedule)
+    end = start + duration if duration is not None else float("inf")
+
+    in_flight = set()
+    reporter = asyncio.create_task(report())
+
+    try:
+        while schedule and schedule[0][0] < end:
+            due, index, kind = heapq.heappop(schedule)
+            heapq.heappush(schedule, (due + intervals[kind], index, kind))
+
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            task = asyncio.create_task(send(kind, index, due))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if duration is not None:
+            await asyncio.sleep(max(end - time.monotonic(), 0))
+        await asyncio.gather(*in_flight)
+    finally:
+        reporter.cancel()
+        for task in in_flight:
+            task.cancel()
+        await client.close()
+
+    return stats, time.monotonic() - start
+
+
+def _report(stats: PingStats):
+    if not stats:
+        return
+
+    if stats.lag.count:
+        emit.message(f"Schedule lag: {stats.lag.describe()}")
+
+    for kind, outcomes in stats.outcomes_by_server().items():
+        breakdown = ", ".join(f"{outcome}: {n}" for outcome, n in outcomes.items())
+        emit.message(f"{kind}: {stats.latencies[kind].describe()} ({breakdown})")
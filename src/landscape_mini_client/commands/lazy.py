@@ -0,0 +1,35 @@
+import importlib
+from typing import Type
+
+from craft_cli import BaseCommand
+
+
+def lazy_command(name: str, help_msg: str, target: str) -> Type[BaseCommand]:
+    """Returns a command standing in for the command class at `target`,
+    "module:Class" with the module relative to this package.
+
+    The dispatcher only needs a command's `name` and `help_msg` to list it,
+    so its module, and whatever that imports, is only imported once the
+    command is loaded to be run or to show its help.
+    """
+    module_name, _, class_name = target.partition(":")
+
+    class LazyCommand(BaseCommand):
+        def __init__(self, config):
+            module = importlib.import_module(module_name, __package__)
+            self.command = getattr(module, class_name)(config)
+            self.overview = self.command.overview
+
+            super().__init__(config)
+
+        def fill_parser(self, parser):
+            self.command.fill_parser(parser)
+
+        def run(self, parsed_args):
+            return self.command.run(parsed_args)
+
+    LazyCommand.name = name
+    LazyCommand.help_msg = help_msg
+    LazyCommand.__name__ = LazyCommand.__qualname__ = class_name
+
+    return LazyCommand
@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import textwrap
+import time
+from typing import Optional
+
+from craft_cli import BaseCommand, emit
+
+from ..util.mockserver import Faults, MockServer
+
+
+async def serve(
+    server: MockServer,
+    host: str,
+    port: int,
+    ping_port: Optional[int] = None,
+    duration: Optional[float] = None,
+    report_interval: float = 1.0,
+):
+    """Serves `server` on `port`, and `ping_port` if given, reporting what
+    it handled every `report_interval` seconds until `duration` seconds have
+    passed, or forever without one.
+    """
+    port = await server.listen(host, port)
+    listening = f"Listening on {host}:{port}"
+    if ping_port is not None:
+        ping_port = await server.listen(host, ping_port)
+        listening += f", and for pings on {host}:{ping_port}"
+    emit.message(listening)
+
+    start = time.monotonic()
+    end = start + duration if duration is not None else float("inf")
+
+    try:
+        while time.monotonic() < end:
+            await asyncio.sleep(min(report_interval, end - time.monotonic()))
+
+            stats = server.stats
+            elapsed = time.monotonic() - start
+            emit.progress(
+                f"{stats.requests / elapsed:.0f} requests/s. {stats.describe()}"
+            )
+    finally:
+        await server.close()
+
+
+class MockServerCommand(BaseCommand):
+    """Runs a local stand-in for a Landscape Server instance."""
+
+    name = "mock-server"
+    help_msg = "Run a local stand-in for a Landscape Server instance."
+    overview = textwrap.dedent(
+        """
+        Run a local stand-in for a Landscape Server instance, to benchmark
+        and test the client against without a real one.
+
+        It accepts registrations and message exchanges on
+        '/message-system', issuing IDs and tracking each client's exchange
+        sequence, and answers pings on '/ping?insecure_id='. Pings can also
+        be served on '--ping-port', as a real server's pingserver would be.
+
+        Responses can be delayed by '--latency', give or take '--jitter'
+        seconds, a '--error-rate' fraction of requests can be failed with
+        '--error-status', and exchange responses can carry a message of
+        '--payload-size' bytes.
+    """
+    )
+
+    def fill_parser(self, parser):
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="Address to listen on.",
+        )
+        parser.add_argument(
+            "--port",
+            type=int,
+            default=8080,
+            help="Port to listen on.",
+        )
+        parser.add_argument(
+            "--ping-port",
+            type=int,
+            default=None,
+            help="Another port to listen on, for pings.",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds to delay each response by.",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.0,
+            help="Most seconds each response's delay varies by, either way.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests, between 0 and 1, to fail.",
+        )
+        parser.add_argument(
+            "--error-status",
+            type=int,
+            default=503,
+            help="Status code, from 400 to 599, failed requests are answered with.",
+        )
+        parser.add_argument(
+            "--payload-size",
+            type=int,
+            default=0,
+            help="Bytes of data to add to each exchange response.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=None,
+            help="Seed for the IDs issued and the requests failed, to make "
+            "runs reproducible.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=None,
+            help="Stop after this many seconds. Runs until interrupted by default.",
+        )
+        parser.add_argument(
+            "--report-interval",
+            type=float,
+            default=1.0,
+            help="Seconds between progress reports.",
+        )
+
+    def run(self, parsed_args: argparse.Namespace):
+        if not 0 <= parsed_args.error_rate <= 1:
+            emit.message("--error-rate must be between 0 and 1.")
+            return
+        # Other statuses would be answered with an error page they can't
+        # carry, such as a 204's.
+        if not 400 <= parsed_args.error_status <= 599:
+            emit.message("--error-status must be between 400 and 599.")
+            return
+
+        server = MockServer(
+            Faults(
+                latency=parsed_args.latency,
+                jitter=parsed_args.jitter,
+                error_rate=parsed_args.error_rate,
+                error_status=parsed_args.error_status,
+                payload_size=parsed_args.payload_size,
+            ),
+            seed=parsed_args.seed,
+        )
+
+        try:
+            asyncio.run(
+                serve(
+                    server,
+                    parsed_args.host,
+                    parsed_args.port,
+                    ping_port=parsed_args.ping_port,
+                    duration=parsed_args.duration,
+                    report_interval=parsed_args.report_interval,
+                )
+            )
+        except KeyboardInterrupt:
+            pass
+        except OSError as err:
+            emit.message(f"Could not listen: {err}")
+            return
+
+        emit.message(f"Handled {server.stats.describe()}")
@@ -4,7 +4,9 @@ import textwrap
 from craft_cli import BaseCommand, emit
 
 from .. import messages
-from ..storage import ClientStorage
+from ..identity import load_identity
+from ..storage import STORAGE_HELP, open_storage
+from ..timing import TRACE_HELP, trace_hooks
 
 
 class PingCommand(BaseCommand):
@@ -37,8 +39,12 @@ class PingCommand(BaseCommand):
         parser.add_argument(
             "--storage",
             default=".lmc-storage.pickle",
-            help="File in which to store local registration and message state "
-            "information",
+            help=STORAGE_HELP,
+        )
+        parser.add_argument(
+            "--trace",
+            default=None,
+            help=TRACE_HELP,
         )
         parser.add_argument(
             "--randomize-id",
@@ -56,25 +62,30 @@ class PingCommand(BaseCommand):
         )
 
     def run(self, parsed_args):
-        storage = ClientStorage(loc=parsed_args.storage)
+        if parsed_args.trace:
+            messages.configure_client(timing_hooks=trace_hooks(parsed_args.trace))
+
+        storage = open_storage(parsed_args.storage)
 
         if not storage.get("registered"):
             emit.message("Not registered. Nothing to do.")
             return
 
-        registration_info = storage.get("registration_info")
-        server_host = registration_info["server_host"]
+        identity = load_identity(storage)
+        server_host = identity.server_host
 
         if parsed_args.increment_id:
-            last_id = storage.get("last_id")
-            if last_id is None:
-                last_id = 0
-            insecure_id = last_id + 1
-            storage["last_id"] = last_id + 1
+            # Other pings may be incrementing the same ID concurrently.
+            with storage.transaction():
+                last_id = storage.get("last_id")
+                if last_id is None:
+                    last_id = 0
+                insecure_id = last_id + 1
+                storage["last_id"] = last_id + 1
         elif parsed_args.randomize_id:
             insecure_id = random.randint(1, 100_000)
         else:
-            insecure_id = registration_info["insecure_id"]
+            insecure_id = identity.insecure_id
 
         port = f":{parsed_args.port}" if parsed_args.port else ""
 
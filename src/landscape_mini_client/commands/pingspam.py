@@ -1,13 +1,30 @@
+import asyncio
+import csv
+import json
 import multiprocessing
-import random
+import queue
+import signal
 import sys
 import time
 import textwrap
+from ctypes import Array, c_byte
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
 
 import requests
 
 from craft_cli import BaseCommand, emit
 
+from ..metrics import ClientMetrics, add_metrics_arguments, exporting
+from ..util.asynchttp import REQUEST_ERRORS, AsyncHTTPClient
+from ..util.rawhttp import PipelinedPool
+from ..util.schedule import RateSchedule, parse_schedule
+from ..util.stats import PingStats, RateTracker
+from ..util.targets import TargetTable, parse_insecure_ids, parse_servers
+
+
+BACKENDS = ("requests", "async", "pipelined")
+
 
 class PingspamCommand(BaseCommand):
     """Pings the Landscape Server instance as quickly as possible with
@@ -23,8 +40,25 @@ class PingspamCommand(BaseCommand):
         """
         Ping one or more Landscape Server instances as quickly as possible.
 
-        For each Server provided, one is randomly selected and a ping is sent
-        with a randomly-selected insecure ID from the list provided.
+        For each ping, a server is randomly selected and the ping is sent
+        with a randomly-selected insecure ID from the list provided. Servers
+        can be given a relative weight after their name to be picked more or
+        less often, and '--seed' makes the selection reproducible.
+
+        With the 'async' backend, each worker process keeps up to
+        '--concurrency' pings in flight per server over keep-alive
+        connections. A target rate or ramp can be given with '--rate' or
+        '--ramp', in which case pings are sent open-loop on schedule and
+        the lag behind that schedule is reported.
+
+        The 'pipelined' backend skips the HTTP library entirely: it writes
+        pre-encoded ping requests to persistent sockets, up to
+        '--pipeline-depth' at a time per connection without waiting for
+        responses, and parses the responses as they stream back.
+
+        The workers' pings are counted and timed in metrics that can be
+        served at '/metrics' on '--metrics-port', or written to
+        '--metrics-file' for node_exporter's textfile collector.
         """
     )
 
@@ -33,79 +67,573 @@ class PingspamCommand(BaseCommand):
             "--servers",
             required=True,
             help="Path to a file containing a line-separated list of server"
-            "FQDNs to which to send pings. These can contain ports."
+            "FQDNs to which to send pings. These can contain ports, and be "
+            "followed by a space and a relative weight.",
         )
         parser.add_argument(
             "--insecure-ids",
             required=True,
             help="Path to a file containing a line-separated list of insecure"
-            "IDs to use for pings."
+            "IDs to use for pings.",
         )
         parser.add_argument(
             "--workers",
             default=multiprocessing.cpu_count(),
             type=int,
             help="Number of workers to send pings with. Defaults to the number"
-            "of CPUs reported by the machine."
+            "of CPUs reported by the machine.",
+        )
+        parser.add_argument(
+            "--seed",
+            default=None,
+            type=int,
+            help="Seed for picking servers and insecure IDs, so that runs "
+            "send the same pings in the same order.",
+        )
+        parser.add_argument(
+            "--backend",
+            default="requests",
+            choices=BACKENDS,
+            help="How each worker sends pings: 'requests' sends one ping at a "
+            "time, 'async' multiplexes many pings over pooled connections and "
+            "'pipelined' writes raw requests to pipelined HTTP/1.1 "
+            "connections.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            default=100,
+            type=int,
+            help="Maximum number of in-flight pings per server, per worker. "
+            "Not used by the 'requests' backend.",
+        )
+        parser.add_argument(
+            "--pipeline-depth",
+            default=16,
+            type=int,
+            help="Maximum number of pipelined pings in flight on each "
+            "connection. Only used by the 'pipelined' backend.",
+        )
+        parser.add_argument(
+            "--report-interval",
+            default=1.0,
+            type=float,
+            help="Seconds between progress reports.",
+        )
+        parser.add_argument(
+            "--window",
+            default=10.0,
+            type=float,
+            help="Length in seconds of the sliding window used for the "
+            "windowed ping rate.",
+        )
+        parser.add_argument(
+            "--timeout",
+            default=None,
+            type=float,
+            help="How many seconds to wait for the server to respond to a "
+            "ping before counting it as failed",
+        )
+        rate = parser.add_mutually_exclusive_group()
+        rate.add_argument(
+            "--rate",
+            default=None,
+            type=float,
+            help="Target number of pings per second across all workers. Pings "
+            "are sent on schedule whether or not earlier ones have been "
+            "answered. Not supported by the 'requests' backend.",
+        )
+        rate.add_argument(
+            "--ramp",
+            default=None,
+            help="Target rate schedule instead of a fixed '--rate': "
+            "'linear:START:END:SECONDS', 'step:RATE[,RATE...]:SECONDS' or "
+            "'file:PATH' with a 'SECONDS RATE' pair per line. Not supported "
+            "by the 'requests' backend.",
+        )
+        parser.add_argument(
+            "--duration",
+            default=None,
+            type=float,
+            help="Stop after this many seconds. Runs until interrupted if "
+            "neither this nor '--count' is given.",
+        )
+        parser.add_argument(
+            "--count",
+            default=None,
+            type=int,
+            help="Stop after sending this many pings across all workers.",
+        )
+        parser.add_argument(
+            "--summary",
+            default=None,
+            help="File to write a summary of the run to when it ends. Written "
+            "as CSV if the name ends in '.csv', otherwise as JSON.",
         )
+        add_metrics_arguments(parser)
 
     def run(self, parsed_args):
-        servers = []
-        insecure_ids = []
-
         try:
             with open(parsed_args.servers) as servers_fp:
-                servers.extend([s.strip() for s in servers_fp])
+                servers, weights = parse_servers(servers_fp)
 
             with open(parsed_args.insecure_ids) as ids_fp:
-                insecure_ids.extend([i.strip() for i in ids_fp])
-        except OSError as err:
+                insecure_ids = parse_insecure_ids(ids_fp)
+
+            if parsed_args.ramp:
+                schedule = parse_schedule(parsed_args.ramp)
+            elif parsed_args.rate is not None:
+                schedule = RateSchedule.constant(parsed_args.rate)
+            else:
+                schedule = None
+        except (OSError, ValueError) as err:
             print(err, file=sys.stderr)
             return
 
+        if schedule is not None and not any(rate > 0 for _, rate in schedule.points):
+            # Nothing would ever be sent.
+            print("--rate, or some point of --ramp, must be above 0", file=sys.stderr)
+            return
+
+        if schedule is not None and parsed_args.backend == "requests":
+            print(
+                "--rate and --ramp are not supported by '--backend=requests'",
+                file=sys.stderr,
+            )
+            return
+
         # Validate the URLs
         emit.message("Starting pingspam...")
 
-        pingspam(servers, insecure_ids, parsed_args.workers)
+        with exporting(parsed_args) as metrics:
+            stats, elapsed = pingspam(
+                servers,
+                insecure_ids,
+                parsed_args.workers,
+                weights=weights,
+                seed=parsed_args.seed,
+                backend=parsed_args.backend,
+                concurrency=parsed_args.concurrency,
+                pipeline_depth=parsed_args.pipeline_depth,
+                report_interval=parsed_args.report_interval,
+                window=parsed_args.window,
+                timeout=parsed_args.timeout,
+                schedule=schedule,
+                duration=parsed_args.duration,
+                count=parsed_args.count,
+                metrics=metrics,
+            )
+
+        _report_summary(stats, elapsed)
+
+        if parsed_args.summary:
+            summary = stats.summary(elapsed)
+            summary["backend"] = parsed_args.backend
+            summary["workers"] = parsed_args.workers
 
+            try:
+                write_summary(parsed_args.summary, summary)
+            except OSError as err:
+                print(err, file=sys.stderr)
 
-def pingspam(servers: list[str], insecure_ids: list[str], workers: int):
+
+class WorkerConfig(NamedTuple):
+    """Settings and shared channels handed to every pingspam worker."""
+
+    targets: TargetTable
+    seed: Optional[int]
+    counts: Array
+    stats_queue: multiprocessing.Queue
+    stop: c_byte
+    report_interval: float
+    timeout: Optional[float]
+    concurrency: int
+    pipeline_depth: Optional[int]
+    schedule: Optional[RateSchedule]
+    quotas: Optional[List[int]]
+
+
+def pingspam(
+    servers: List[str],
+    insecure_ids: List[str],
+    workers: int,
+    weights: Optional[List[float]] = None,
+    seed: Optional[int] = None,
+    backend: str = "requests",
+    concurrency: int = 100,
+    pipeline_depth: int = 16,
+    report_interval: float = 1.0,
+    window: float = 10.0,
+    timeout: Optional[float] = None,
+    schedule: Optional[RateSchedule] = None,
+    duration: Optional[float] = None,
+    count: Optional[int] = None,
+    metrics: Optional[ClientMetrics] = None,
+) -> Tuple[PingStats, float]:
     """Spams ping requests at `servers`
 
-    It does this by creating a multiprocessing pool of `workers` processes.
+    It does this by creating a multiprocessing pool of `workers` processes,
+    each running the selected `backend`. Each worker counts its pings in its
+    own slot of a shared array, which is sampled every `report_interval`
+    seconds to report the ping rate. Latencies and outcomes are batched up
+    by each worker and sent to the parent once per `report_interval`.
+
+    Servers are picked according to `weights`, if given. Each worker draws
+    its targets from its own random generator, seeded from `seed` if given.
+
+    If a `schedule` is given, pings are sent open-loop at the scheduled
+    rate, split evenly between the workers, instead of as fast as possible.
+
+    If given, `metrics` records the workers' pings as their stats arrive.
+
+    Pinging stops after `duration` seconds, once `count` pings have been
+    sent, or on Ctrl-C. Returns the stats of the whole run and how many
+    seconds it took.
     """
-    q = multiprocessing.Queue()
+    if schedule is not None and backend == "requests":
+        raise ValueError("The 'requests' backend can't follow a target rate.")
 
-    processes = [multiprocessing.Process(target=pingloop, args=(servers, insecure_ids, q)) for _ in range(workers)]
+    counts = multiprocessing.Array("Q", workers, lock=False)
+    stats_queue = multiprocessing.Queue()
+    stop = multiprocessing.RawValue("b", 0)
 
+    if count is not None:
+        quotas = [count // workers + (i < count % workers) for i in range(workers)]
+    else:
+        quotas = None
+
+    config = WorkerConfig(
+        targets=TargetTable(servers, insecure_ids, weights),
+        seed=seed,
+        counts=counts,
+        stats_queue=stats_queue,
+        stop=stop,
+        report_interval=report_interval,
+        timeout=timeout,
+        concurrency=concurrency,
+        pipeline_depth=pipeline_depth if backend == "pipelined" else None,
+        schedule=schedule.scaled(1 / workers) if schedule else None,
+        quotas=quotas,
+    )
+    target = pingloop if backend == "requests" else asyncpingloop
+
+    processes = [
+        multiprocessing.Process(target=target, args=(config, index))
+        for index in range(workers)
+    ]
+
+    start_time = time.monotonic()
+    deadline = start_time + duration if duration is not None else float("inf")
     for p in processes:
         p.start()
 
-    start_time = time.time()
-    sent = 0
+    tracker = RateTracker(window=window)
+    cumulative = PingStats()
+    try:
+        while any(p.is_alive() for p in processes):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(report_interval, remaining))
+
+            sample = tracker.sample(sum(counts))
+            interval = _drain_stats(stats_queue)
+            cumulative.merge(interval)
+            if metrics is not None:
+                metrics.merge_stats("ping", interval)
+
+            progress = [f"Current rate: {sample.describe()}"]
+            if schedule is not None:
+                target_rate = schedule.rate_at(time.monotonic() - start_time)
+                progress.append(f"Target: {target_rate:.0f} pings/s.")
+            progress.append(f"Latency: {interval.latency().describe()}")
+            if interval.lag.count:
+                progress.append(f"Schedule lag: {interval.lag.describe()}")
+
+            emit.progress(" ".join(progress))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.value = 1
+        final = PingStats()
+        _stop_workers(processes, stats_queue, final, grace=(timeout or 5) + 1)
+        cumulative.merge(final)
+        if metrics is not None:
+            metrics.merge_stats("ping", final)
+
+    return cumulative, time.monotonic() - start_time
+
+
+def _stop_workers(
+    processes: List[multiprocessing.Process],
+    stats_queue: multiprocessing.Queue,
+    stats: PingStats,
+    grace: float,
+):
+    """Waits up to `grace` seconds for the workers to send their final stats
+    and exit, merging everything they send into `stats`. Workers that are
+    still running after that are terminated.
+    """
+    deadline = time.monotonic() + grace
+
+    # Keep draining while waiting, as a worker can't exit until its
+    # queued stats have been read.
+    while any(p.is_alive() for p in processes) and time.monotonic() < deadline:
+        try:
+            stats.merge(stats_queue.get(timeout=0.1))
+        except queue.Empty:
+            pass
+
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+
+    stats.merge(_drain_stats(stats_queue))
+
+
+def _drain_stats(stats_queue: multiprocessing.Queue) -> PingStats:
+    """Merges all of the batches currently waiting on `stats_queue`."""
+    stats = PingStats()
+
     while True:
-        _ = q.get()
+        try:
+            stats.merge(stats_queue.get_nowait())
+        except queue.Empty:
+            return stats
+
+
+def _report_summary(stats: PingStats, elapsed: float):
+    emit.message(
+        f"{stats.count} pings completed in {elapsed:.1f}s "
+        f"({stats.count / elapsed if elapsed else 0:.0f} pings/s)."
+    )
+    emit.message(f"Latency: {stats.latency().describe()}")
+    if stats.lag.count:
+        emit.message(f"Schedule lag: {stats.lag.describe()}")
+
+    for server, outcomes in stats.outcomes_by_server().items():
+        breakdown = ", ".join(f"{outcome}: {n}" for outcome, n in outcomes.items())
+        emit.message(f"{server}: {stats.latencies[server].describe()} ({breakdown})")
+
+
+def write_summary(path: str, summary: dict):
+    """Writes `summary`, as built by `PingStats.summary`, to `path`.
+
+    The summary is written as CSV, one row per server plus an "all" row,
+    if `path` ends in ".csv" and as JSON otherwise.
+    """
+    if not path.endswith(".csv"):
+        with open(path, "w") as summary_fp:
+            json.dump(summary, summary_fp, indent=2)
+        return
+
+    rows = [("all", summary)] + list(summary["servers"].items())
+    outcomes = sorted(summary["outcomes"])
+    fieldnames = ["server", "pings", "throughput", "errors"]
+    fieldnames.extend(f"latency_{name}_ms" for name in summary["latency_ms"])
+    fieldnames.extend(f"outcome_{outcome}" for outcome in outcomes)
+
+    with open(path, "w", newline="") as summary_fp:
+        writer = csv.DictWriter(summary_fp, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for server, stats in rows:
+            row = {
+                "server": server,
+                "pings": stats["pings"],
+                "throughput": stats["throughput"],
+                "errors": stats["errors"],
+            }
+            for name, value in stats["latency_ms"].items():
+                row[f"latency_{name}_ms"] = value
+            for outcome in outcomes:
+                row[f"outcome_{outcome}"] = stats["outcomes"].get(outcome, 0)
+
+            writer.writerow(row)
+
+
+def _quota_reached(config: WorkerConfig, index: int, sent: int) -> bool:
+    return config.quotas is not None and sent >= config.quotas[index]
+
+
+def _worker_picker(config: WorkerConfig, index: int):
+    """Returns the target picker for the worker at `index`."""
+    seed = None if config.seed is None else f"{config.seed}:{index}"
+
+    return config.targets.picker(seed=seed)
+
+
+def pingloop(config: WorkerConfig, index: int):
+    """Loop sending pings, each time selecting a random `server` and
+    `insecure_id`, until told to stop or the worker's quota is sent.
+
+    After each ping, increments `config.counts[index]` to help indicate the
+    ping rate, and records the latency and outcome. The recorded stats are
+    put on `config.stats_queue` every `config.report_interval` seconds and
+    when the loop ends.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    targets = config.targets
+    picker = _worker_picker(config, index)
+    counts = config.counts
+    stop = config.stop
+
+    session = requests.Session()
+    stats = PingStats()
+    next_flush = time.monotonic() + config.report_interval
+    sent = 0
+
+    while not stop.value and not _quota_reached(config, index, sent):
+        server_index, id_index = next(picker)
+
+        start = time.monotonic()
+        try:
+            response = session.get(
+                targets.url(server_index, id_index),
+                timeout=config.timeout,
+            )
+        except requests.RequestException as err:
+            outcome = type(err).__name__
+        else:
+            outcome = str(response.status_code)
+        now = time.monotonic()
+
+        stats.record(targets.servers[server_index], outcome, now - start)
+        counts[index] += 1
         sent += 1
 
-        curr_time = time.time()
-        diff = curr_time - start_time
-        rate = int(sent // diff)
+        if now >= next_flush:
+            config.stats_queue.put(stats)
+            stats = PingStats()
+            next_flush = now + config.report_interval
 
-        emit.progress(f"Current rate: about {rate} pings/s. {sent} pings sent.")
+    session.close()
+    config.stats_queue.put(stats)
 
 
-def pingloop(servers: list[str], insecure_ids: list[str], q: multiprocessing.Queue):
-    """Infinite loop sending pings, each time selecting a random `server` and
-    `insecure_id`
+def asyncpingloop(config: WorkerConfig, index: int):
+    """Sends pings from an asyncio event loop.
 
-    After each ping, puts a value on `q` to help indicate the ping rate.
+    Connections are pooled per server, so each ping reuses a keep-alive
+    connection rather than opening a new one. If `config.pipeline_depth` is
+    set, pings are pipelined on raw connections instead. Without a schedule,
+    `config.concurrency` tasks per server send pings back-to-back. With
+    one, pings are dispatched at their scheduled times whether or not
+    earlier pings have been answered.
     """
-    while True:
-        server = random.choice(servers)
-        insecure_id = random.choice(insecure_ids)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-        requests.get(
-            f"http://{server}/ping?insecure_id={insecure_id}",
-        )
+    asyncio.run(_asyncpingloop(config, index))
+
+
+async def _asyncpingloop(config: WorkerConfig, index: int):
+    targets = config.targets
+    picker = _worker_picker(config, index)
+    counts = config.counts
+    stop = config.stop
+    timeout = config.timeout
+
+    if config.pipeline_depth:
+        pools = [_pipelined_pool(config, url) for url in targets.url_prefixes]
+    else:
+        client = AsyncHTTPClient(limit_per_host=config.concurrency)
+        pools = [client.pool_for_url(url)[0] for url in targets.url_prefixes]
+    stats = PingStats()
+    sent = 0
+
+    async def ping(start: float):
+        """Sends one ping, measuring its latency from `start`."""
+        server_index, id_index = next(picker)
+        request = pools[server_index].send(targets.request(server_index, id_index))
+
+        try:
+            if timeout is None:
+                response = await request
+            else:
+                response = await asyncio.wait_for(request, timeout)
+        except REQUEST_ERRORS as err:
+            outcome = type(err).__name__
+        else:
+            outcome = str(response.status)
+
+        stats.record(targets.servers[server_index], outcome, time.monotonic() - start)
+        counts[index] += 1
+
+    async def closed_loop():
+        nonlocal sent
+
+        while not stop.value and not _quota_reached(config, index, sent):
+            sent += 1
+            await ping(time.monotonic())
+
+    async def open_loop():
+        nonlocal sent
 
-        q.put(1)
+        # Latency is measured from when each ping was due rather than when
+        # it was actually sent, so a slow server can't hide its backlog.
+        in_flight = set()
+        start = time.monotonic()
+
+        for due in config.schedule.send_times():
+            if stop.value or _quota_reached(config, index, sent):
+                break
+
+            # Sleep in short steps so a stop request isn't missed during a
+            # long gap in the schedule.
+            delay = start + due - time.monotonic()
+            while delay > 0.1 and not stop.value:
+                await asyncio.sleep(0.1)
+                delay = start + due - time.monotonic()
+            if stop.value:
+                break
+
+            await asyncio.sleep(max(delay, 0))
+            stats.lag.record(time.monotonic() - start - due)
+
+            task = asyncio.create_task(ping(start + due))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            sent += 1
+
+        await asyncio.gather(*in_flight)
+
+    async def flush():
+        nonlocal stats
+
+        while True:
+            await asyncio.sleep(config.report_interval)
+            config.stats_queue.put(stats)
+            stats = PingStats()
+
+    if config.schedule is None:
+        senders = [
+            closed_loop() for _ in range(config.concurrency * len(targets.servers))
+        ]
+    else:
+        senders = [open_loop()]
+
+    flusher = asyncio.create_task(flush())
+    try:
+        await asyncio.gather(*senders)
+    finally:
+        flusher.cancel()
+        for pool in pools:
+            pool.close()
+
+    config.stats_queue.put(stats)
+
+
+def _pipelined_pool(config: WorkerConfig, url: str) -> PipelinedPool:
+    """Returns a pool with enough pipelined connections to `url`'s server
+    for `config.concurrency` pings to be in flight.
+    """
+    parts = urlsplit(url)
+    connections = -(-config.concurrency // config.pipeline_depth)
+
+    return PipelinedPool(
+        parts.hostname,
+        parts.port or 80,
+        connections=connections,
+        depth=config.pipeline_depth,
+    )
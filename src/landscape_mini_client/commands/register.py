@@ -6,8 +6,48 @@ import warnings
 
 from craft_cli import BaseCommand, emit
 
-from ..messages import MessageException, send_message
-from ..storage import ClientStorage
+from ..identity import Identity, store_identity
+from ..messages import MessageException, configure_client, send_message
+from ..storage import STORAGE_HELP, ClientStorage, open_storage
+from ..timing import TRACE_HELP, trace_hooks
+from ..util.templates import MessageTemplate, Slot, TemplateCache
+
+
+_templates = TemplateCache()
+
+
+def registration_template(args: argparse.Namespace) -> MessageTemplate:
+    """Returns the registration message template for `args`, with slots
+    for the hostname, computer title and timestamp.
+    """
+    shape = (
+        "register",
+        args.account_name,
+        args.registration_key,
+        args.tags,
+        args.container_info,
+        args.vm_info,
+    )
+
+    return _templates.get(
+        shape,
+        lambda: {
+            "messages": [
+                {
+                    "type": "register",
+                    "hostname": Slot("hostname"),
+                    "account_name": args.account_name,
+                    "computer_title": Slot("computer_title"),
+                    "registration_password": args.registration_key,
+                    "tags": args.tags,
+                    "container-info": args.container_info,
+                    "vm-info": args.vm_info,
+                    "timestamp": Slot("timestamp"),
+                    "api": "3.3",
+                }
+            ]
+        },
+    )
 
 
 def register(args: argparse.Namespace, storage: ClientStorage) -> None:
@@ -19,22 +59,11 @@ def register(args: argparse.Namespace, storage: ClientStorage) -> None:
     if not args.verify:
         warnings.filterwarnings("ignore", message="unverified https")
 
-    message = {
-        "messages": [
-            {
-                "type": "register",
-                "hostname": socket.gethostname(),
-                "account_name": args.account_name,
-                "computer_title": args.computer_title,
-                "registration_password": args.registration_key,
-                "tags": args.tags,
-                "container-info": args.container_info,
-                "vm-info": args.vm_info,
-                "timestamp": int(time.time()),
-                "api": "3.3",
-            }
-        ]
-    }
+    message = registration_template(args).render(
+        hostname=socket.gethostname(),
+        computer_title=args.computer_title,
+        timestamp=int(time.time()),
+    )
 
     port = f":{args.port}" if args.port else ""
 
@@ -50,14 +79,17 @@ def register(args: argparse.Namespace, storage: ClientStorage) -> None:
     else:
         if status_code == 200:
             emit.message("Registration request successful")
-            storage["registered"] = True
-            storage["registration_info"] = {
-                "server_host": args.server_host,
-                "server_port": port,
-                "server_uuid": payload["server-uuid"].decode(),
-                "secure_id": payload["messages"][0]["id"].decode(),
-                "insecure_id": payload["messages"][0]["insecure-id"],
-            }
+            identity = Identity(
+                payload["messages"][0]["id"].decode(),
+                payload["messages"][0]["insecure-id"],
+                server_host=args.server_host,
+                server_port=port,
+                server_uuid=payload["server-uuid"].decode(),
+                title=args.computer_title,
+            )
+            with storage.transaction():
+                storage["registered"] = True
+                store_identity(storage, identity)
         else:
             emit.message(f"Registration failed. Response {status_code}")
 
@@ -138,9 +170,16 @@ class RegisterCommand(BaseCommand):
         parser.add_argument(
             "--storage",
             default=".lmc-storage.pickle",
-            help="File in which to store local registration and message state "
-            "information",
+            help=STORAGE_HELP,
+        )
+        parser.add_argument(
+            "--trace",
+            default=None,
+            help=TRACE_HELP,
         )
 
     def run(self, parsed_args):
-        register(parsed_args, ClientStorage(loc=parsed_args.storage))
+        if parsed_args.trace:
+            configure_client(timing_hooks=trace_hooks(parsed_args.trace))
+
+        register(parsed_args, open_storage(parsed_args.storage))
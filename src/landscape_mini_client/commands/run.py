@@ -0,0 +1,282 @@
+import argparse
+import random
+import textwrap
+import time
+from collections.abc import MutableMapping
+from typing import Optional
+
+from craft_cli import BaseCommand, emit
+
+from .. import messages
+from ..identity import Identity, load_identity
+from ..metrics import TimedStorage, add_metrics_arguments, exporting
+from ..outbox import Outbox
+from ..storage import STORAGE_HELP, open_storage
+from ..timing import TRACE_HELP, trace_hooks
+from .send_message import exchange_batch
+
+
+class ExchangeLoop:
+    """Pings and exchanges messages for a registered client until stopped.
+
+    The storage, the client's identity and the HTTP session are kept for
+    the life of the loop, so each cycle costs only its requests. Like the
+    real client, it pings every `args.ping_interval` seconds and exchanges
+    as soon as a ping says the server has messages for it, as well as every
+    `args.exchange_interval` seconds regardless.
+
+    Every interval is jittered by up to `args.jitter` of itself, so that
+    many clients started together drift apart, and doubles after each
+    consecutive failure, up to `args.max_backoff` seconds.
+    """
+
+    def __init__(
+        self,
+        args: argparse.Namespace,
+        storage: MutableMapping,
+        identity: Identity,
+        rng: Optional[random.Random] = None,
+    ):
+        self.args = args
+        self.storage = storage
+        self.identity = identity
+        self.outbox = Outbox(storage)
+        self.rng = rng or random.Random()
+
+        port = f":{args.ping_port}" if args.ping_port else ""
+        self.ping_url = (
+            f"http://{identity.server_host}{port}/ping"
+            f"?insecure_id={identity.insecure_id}"
+        )
+
+        self.pings = 0
+        self.exchanges = 0
+        self.ping_failures = 0
+        self.exchange_failures = 0
+
+    def delay(self, interval: float, failures: int = 0) -> float:
+        """Returns the jittered delay before the next attempt after
+        `failures` consecutive failures.
+        """
+        if failures:
+            # The exponent is capped too, as a long enough outage would
+            # otherwise overflow the float.
+            interval = min(interval * 2 ** min(failures, 32), self.args.max_backoff)
+
+        jitter = self.args.jitter
+
+        return interval * self.rng.uniform(1 - jitter, 1 + jitter)
+
+    def ping(self) -> Optional[bool]:
+        """Pings the server and returns whether it has messages for this
+        client, or None if the ping failed.
+        """
+        self.pings += 1
+
+        try:
+            status_code, payload = messages.get(
+                self.ping_url, timeout=self.args.timeout
+            )
+        except messages.MessageException:
+            return None
+
+        if status_code != 200:
+            return None
+
+        return bool(payload.get("messages")) if isinstance(payload, dict) else False
+
+    def exchange(self) -> bool:
+        """Exchanges the next batch of queued messages, or none, with the
+        server and returns whether it succeeded.
+        """
+        self.exchanges += 1
+
+        batch = self.outbox.batch(self.args.max_messages, self.args.max_bytes)
+        result = exchange_batch(
+            self.args, self.storage, self.identity, self.outbox, batch
+        )
+        if result is None:
+            return False
+
+        dropped, payload = result
+        received = len(payload.get("messages") or [])
+        emit.progress(
+            f"Exchange {self.identity.next_seq}: sent {dropped} messages, "
+            f"received {received}"
+        )
+
+        return True
+
+    def run(self, duration: Optional[float] = None):
+        """Runs until `duration` seconds have passed, or forever without
+        one.
+        """
+        args = self.args
+        now = start = time.monotonic()
+        end = start + duration if duration is not None else float("inf")
+
+        # Exchange first, as the real client does on starting.
+        next_exchange = next_ping = start
+
+        while now < end:
+            if now >= next_exchange:
+                sequence = self.identity.next_seq
+                if self.exchange():
+                    self.exchange_failures = 0
+                    progressed = self.identity.next_seq != sequence
+                    if progressed and len(self.outbox):
+                        # Send the rest of the queue straight away.
+                        next_exchange = now
+                    elif args.exchange_interval:
+                        next_exchange = now + self.delay(args.exchange_interval)
+                    else:
+                        next_exchange = float("inf")
+                else:
+                    self.exchange_failures += 1
+                    next_exchange = now + self.delay(
+                        args.exchange_interval or args.ping_interval,
+                        self.exchange_failures,
+                    )
+            elif now >= next_ping:
+                pending = self.ping()
+                if pending is None:
+                    self.ping_failures += 1
+                else:
+                    self.ping_failures = 0
+                    if pending and not self.exchange_failures:
+                        next_exchange = now
+
+                next_ping = now + self.delay(args.ping_interval, self.ping_failures)
+            else:
+                time.sleep(min(next_exchange, next_ping, end) - now)
+
+            now = time.monotonic()
+
+
+class RunCommand(BaseCommand):
+    """Runs the client's ping and exchange loop."""
+
+    name = "run"
+    help_msg = "Ping and exchange messages with the Landscape Server instance."
+    overview = textwrap.dedent(
+        """
+        Run this client's ping and message exchange loop until interrupted.
+
+        This client must already be registered. It pings the Landscape
+        Server instance every '--ping-interval' seconds, and exchanges
+        messages whenever a ping says the server has some for it, as well as
+        every '--exchange-interval' seconds. Each exchange sends the next
+        batch of messages queued by 'send_message --batch'.
+
+        Intervals are randomly jittered, and back off exponentially while
+        requests fail.
+
+        Metrics of the requests sent and of storage operations can be
+        served at '/metrics' on '--metrics-port', or written to
+        '--metrics-file' for node_exporter's textfile collector.
+    """
+    )
+
+    def fill_parser(self, parser):
+        parser.add_argument(
+            "--ping-interval",
+            type=float,
+            default=30.0,
+            help="Seconds between pings.",
+        )
+        parser.add_argument(
+            "--exchange-interval",
+            type=float,
+            default=900.0,
+            help="Seconds between exchanges when pings don't trigger one, or 0 "
+            "to exchange only when they do.",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.1,
+            help="Fraction of each interval by which it is randomly shortened "
+            "or lengthened.",
+        )
+        parser.add_argument(
+            "--max-backoff",
+            type=float,
+            default=600.0,
+            help="Longest interval between retries of failing requests, in seconds.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=None,
+            help="Stop after this many seconds. Runs until interrupted by default.",
+        )
+        parser.add_argument(
+            "--ping-port",
+            default="",
+            help="Port that the Landscape Server pingserver is listening on. "
+            "Default is port 80.",
+        )
+        parser.add_argument(
+            "--protocol", default="https", help="Transfer protocol: http or https."
+        )
+        parser.add_argument(
+            "--no-verify",
+            action="store_false",
+            dest="verify",
+            help="Do not verify SSL/TLS",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=None,
+            help="How many seconds to wait for the server to send data before "
+            "giving up",
+        )
+        parser.add_argument(
+            "--max-messages",
+            type=int,
+            default=100,
+            help="Maximum number of messages in each exchange.",
+        )
+        parser.add_argument(
+            "--max-bytes",
+            type=int,
+            default=1024 * 1024,
+            help="Maximum encoded size of the messages in each exchange.",
+        )
+        parser.add_argument(
+            "--storage",
+            default=".lmc-storage.pickle",
+            help=STORAGE_HELP,
+        )
+        parser.add_argument(
+            "--trace",
+            default=None,
+            help=TRACE_HELP,
+        )
+        add_metrics_arguments(parser)
+
+    def run(self, parsed_args):
+        storage = open_storage(parsed_args.storage)
+        identity = load_identity(storage)
+
+        if identity is None or not storage.get("registered"):
+            emit.message("Not registered. Nothing to do.")
+            return
+
+        with exporting(parsed_args) as metrics:
+            hooks = trace_hooks(parsed_args.trace) if parsed_args.trace else []
+            if metrics is not None:
+                hooks.append(metrics)
+                storage = TimedStorage(storage, metrics)
+            if hooks:
+                messages.configure_client(timing_hooks=hooks)
+
+            loop = ExchangeLoop(parsed_args, storage, identity)
+
+            try:
+                loop.run(parsed_args.duration)
+            except KeyboardInterrupt:
+                pass
+
+        emit.message(f"Sent {loop.pings} pings and {loop.exchanges} exchanges.")
@@ -1,22 +1,26 @@
 import argparse
+import glob
 import json
+import os
 import textwrap
+from typing import List, Optional, Tuple
 
 from craft_cli import BaseCommand, emit
 
-from ..messages import MessageException, send_message
-from ..storage import ClientStorage
+from ..identity import Identity, load_identity, store_identity, text
+from ..messages import MessageException, configure_client, send_message
+from ..outbox import Outbox
+from ..storage import STORAGE_HELP, ClientStorage, open_storage
+from ..timing import TRACE_HELP, trace_hooks
 
 
 def send_prepared_message(args: argparse.Namespace, storage: ClientStorage) -> None:
     """Sends an arbitrary message to a Landscape Server instance."""
-    if "registration_info" not in storage or not storage.get("registered"):
+    identity = load_identity(storage)
+    if identity is None or not storage.get("registered"):
         emit.message("Not registered - not sure where to send message")
         return
 
-    server_host = storage["registration_info"]["server_host"]
-    server_port = storage["registration_info"]["server_port"]
-
     with open(args.message) as message_fp:
         try:
             message = json.load(message_fp)
@@ -24,31 +28,187 @@ def send_prepared_message(args: argparse.Namespace, storage: ClientStorage) -> N
             emit.message(f"There was a problem parsing '{args.message}': {e}")
             return
 
-    message["server-uuid"] = storage["registration_info"]["server_uuid"]
-    message["sequence"] = storage["next_seq"]
-    secure_id = storage["registration_info"]["secure_id"]
+    message["server-uuid"] = identity.server_uuid
+    message["sequence"] = identity.next_seq
 
     try:
         status_code, payload = send_message(
-            f"{args.protocol}://{server_host}{server_port}/message-system",
+            f"{args.protocol}://{identity.server_host}{identity.server_port}"
+            "/message-system",
             message,
             verify=args.verify,
             timeout=args.timeout,
-            secure_id=secure_id,
+            secure_id=identity.secure_id,
         )
     except MessageException:
         emit.message("Message sending failed")
     else:
         if status_code == 200:
             emit.message("Message sent successfully")
-            storage["next_seq"] = payload["next-expected-sequence"]
-            storage["next_tok"] = payload["next-exchange-token"]
+            identity.next_seq = payload["next-expected-sequence"]
+            identity.next_tok = text(payload["next-exchange-token"])
+            store_identity(storage, identity)
         else:
             emit.message("Message sending failed. Response {status_code}")
 
         emit.message(f"Received message: {payload}")
 
 
+def read_messages(path: str) -> List[dict]:
+    """Reads the messages in the JSON file `path`, or in each JSON file in
+    the directory `path`, in name order.
+
+    A file holding an exchange, with a "messages" list, holds each message
+    in that list. Any other file is a single message.
+    """
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, "*.json")))
+    else:
+        paths = [path]
+
+    messages = []
+    for message_path in paths:
+        with open(message_path) as message_fp:
+            content = json.load(message_fp)
+
+        if isinstance(content, dict) and isinstance(content.get("messages"), list):
+            messages.extend(content["messages"])
+        else:
+            messages.append(content)
+
+    return messages
+
+
+def send_batched_messages(args: argparse.Namespace, storage: ClientStorage) -> None:
+    """Queues the messages read from `args.message`, if given, then sends
+    every queued message to a Landscape Server instance.
+    """
+    identity = load_identity(storage)
+    if identity is None or not storage.get("registered"):
+        emit.message("Not registered - not sure where to send message")
+        return
+
+    outbox = Outbox(storage)
+
+    if args.message:
+        try:
+            messages = read_messages(args.message)
+        except (OSError, ValueError) as e:
+            emit.message(f"There was a problem reading '{args.message}': {e}")
+            return
+
+        pending = outbox.add(messages)
+        emit.message(f"Queued {len(messages)} messages, {pending} pending")
+
+    acknowledged = exchange_outbox(args, storage, identity, outbox)
+
+    emit.message(f"{acknowledged} messages acknowledged, {len(outbox)} pending")
+
+
+def exchange_outbox(
+    args: argparse.Namespace,
+    storage: ClientStorage,
+    identity: Identity,
+    outbox: Outbox,
+) -> int:
+    """Sends the messages in `outbox` in exchanges of up to
+    `args.max_messages` messages and `args.max_bytes` bytes, until the
+    server has acknowledged all of them or stops accepting them.
+
+    Returns the number of messages acknowledged.
+    """
+    acknowledged = 0
+
+    while True:
+        batch = outbox.batch(args.max_messages, args.max_bytes)
+        if not batch:
+            break
+
+        sequence = identity.next_seq
+        result = exchange_batch(args, storage, identity, outbox, batch)
+        if result is None:
+            break
+
+        dropped, _ = result
+        acknowledged += dropped
+
+        if not dropped and identity.next_seq == sequence:
+            break
+
+    return acknowledged
+
+
+def exchange_batch(
+    args: argparse.Namespace,
+    storage: ClientStorage,
+    identity: Identity,
+    outbox: Outbox,
+    batch: List[dict],
+) -> Optional[Tuple[int, dict]]:
+    """Sends `batch`, the oldest messages in `outbox`, in one exchange.
+
+    Messages are dropped from `outbox` only once the server's
+    "next-expected-sequence" is past them, and the client's sequence
+    follows the server's. Returns the number of messages dropped and the
+    server's payload, or None if the exchange failed or its response
+    couldn't be understood.
+    """
+    sequence = identity.next_seq
+    exchange = {
+        "server-uuid": identity.server_uuid,
+        "sequence": sequence,
+        "messages": batch,
+    }
+
+    try:
+        status_code, payload = send_message(
+            f"{args.protocol}://{identity.server_host}{identity.server_port}"
+            "/message-system",
+            exchange,
+            verify=args.verify,
+            timeout=args.timeout,
+            secure_id=identity.secure_id,
+        )
+    except MessageException:
+        emit.message("Message sending failed")
+        return None
+
+    if status_code != 200:
+        emit.message(f"Message sending failed. Response {status_code}")
+        return None
+
+    next_expected = (
+        payload.get("next-expected-sequence") if isinstance(payload, dict) else None
+    )
+    if not isinstance(next_expected, int):
+        emit.message("Message sending failed. Unexpected response")
+        return None
+
+    accepted = next_expected - sequence
+    if accepted < 0:
+        # The server has lost messages already dropped from the outbox,
+        # which can't be sent again.
+        emit.message(
+            f"Server expected sequence {next_expected}, not {sequence}. "
+            "Resynchronizing"
+        )
+
+    # Messages pending past the batch may have been accepted by an earlier
+    # exchange whose response was lost.
+    dropped = max(0, min(accepted, len(outbox)))
+
+    with storage.transaction():
+        outbox.acknowledge(dropped)
+        identity.next_seq = next_expected
+        identity.next_tok = text(payload.get("next-exchange-token"))
+        store_identity(storage, identity)
+
+    if dropped < len(batch):
+        emit.message(f"Server accepted {dropped} of {len(batch)} messages")
+
+    return dropped, payload
+
+
 class SendMessageCommand(BaseCommand):
     """Sends an arbitrary message to a Landscape Server instance."""
 
@@ -61,14 +221,40 @@ class SendMessageCommand(BaseCommand):
         This will only work properly if you've already registered with the
         instance. You must provide a JSON-formatted file from which to read the
         message.
+
+        With '--batch', or a directory of JSON files as '--message', the
+        messages are queued in an outbox in storage, and every queued message
+        is sent, packed into as few exchanges as '--max-messages' and
+        '--max-bytes' allow. Messages stay queued until the server
+        acknowledges them, and are sent again by the next '--batch' run if it
+        doesn't. A file holding an exchange, with a "messages" list, queues
+        each message in it.
         """
     )
 
     def fill_parser(self, parser):
         parser.add_argument(
             "--message",
-            required=True,
-            help="JSON-formatted file from which to read the message."
+            default=None,
+            help="JSON-formatted file from which to read the message, or a "
+            "directory of them to queue and send as a batch.",
+        )
+        parser.add_argument(
+            "--batch",
+            action="store_true",
+            help="Queue the message, if any, and send every queued message.",
+        )
+        parser.add_argument(
+            "--max-messages",
+            type=int,
+            default=100,
+            help="Maximum number of messages in each batched exchange.",
+        )
+        parser.add_argument(
+            "--max-bytes",
+            type=int,
+            default=1024 * 1024,
+            help="Maximum encoded size of the messages in each batched exchange.",
         )
         parser.add_argument(
             "--protocol", default="https", help="Transfer protocol: http or https.",
@@ -88,9 +274,28 @@ class SendMessageCommand(BaseCommand):
         parser.add_argument(
             "--storage",
             default=".lmc-storage.pickle",
-            help="File in which to store local registration and message state "
-            "information",
+            help=STORAGE_HELP,
+        )
+        parser.add_argument(
+            "--trace",
+            default=None,
+            help=TRACE_HELP,
         )
 
     def run(self, parsed_args):
-        send_prepared_message(parsed_args, ClientStorage(parsed_args.storage))
+        if parsed_args.trace:
+            configure_client(timing_hooks=trace_hooks(parsed_args.trace))
+
+        storage = open_storage(parsed_args.storage)
+
+        if parsed_args.batch or (
+            parsed_args.message and os.path.isdir(parsed_args.message)
+        ):
+            send_batched_messages(parsed_args, storage)
+        elif parsed_args.message:
+            send_prepared_message(parsed_args, storage)
+        else:
+            emit.message(
+                "No message given. Use --message, or --batch to send "
+                "queued messages."
+            )
@@ -2,7 +2,7 @@ import textwrap
 
 from craft_cli import BaseCommand, emit
 
-from ..storage import ClientStorage
+from ..storage import STORAGE_HELP, migrate, open_storage
 
 
 class ClearStorageCommand(BaseCommand):
@@ -19,8 +19,52 @@ class ClearStorageCommand(BaseCommand):
     """
     )
 
-    def run(self, _):
-        storage = ClientStorage()
+    def fill_parser(self, parser):
+        parser.add_argument(
+            "--storage",
+            default=".lmc-storage.pickle",
+            help=STORAGE_HELP,
+        )
+
+    def run(self, parsed_args):
+        storage = open_storage(parsed_args.storage)
 
         storage.clear()
         emit.message("Local storage cleared")
+
+
+class MigrateStorageCommand(BaseCommand):
+    """Copies this client's local storage into another backend."""
+
+    name = "migrate-storage"
+    help_msg = "Copies this client's local storage into another storage backend."
+    overview = textwrap.dedent(
+        """
+        Copy this client's local storage into another storage backend.
+
+        Every item in the source storage is copied into the target
+        storage, such as from a pickle file into a client's namespace in
+        a SQLite database. The source is left as it is.
+    """
+    )
+
+    def fill_parser(self, parser):
+        parser.add_argument(
+            "--from",
+            dest="source",
+            default=".lmc-storage.pickle",
+            help="Storage to copy from. " + STORAGE_HELP,
+        )
+        parser.add_argument(
+            "--to",
+            dest="target",
+            required=True,
+            help="Storage to copy into, in the same form as --from.",
+        )
+
+    def run(self, parsed_args):
+        copied = migrate(
+            open_storage(parsed_args.source), open_storage(parsed_args.target)
+        )
+
+        emit.message(f"Copied {copied} items to {parsed_args.target}")
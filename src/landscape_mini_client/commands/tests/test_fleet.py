@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+from http.server import BaseHTTPRequestHandler, HTTPStatus, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from ...metrics import ClientMetrics
+from ...storage import open_storage
+from ...util import bpickle
+from ...identity import Identity
+from ..fleet import (
+    FleetServer,
+    load_fleet,
+    register_fleet,
+    run_fleet,
+    save_fleet,
+)
+
+
+class FleetHandler(BaseHTTPRequestHandler):
+    """Answers registrations, exchanges and pings like Landscape Server."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if self.path.startswith("/ping"):
+            payload = b"b0"
+        else:
+            message = bpickle.loads(body)[0]
+
+            if message["messages"] and message["messages"][0]["type"] == "register":
+                title = message["messages"][0]["computer_title"]
+                if title in self.server.dropped:
+                    # Close the connection partway through the response.
+                    self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nab")
+                    self.close_connection = True
+                    return
+
+                payload = bpickle.dumps(
+                    {
+                        "server-uuid": b"uuid",
+                        "messages": [
+                            {
+                                "type": "set-id",
+                                "id": f"secure-{title}".encode(),
+                                "insecure-id": int(title.rpartition("-")[2]),
+                            }
+                        ],
+                    }
+                )
+            else:
+                self.server.exchanged.append(self.headers["X-Computer-ID"])
+                payload = bpickle.dumps(
+                    {
+                        "server-uuid": b"uuid",
+                        "next-expected-sequence": message["sequence"] + 1,
+                        "next-exchange-token": b"token",
+                        "messages": [],
+                    }
+                )
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("localhost", 0), FleetHandler)
+    server.exchanged = []
+    server.dropped = set()
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def registration_args(server) -> argparse.Namespace:
+    return argparse.Namespace(
+        account_name="onward",
+        registration_key="",
+        tags="",
+        container_info="",
+        vm_info="",
+        protocol="http",
+        server_host="localhost",
+        port=str(server.server_port),
+        verify=False,
+    )
+
+
+class TestFleet:
+    def test_register(self, server):
+        """Tests that each title is registered and given its identity."""
+        titles = [f"fleet-{i:05d}" for i in range(20)]
+
+        identities, server_uuid, stats = asyncio.run(
+            register_fleet(registration_args(server), titles, concurrency=5)
+        )
+
+        assert server_uuid == "uuid"
+        port = f":{server.server_port}"
+        assert sorted(identities, key=lambda identity: identity.title) == [
+            Identity(f"secure-{title}", i, "localhost", port, "uuid", title=title)
+            for i, title in enumerate(titles)
+        ]
+        assert stats.outcomes_by_server() == {"register": {"200": 20}}
+
+    def test_register_dropped(self, server):
+        """Tests that a client whose connection drops is counted as failed,
+        and the others are still registered.
+        """
+        titles = [f"fleet-{i:05d}" for i in range(5)]
+        server.dropped = {"fleet-00002"}
+
+        identities, server_uuid, stats = asyncio.run(
+            register_fleet(registration_args(server), titles, concurrency=5)
+        )
+
+        assert server_uuid == "uuid"
+        assert sorted(identity.title for identity in identities) == [
+            title for title in titles if title != "fleet-00002"
+        ]
+        assert stats.outcomes_by_server() == {
+            "register": {"200": 4, "IncompleteReadError": 1}
+        }
+
+    def test_register_unreachable(self):
+        """Tests that failed registrations are counted, not raised."""
+        args = registration_args(argparse.Namespace(server_port=1))
+
+        identities, server_uuid, stats = asyncio.run(
+            register_fleet(args, ["fleet-00000"], timeout=1)
+        )
+
+        assert identities == []
+        assert server_uuid is None
+        assert stats.outcomes_by_server() == {"register": {"ConnectionRefusedError": 1}}
+
+    def test_run(self, server):
+        """Tests that every client exchanges and pings on schedule, and its
+        sequence advances with each exchange.
+        """
+        fleet_server = FleetServer(
+            "http", "localhost", f":{server.server_port}", "uuid"
+        )
+        fleet = [Identity(f"secure-{i}", i, title=f"fleet-{i}") for i in range(10)]
+
+        stats, elapsed = asyncio.run(
+            run_fleet(
+                fleet_server,
+                fleet,
+                exchange_interval=0.2,
+                ping_interval=0.1,
+                ping_port=str(server.server_port),
+                duration=0.5,
+                concurrency=4,
+                seed=1,
+                report_interval=10,
+            )
+        )
+
+        outcomes = stats.outcomes_by_server()
+        assert set(outcomes) == {"exchange", "ping"}
+        assert 20 <= outcomes["exchange"]["200"] <= 30
+        assert 40 <= outcomes["ping"]["200"] <= 50
+        assert stats.lag.count == stats.count
+        assert elapsed >= 0.5
+
+        assert sorted(set(server.exchanged)) == sorted(f"secure-{i}" for i in range(10))
+        for identity in fleet:
+            assert identity.next_seq == server.exchanged.count(identity.secure_id)
+            assert identity.next_tok == "token"
+
+    def test_run_metrics(self, server):
+        """Tests that each request is recorded in the metrics, with the
+        bytes exchanged.
+        """
+        netloc = f"localhost:{server.server_port}"
+        fleet_server = FleetServer(
+            "http", "localhost", f":{server.server_port}", "uuid"
+        )
+        fleet = [Identity(f"secure-{i}", i) for i in range(5)]
+        metrics = ClientMetrics()
+
+        stats, _ = asyncio.run(
+            run_fleet(
+                fleet_server,
+                fleet,
+                exchange_interval=0.2,
+                ping_interval=0.2,
+                ping_port=str(server.server_port),
+                duration=0.3,
+                metrics=metrics,
+            )
+        )
+
+        outcomes = stats.outcomes_by_server()
+        assert metrics.requests.values == {
+            ("exchange", netloc, "200"): outcomes["exchange"]["200"],
+            ("ping", netloc, "200"): outcomes["ping"]["200"],
+        }
+        assert metrics.sent_bytes.values[("exchange", netloc)] > 0
+        assert metrics.received_bytes.values[("exchange", netloc)] > 0
+        assert ("exchange",) in metrics.decode_duration.values
+        assert sum(metrics.schedule_lag.values[()][0]) == stats.lag.count
+
+    def test_storage(self, tmp_path):
+        """Tests that a fleet is stored and loaded back unchanged."""
+        storage = open_storage(str(tmp_path / "fleet.sqlite"))
+        fleet_server = FleetServer("https", "example.com", "", "uuid")
+        fleet = [
+            Identity(f"secure-{i}", i, "example.com", "", "uuid", i, None, f"fleet-{i}")
+            for i in range(3)
+        ]
+
+        assert load_fleet(storage) == (None, {})
+
+        save_fleet(storage, fleet_server, fleet)
+
+        assert load_fleet(storage) == (
+            fleet_server,
+            {identity.title: identity for identity in fleet},
+        )
@@ -0,0 +1,207 @@
+import argparse
+import csv
+import json
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPStatus, ThreadingHTTPServer
+from threading import Thread
+from unittest.mock import patch
+
+import pytest
+
+from ...metrics import ClientMetrics
+from ...util.schedule import RateSchedule
+from ..pingspam import PingspamCommand, pingspam, write_summary
+
+
+class PingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class DroppingHandler(socketserver.BaseRequestHandler):
+    """Starts responding to each ping, then closes the connection."""
+
+    def handle(self):
+        self.request.recv(65536)
+        self.request.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nab")
+
+
+@pytest.fixture
+def dropping_server():
+    server = socketserver.ThreadingTCPServer(("localhost", 0), DroppingHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("localhost", 0), PingHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"localhost:{server.server_port}"
+    server.shutdown()
+
+
+class TestPingspam:
+    @pytest.mark.parametrize("backend", ["requests", "async", "pipelined"])
+    def test_count(self, server, backend):
+        """Tests that exactly `count` pings are sent, then workers stop."""
+        stats, elapsed = pingspam(
+            [server],
+            ["1", "2"],
+            workers=2,
+            backend=backend,
+            concurrency=2,
+            report_interval=0.1,
+            count=25,
+        )
+
+        assert stats.count == 25
+        assert stats.outcomes_by_server() == {server: {"200": 25}}
+        assert elapsed > 0
+
+    def test_duration(self, server):
+        """Tests that pinging stops once the duration is up."""
+        stats, elapsed = pingspam(
+            [server],
+            ["1"],
+            workers=1,
+            backend="async",
+            concurrency=1,
+            report_interval=0.1,
+            duration=0.3,
+        )
+
+        assert stats.count > 0
+        assert 0.3 <= elapsed < 5
+
+    def test_metrics(self, server):
+        """Tests that every worker's pings are recorded in the metrics."""
+        metrics = ClientMetrics()
+
+        stats, _ = pingspam(
+            [server],
+            ["1"],
+            workers=2,
+            backend="async",
+            concurrency=2,
+            report_interval=0.1,
+            count=20,
+            metrics=metrics,
+        )
+
+        assert metrics.requests.values == {("ping", server, "200"): 20}
+        counts, _ = metrics.request_duration.values[("ping", server)]
+        assert sum(counts) == 20
+
+    def test_connection_errors(self):
+        """Tests that failed pings are counted rather than crashing."""
+        stats, _ = pingspam(
+            ["localhost:1"],
+            ["1"],
+            workers=1,
+            report_interval=0.1,
+            count=3,
+        )
+
+        assert stats.outcomes_by_server() == {"localhost:1": {"ConnectionError": 3}}
+
+    @pytest.mark.parametrize("backend", ["async", "pipelined"])
+    def test_dropped_connections(self, dropping_server, backend):
+        """Tests that connections closed mid-response are counted as failed
+        pings rather than stopping the worker.
+        """
+        stats, _ = pingspam(
+            [dropping_server],
+            ["1"],
+            workers=1,
+            backend=backend,
+            concurrency=1,
+            report_interval=0.1,
+            count=5,
+        )
+
+        assert stats.count == 5
+        assert "200" not in stats.outcomes_by_server()[dropping_server]
+
+    def test_requests_backend_rejects_rate(self):
+        """Tests that open-loop scheduling requires the async backend."""
+        with pytest.raises(ValueError):
+            pingspam(["localhost"], ["1"], 1, schedule=RateSchedule.constant(1))
+
+    @pytest.mark.parametrize(
+        "option", [["--rate", "0"], ["--rate", "-1"], ["--ramp", "linear:0:0:10"]]
+    )
+    def test_rejects_zero_rate(self, tmp_path, capsys, option):
+        """Tests that a target rate that would never send a ping is
+        rejected, rather than run as an unlimited flood.
+        """
+        (tmp_path / "servers").write_text("localhost\n")
+        (tmp_path / "ids").write_text("1\n")
+        command = PingspamCommand(None)
+        parser = argparse.ArgumentParser()
+        command.fill_parser(parser)
+        args = parser.parse_args(
+            [
+                f"--servers={tmp_path / 'servers'}",
+                f"--insecure-ids={tmp_path / 'ids'}",
+                "--backend=async",
+                *option,
+            ]
+        )
+
+        with patch(f"{PingspamCommand.__module__}.pingspam") as pingspam_mock:
+            command.run(args)
+
+        pingspam_mock.assert_not_called()
+        assert capsys.readouterr().err
+
+
+class TestWriteSummary:
+    summary = {
+        "pings": 3,
+        "throughput": 3.0,
+        "errors": 1,
+        "latency_ms": {"mean": 2.0, "p50": 1.0},
+        "outcomes": {"200": 2, "503": 1},
+        "duration": 1.0,
+        "servers": {
+            "a": {
+                "pings": 3,
+                "throughput": 3.0,
+                "errors": 1,
+                "latency_ms": {"mean": 2.0, "p50": 1.0},
+                "outcomes": {"200": 2, "503": 1},
+            }
+        },
+    }
+
+    def test_json(self, tmp_path):
+        path = str(tmp_path / "summary.json")
+
+        write_summary(path, self.summary)
+
+        with open(path) as fp:
+            assert json.load(fp) == self.summary
+
+    def test_csv(self, tmp_path):
+        """Tests that the CSV has an overall row and one per server."""
+        path = str(tmp_path / "summary.csv")
+
+        write_summary(path, self.summary)
+
+        with open(path) as fp:
+            rows = list(csv.DictReader(fp))
+
+        assert [row["server"] for row in rows] == ["all", "a"]
+        assert rows[1]["latency_p50_ms"] == "1.0"
+        assert rows[1]["outcome_503"] == "1"
@@ -4,6 +4,7 @@ from unittest.mock import ANY, patch
 import pytest
 
 from ...messages import MessageException
+from ...util import bpickle
 from ..register import register
 
 
@@ -42,6 +43,19 @@ class TestRegister:
 
         emitter.assert_message("Registration request successful")
 
+    def test_register_message(self, send_message_mock, storage):
+        """Tests that the registration message carries the arguments."""
+        send_message_mock.side_effect = MessageException()
+
+        register(self.namespace, storage)
+
+        message, _ = bpickle.loads(send_message_mock.call_args[0][1])
+        (registration,) = message["messages"]
+        assert registration["type"] == "register"
+        assert registration["account_name"] == "test"
+        assert isinstance(registration["hostname"], str)
+        assert isinstance(registration["timestamp"], int)
+
     def test_register_suppress_warnings(self, send_message_mock, storage):
         """
         Tests that https warnings are filtered when args.verify is
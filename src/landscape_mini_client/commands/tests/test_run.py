@@ -0,0 +1,190 @@
+from argparse import Namespace
+from http.server import BaseHTTPRequestHandler, HTTPStatus, ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from ...identity import Identity, load_identity, store_identity
+from ...outbox import Outbox
+from ...storage import ClientStorage
+from ...util import bpickle
+from ..run import ExchangeLoop
+
+
+class ServerHandler(BaseHTTPRequestHandler):
+    """Answers pings with whether messages are pending, and accepts every
+    message exchanged.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if self.path.startswith("/ping"):
+            self.server.pings += 1
+            if self.server.ping_status != 200:
+                return self.respond(b"", self.server.ping_status)
+
+            payload = {"messages": self.server.pending}
+            self.server.pending = False
+        elif self.server.exchange_status != 200:
+            # As a proxy in front of the server would answer.
+            self.server.exchange_attempts += 1
+            return self.respond(
+                b"<html>Bad Gateway</html>", self.server.exchange_status
+            )
+        else:
+            exchange = bpickle.loads(body)[0]
+            self.server.exchanges.append(exchange)
+            payload = {
+                "next-expected-sequence": exchange["sequence"]
+                + len(exchange["messages"]),
+                "next-exchange-token": b"token",
+                "messages": [],
+            }
+
+        self.respond(bpickle.dumps(payload))
+
+    def respond(self, payload, status=HTTPStatus.OK):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("localhost", 0), ServerHandler)
+    server.pings = 0
+    server.ping_status = 200
+    server.pending = False
+    server.exchanges = []
+    server.exchange_status = 200
+    server.exchange_attempts = 0
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def storage(tmp_path, server):
+    storage = ClientStorage(str(tmp_path / "storage"))
+    storage["registered"] = True
+    port = f":{server.server_port}"
+    store_identity(storage, Identity("secure", 1, "localhost", port, "uuid"))
+
+    return storage
+
+
+def namespace(server, **options):
+    args = Namespace(
+        ping_interval=0.05,
+        exchange_interval=0.0,
+        jitter=0.0,
+        max_backoff=600.0,
+        ping_port=str(server.server_port),
+        protocol="http",
+        verify=False,
+        timeout=5,
+        max_messages=100,
+        max_bytes=1024 * 1024,
+    )
+    vars(args).update(options)
+
+    return args
+
+
+class TestExchangeLoop:
+    def test_ping_triggers_exchange(self, server, storage):
+        """Tests that the loop exchanges on starting, then only once a ping
+        says messages are pending.
+        """
+        loop = ExchangeLoop(namespace(server), storage, load_identity(storage))
+
+        loop.run(0.2)
+
+        assert len(server.exchanges) == 1
+        assert server.pings >= 3
+
+        server.pending = True
+        loop.run(0.2)
+
+        # One on starting again, and one the ping triggered.
+        assert len(server.exchanges) == 3
+
+    def test_exchange_interval(self, server, storage):
+        loop = ExchangeLoop(
+            namespace(server, ping_interval=10, exchange_interval=0.05),
+            storage,
+            load_identity(storage),
+        )
+
+        loop.run(0.28)
+
+        assert 5 <= len(server.exchanges) <= 6
+        assert server.pings == 1
+
+    def test_sends_queue(self, server, storage):
+        """Tests that queued messages are sent in consecutive exchanges,
+        and the sequence follows them.
+        """
+        Outbox(storage).add([{"type": "test", "n": n} for n in range(5)])
+        loop = ExchangeLoop(
+            namespace(server, max_messages=2), storage, load_identity(storage)
+        )
+
+        loop.run(0.1)
+
+        assert [
+            [message["n"] for message in exchange["messages"]]
+            for exchange in server.exchanges
+        ] == [[0, 1], [2, 3], [4]]
+        assert [exchange["sequence"] for exchange in server.exchanges] == [0, 2, 4]
+        assert len(Outbox(storage)) == 0
+        assert load_identity(storage).next_seq == 5
+
+    def test_backoff(self, server, storage):
+        """Tests that pings back off while they fail."""
+        server.ping_status = 503
+        loop = ExchangeLoop(namespace(server), storage, load_identity(storage))
+
+        loop.run(0.5)
+
+        # At 0, 0.1, 0.3 then 0.7 seconds.
+        assert server.pings == 3
+        assert loop.ping_failures == 3
+
+    def test_exchange_error_page(self, server, storage):
+        """Tests that exchanges answered with an error page rather than a
+        bpickle count as failures, and back off.
+        """
+        server.exchange_status = 502
+        loop = ExchangeLoop(
+            namespace(server, ping_interval=10, exchange_interval=0.05),
+            storage,
+            load_identity(storage),
+        )
+
+        loop.run(0.5)
+
+        # At 0, 0.1, 0.3 then 0.7 seconds.
+        assert server.exchange_attempts == 3
+        assert loop.exchange_failures == 3
+        assert load_identity(storage).next_seq == 0
+
+    def test_delay(self, server, storage):
+        args = namespace(server, jitter=0.1, max_backoff=50)
+        loop = ExchangeLoop(args, storage, load_identity(storage))
+
+        delays = [loop.delay(10) for _ in range(100)]
+
+        assert all(9 <= delay <= 11 for delay in delays)
+        assert len(set(delays)) > 1
+        assert 36 <= loop.delay(10, 2) <= 44
+        assert 45 <= loop.delay(10, 5) <= 55
+        assert 45 <= loop.delay(10.0, 2000) <= 55
@@ -0,0 +1,168 @@
+import json
+from argparse import Namespace
+from unittest.mock import patch
+
+import pytest
+
+from ...identity import Identity, load_identity, store_identity
+from ...messages import MessageException
+from ...outbox import Outbox
+from ...storage import ClientStorage
+from ..send_message import read_messages, send_batched_messages
+
+
+@pytest.fixture
+def send_message_mock():
+    send_message_patch = patch(f"{send_batched_messages.__module__}.send_message")
+    yield send_message_patch.start()
+    send_message_patch.stop()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = ClientStorage(str(tmp_path / "storage"))
+    storage["registered"] = True
+    store_identity(storage, Identity("secure", 1, "localhost", "", "uuid"))
+
+    return storage
+
+
+@pytest.fixture
+def message_dir(tmp_path):
+    message_dir = tmp_path / "messages"
+    message_dir.mkdir()
+
+    for n in range(5):
+        (message_dir / f"{n:02d}.json").write_text(json.dumps({"type": "t", "n": n}))
+
+    return str(message_dir)
+
+
+def accept(count=None):
+    """Returns a server that accepts up to `count` messages per exchange."""
+
+    def exchange(url, message, **kwargs):
+        accepted = len(message["messages"])
+        if count is not None:
+            accepted = min(accepted, count)
+
+        return 200, {
+            "next-expected-sequence": message["sequence"] + accepted,
+            "next-exchange-token": b"token",
+        }
+
+    return exchange
+
+
+class TestSendBatchedMessages:
+    def namespace(self, message=None, max_messages=100, max_bytes=1024 * 1024):
+        return Namespace(
+            message=message,
+            protocol="http",
+            verify=False,
+            timeout=5,
+            max_messages=max_messages,
+            max_bytes=max_bytes,
+        )
+
+    def sent(self, send_message_mock):
+        return [
+            [message["n"] for message in call.args[1]["messages"]]
+            for call in send_message_mock.call_args_list
+        ]
+
+    def test_batches(self, send_message_mock, storage, message_dir):
+        """Tests that queued messages are sent in exchanges of up to
+        `max_messages`, each with the next sequence number.
+        """
+        send_message_mock.side_effect = accept()
+
+        send_batched_messages(self.namespace(message_dir, max_messages=2), storage)
+
+        assert self.sent(send_message_mock) == [[0, 1], [2, 3], [4]]
+        assert [
+            call.args[1]["sequence"] for call in send_message_mock.call_args_list
+        ] == [0, 2, 4]
+        assert len(Outbox(storage)) == 0
+        assert load_identity(storage).next_seq == 5
+        assert load_identity(storage).next_tok == "token"
+
+    def test_partial_acceptance(self, send_message_mock, storage, message_dir):
+        """Tests that messages the server didn't accept are sent again."""
+        send_message_mock.side_effect = accept(2)
+
+        send_batched_messages(self.namespace(message_dir, max_messages=3), storage)
+
+        assert self.sent(send_message_mock) == [[0, 1, 2], [2, 3, 4], [4]]
+        assert len(Outbox(storage)) == 0
+        assert load_identity(storage).next_seq == 5
+
+    def test_no_acceptance(self, send_message_mock, storage, message_dir):
+        """Tests that sending stops once the server accepts nothing."""
+        send_message_mock.side_effect = accept(0)
+
+        send_batched_messages(self.namespace(message_dir), storage)
+
+        assert send_message_mock.call_count == 1
+        assert len(Outbox(storage)) == 5
+
+    def test_failure_keeps_messages(self, send_message_mock, storage, message_dir):
+        """Tests that messages stay queued through a failed exchange, and
+        are sent by the next batch.
+        """
+        send_message_mock.side_effect = MessageException()
+
+        send_batched_messages(self.namespace(message_dir), storage)
+
+        assert len(Outbox(storage)) == 5
+        assert load_identity(storage).next_seq == 0
+
+        send_message_mock.reset_mock()
+        send_message_mock.side_effect = accept()
+
+        send_batched_messages(self.namespace(), storage)
+
+        assert self.sent(send_message_mock) == [[0, 1, 2, 3, 4]]
+        assert len(Outbox(storage)) == 0
+
+    def test_resynchronize(self, send_message_mock, storage, message_dir):
+        """Tests that the client follows a server expecting an earlier
+        sequence number.
+        """
+        identity = load_identity(storage)
+        identity.next_seq = 10
+        store_identity(storage, identity)
+        send_message_mock.side_effect = [
+            (200, {"next-expected-sequence": 7}),
+            (200, {"next-expected-sequence": 12}),
+        ]
+
+        send_batched_messages(self.namespace(message_dir), storage)
+
+        assert [
+            call.args[1]["sequence"] for call in send_message_mock.call_args_list
+        ] == [10, 7]
+        assert len(Outbox(storage)) == 0
+        assert load_identity(storage).next_seq == 12
+
+    def test_not_registered(self, emitter, send_message_mock, tmp_path):
+        storage = ClientStorage(str(tmp_path / "storage"))
+
+        send_batched_messages(self.namespace(), storage)
+
+        emitter.assert_message("Not registered - not sure where to send message")
+        send_message_mock.assert_not_called()
+
+
+class TestReadMessages:
+    def test_exchange_file(self, tmp_path):
+        """Tests that a file holding an exchange holds its messages."""
+        path = tmp_path / "exchange.json"
+        path.write_text(json.dumps({"messages": [{"type": "a"}, {"type": "b"}]}))
+
+        assert read_messages(str(path)) == [{"type": "a"}, {"type": "b"}]
+
+    def test_directory(self, message_dir):
+        messages = read_messages(message_dir)
+
+        assert [message["n"] for message in messages] == list(range(5))
@@ -0,0 +1,181 @@
+"""Compact records of a registered client's identity and exchange state.
+
+A simulated fleet holds one `Identity` per client in memory, so they are
+`__slots__` objects rather than dictionaries, and are stored as a single
+packed byte string rather than as pickled dictionaries and loose keys.
+"""
+
+import struct
+from collections.abc import MutableMapping
+from sys import intern
+from typing import Optional, Tuple
+
+
+# Insecure ID and next sequence number, then a bit for each string field,
+# in `_STRING_FIELDS` order, set if it is None. The fields follow, encoded
+# and separated by NUL, which identifiers never contain.
+_HEADER = struct.Struct(">qqB")
+_SEPARATOR = "\x00"
+_STRING_FIELDS = (
+    "title",
+    "server_host",
+    "server_port",
+    "server_uuid",
+    "secure_id",
+    "next_tok",
+)
+
+IDENTITY_KEY = "identity"
+
+
+class Identity:
+    """A client's registration with a Landscape Server instance, and the
+    state of its message exchanges.
+
+    `server_port` is either empty, for the protocol's default port, or
+    ":PORT".
+    """
+
+    __slots__ = _STRING_FIELDS + ("insecure_id", "next_seq")
+
+    def __init__(
+        self,
+        secure_id: str,
+        insecure_id: int,
+        server_host: str = "",
+        server_port: str = "",
+        server_uuid: str = "",
+        next_seq: int = 0,
+        next_tok: Optional[str] = None,
+        title: str = "",
+    ):
+        self.title = title
+        self.server_host = server_host
+        self.server_port = server_port
+        self.server_uuid = server_uuid
+        self.secure_id = secure_id
+        self.insecure_id = insecure_id
+        self.next_seq = next_seq
+        self.next_tok = next_tok
+
+    def pack(self) -> bytes:
+        """Returns this identity as a byte string for `unpack`."""
+        strings = (
+            self.title,
+            self.server_host,
+            self.server_port,
+            self.server_uuid,
+            self.secure_id,
+            self.next_tok,
+        )
+
+        nones = 0
+        for bit, value in enumerate(strings):
+            if value is None:
+                nones |= 1 << bit
+
+        if nones:
+            strings = ["" if value is None else value for value in strings]
+
+        joined = _SEPARATOR.join(strings)
+        if joined.count(_SEPARATOR) != len(strings) - 1:
+            raise ValueError("Identity fields may not contain NUL")
+
+        return _HEADER.pack(self.insecure_id, self.next_seq, nones) + joined.encode()
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "Identity":
+        """Returns the identity packed into `data` by `pack`."""
+        try:
+            insecure_id, next_seq, nones = _HEADER.unpack_from(data)
+            strings = data[_HEADER.size :].decode().split(_SEPARATOR)
+        except (struct.error, UnicodeDecodeError) as err:
+            raise ValueError(f"Invalid identity record: {err}")
+
+        if len(strings) != len(_STRING_FIELDS):
+            raise ValueError("Invalid identity record: wrong number of fields")
+
+        if nones:
+            strings = [
+                None if nones & (1 << bit) else value
+                for bit, value in enumerate(strings)
+            ]
+
+        title, server_host, server_port, server_uuid, secure_id, next_tok = strings
+
+        identity = cls.__new__(cls)
+        identity.title = title
+        # Shared by most identities in a fleet, so held in memory once.
+        identity.server_host = intern(server_host)
+        identity.server_port = intern(server_port)
+        identity.server_uuid = intern(server_uuid)
+        identity.secure_id = secure_id
+        identity.insecure_id = insecure_id
+        identity.next_seq = next_seq
+        identity.next_tok = next_tok
+
+        return identity
+
+    def astuple(self) -> Tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, Identity):
+            return NotImplemented
+
+        return self.astuple() == other.astuple()
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{field}={getattr(self, field)!r}" for field in self.__slots__
+        )
+
+        return f"Identity({fields})"
+
+
+def load_identity(storage: MutableMapping) -> Optional[Identity]:
+    """Returns the identity kept in `storage`, if it has one.
+
+    Storage written before identities were packed holds a
+    "registration_info" dictionary and loose "next_seq" and "next_tok"
+    keys instead, which are read just the same.
+    """
+    packed = storage.get(IDENTITY_KEY)
+    if packed is not None:
+        return Identity.unpack(packed)
+
+    info = storage.get("registration_info")
+    if info is None:
+        return None
+
+    return Identity(
+        info["secure_id"],
+        info["insecure_id"],
+        server_host=info["server_host"],
+        server_port=info["server_port"],
+        server_uuid=info["server_uuid"],
+        next_seq=storage.get("next_seq") or 0,
+        next_tok=text(storage.get("next_tok")),
+    )
+
+
+def store_identity(storage: MutableMapping, identity: Identity):
+    """Keeps `identity` in `storage`, replacing any kept in the older
+    format.
+    """
+    with storage.transaction():
+        storage[IDENTITY_KEY] = identity.pack()
+
+        for key in ("registration_info", "next_seq", "next_tok"):
+            if key in storage:
+                del storage[key]
+
+
+def text(value) -> Optional[str]:
+    """Returns an identifier from a server payload, which may be bytes, as
+    a string.
+    """
+    if isinstance(value, bytes):
+        return value.decode()
+
+    return value
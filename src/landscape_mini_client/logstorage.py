@@ -0,0 +1,295 @@
+"""Append-only, log-structured client storage.
+
+Each change is appended to the log as a record, so its cost doesn't grow
+with the size of the store. An in-memory index maps each key to the
+record holding its value. Once most of the log is superseded records, it
+is compacted into a new one holding only the live values.
+"""
+
+import contextlib
+import os
+import pickle
+import struct
+import tempfile
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from collections.abc import MutableMapping
+
+from .storage import _locked
+
+
+# Each record is its body's length and CRC-32, then the pickled body: an
+# (operation, key, value) tuple.
+_HEADER = struct.Struct(">II")
+_SET = 0
+_DELETE = 1
+_CLEAR = 2
+
+# Marks a key deleted by the current transaction.
+_DELETED = object()
+
+
+class LogStorage(MutableMapping):
+    """A dictionary backed by an append-only log file.
+
+    A partly written record at the end of the log, left by a crash, is
+    dropped when the log is next replayed. Writers hold the same lock as
+    `storage.ClientStorage`, and every operation first catches up on any
+    records other processes have appended, or reloads the log if it was
+    compacted.
+
+    The log is compacted once it is at least `compact_min_size` bytes and
+    `compact_ratio` times the size of its live records.
+    """
+
+    def __init__(
+        self,
+        loc: str = ".lmc-storage.log",
+        compact_ratio: float = 4.0,
+        compact_min_size: int = 1024 * 1024,
+    ):
+        super().__init__()
+
+        self._loc = loc
+        self.compact_ratio = compact_ratio
+        self.compact_min_size = compact_min_size
+
+        # Key -> (offset, length) of the record holding its current value.
+        self._index: Dict[Any, Tuple[int, int]] = {}
+        self._live_size = 0
+        # Inode and length of the log as last replayed.
+        self._ino: Optional[int] = None
+        self._end = 0
+        # Changes made by the current transaction, if any.
+        self._batch: Optional[Dict[Any, Any]] = None
+        self._batch_cleared = False
+
+        if not os.path.exists(loc):
+            open(loc, "ab").close()
+        self._refresh()
+
+    def get(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            return None
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["LogStorage"]:
+        """Holds the storage lock while the changes made within it are
+        collected, then appends them in a single write on leaving it
+        without an exception.
+        """
+        if self._batch is not None:
+            # Part of an enclosing transaction.
+            yield self
+            return
+
+        with _locked(self._loc):
+            self._refresh()
+            self._batch = {}
+            self._batch_cleared = False
+
+            try:
+                yield self
+            except BaseException:
+                self._batch = None
+                raise
+
+            batch, self._batch = self._batch, None
+            self._append(batch, self._batch_cleared)
+            if (
+                self._end >= self.compact_min_size
+                and self._end >= self.compact_ratio * self._live_size
+            ):
+                self._compact()
+
+    def _refresh(self):
+        """Catches up with records appended, or a compaction made, by
+        another process.
+        """
+        if self._batch is not None:
+            return
+
+        stat = os.stat(self._loc)
+
+        if stat.st_ino != self._ino or stat.st_size < self._end:
+            self._index = {}
+            self._live_size = 0
+            self._ino = stat.st_ino
+            self._end = 0
+
+        if stat.st_size > self._end:
+            self._replay()
+
+    def _replay(self):
+        with open(self._loc, "rb") as log_fp:
+            log_fp.seek(self._end)
+            data = log_fp.read()
+
+        pos = 0
+        while pos + _HEADER.size <= len(data):
+            length, crc = _HEADER.unpack_from(data, pos)
+            body = data[pos + _HEADER.size : pos + _HEADER.size + length]
+            if len(body) < length or zlib.crc32(body) != crc:
+                break
+
+            operation, key, _ = pickle.loads(body)
+            self._apply(operation, key, self._end + pos, _HEADER.size + length)
+            pos += _HEADER.size + length
+
+        self._end += pos
+
+    def _apply(self, operation: int, key: Any, offset: int, length: int):
+        index = self._index
+
+        if operation == _CLEAR:
+            index.clear()
+            self._live_size = 0
+            return
+
+        if key in index:
+            self._live_size -= index.pop(key)[1]
+        if operation == _SET:
+            index[key] = offset, length
+            self._live_size += length
+
+    def _append(self, changes: Dict[Any, Any], cleared: bool = False):
+        records: List[Tuple[int, Any, Any]] = []
+        if cleared:
+            records.append((_CLEAR, None, None))
+        for key, value in changes.items():
+            if value is _DELETED:
+                records.append((_DELETE, key, None))
+            else:
+                records.append((_SET, key, value))
+
+        if not records:
+            return
+
+        # The log may have a partly written record at its end, which is
+        # dropped before appending after it.
+        with open(self._loc, "r+b") as log_fp:
+            log_fp.truncate(self._end)
+            log_fp.seek(self._end)
+
+            encoded = []
+            for record in records:
+                body = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+                encoded.append(_HEADER.pack(len(body), zlib.crc32(body)) + body)
+            log_fp.write(b"".join(encoded))
+
+            log_fp.flush()
+            os.fsync(log_fp.fileno())
+
+        for (operation, key, _), record in zip(records, encoded):
+            self._apply(operation, key, self._end, len(record))
+            self._end += len(record)
+
+    def compact(self):
+        """Rewrites the log with only the current value of each key."""
+        with _locked(self._loc):
+            self._refresh()
+            self._compact()
+
+    def _compact(self):
+        directory = os.path.dirname(self._loc) or "."
+        fd, temp_loc = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(self._loc)}.", suffix=".tmp"
+        )
+
+        index = {}
+        try:
+            with os.fdopen(fd, "wb") as temp_fp, open(self._loc, "rb") as log_fp:
+                for key, (offset, length) in self._index.items():
+                    log_fp.seek(offset)
+                    index[key] = temp_fp.tell(), length
+                    temp_fp.write(log_fp.read(length))
+
+                temp_fp.flush()
+                os.fsync(temp_fp.fileno())
+
+            os.replace(temp_loc, self._loc)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_loc)
+            raise
+
+        stat = os.stat(self._loc)
+        self._index = index
+        self._ino = stat.st_ino
+        self._end = stat.st_size
+
+    def _read(self, key: Any) -> Any:
+        while True:
+            offset, length = self._index[key]
+
+            with open(self._loc, "rb") as log_fp:
+                # Another process may have compacted the log since it was
+                # last checked, moving every record, in which case the index
+                # is reloaded from the new log before reading from it.
+                if os.fstat(log_fp.fileno()).st_ino == self._ino:
+                    log_fp.seek(offset + _HEADER.size)
+                    _, _, value = pickle.loads(log_fp.read(length - _HEADER.size))
+
+                    return value
+
+            self._refresh()
+
+    def _keys(self) -> List[Any]:
+        self._refresh()
+
+        if self._batch is None:
+            return list(self._index)
+
+        keys = {} if self._batch_cleared else dict.fromkeys(self._index)
+        for key, value in self._batch.items():
+            if value is _DELETED:
+                keys.pop(key, None)
+            else:
+                keys[key] = None
+
+        return list(keys)
+
+    def __getitem__(self, key):
+        self._refresh()
+
+        if self._batch is not None:
+            if key in self._batch:
+                value = self._batch[key]
+                if value is _DELETED:
+                    raise KeyError(key)
+                return value
+            if self._batch_cleared:
+                raise KeyError(key)
+
+        return self._read(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+
+        return True
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __setitem__(self, key, value):
+        with self.transaction():
+            self._batch[key] = value
+
+    def __delitem__(self, key):
+        with self.transaction():
+            if key in self:
+                self._batch[key] = _DELETED
+
+    def clear(self):
+        with self.transaction():
+            self._batch.clear()
+            self._batch_cleared = True
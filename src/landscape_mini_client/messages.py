@@ -1,10 +1,21 @@
 import logging
+import tempfile
+import time
 import warnings
-from typing import Optional, Tuple
+from typing import Any, Callable, Collection, Optional, Sequence, Tuple, Union
 
 import requests
-from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout, SSLError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (
+    ChunkedEncodingError,
+    ConnectionError,
+    ConnectTimeout,
+    ReadTimeout,
+    SSLError,
+)
+from urllib3.util.retry import Retry
 
+from .timing import RequestTiming, TimingAdapter, TimingHook, timing_request
 from .util import bpickle
 
 
@@ -14,6 +25,10 @@ API_HEADERS = {
     "Content-Type": "application/octet-stream",
 }
 COMPUTER_ID_HEADER = "X-Computer-ID"
+# Size of the chunks streamed bodies are read and written in.
+STREAM_CHUNK_SIZE = 65536
+# Encoded size past which a spooled message body moves from memory to disk.
+SPOOL_MAX_SIZE = 1024 * 1024
 
 
 class MessageException(Exception):
@@ -22,65 +37,294 @@ class MessageException(Exception):
     pass
 
 
+class MessageClient:
+    """Sends messages to Landscape Server over a pooled `requests.Session`.
+
+    Connections are kept alive and reused for every request to the same
+    server, so only the first exchange pays for the TCP and TLS handshakes.
+
+    `pool_connections` is the number of servers to keep pools for and
+    `pool_maxsize` the number of connections kept per server. Failed
+    connections, reads and any response with a status in `retry_statuses`
+    are retried up to `retries` times, sleeping `backoff_factor * 2 **
+    (retry - 1)` seconds between attempts. Exchanges carry a sequence
+    number, so retrying a POST is safe. With `keep_alive` off, each
+    request asks the server to close its connection afterwards.
+
+    With `timing_hooks`, the time each phase of every request took is
+    measured, and passed as a `timing.RequestTiming` to each hook once the
+    request completes or fails.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        retries: int = 0,
+        backoff_factor: float = 0.0,
+        retry_statuses: Collection[int] = (),
+        keep_alive: bool = True,
+        timing_hooks: Sequence[TimingHook] = (),
+    ):
+        retry = Retry(
+            total=retries,
+            # Without retries, let read timeouts surface as such.
+            read=retries or False,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_statuses,
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        self.timing_hooks = list(timing_hooks)
+
+        adapter_class = TimingAdapter if self.timing_hooks else HTTPAdapter
+        adapter = adapter_class(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def send_message(
+        self,
+        url: str,
+        message: Union[dict, bytes],
+        secure_id: Optional[str] = None,
+        on_message: Optional[Callable[[Any], None]] = None,
+        spool: bool = False,
+        **kwargs,
+    ) -> Tuple[int, dict]:
+        """
+        Sends `message` to `url` and returns the response status code and
+        unpickled payload. `message` may also be already encoded, as
+        rendered from a `util.templates.MessageTemplate`.
+
+        With `on_message`, the response is decoded as it arrives and each
+        message in it is passed to `on_message` as soon as it is complete,
+        instead of being returned in the payload. With `spool`, `message`
+        is encoded a chunk at a time into a temporary file, which moves to
+        disk once it grows large, rather than into one bytes object.
+        """
+        if not kwargs.get("verify"):
+            warnings.filterwarnings("ignore", message="unverified https")
+
+        timing = RequestTiming("POST", url) if self.timing_hooks else None
+        headers = API_HEADERS.copy()
+
+        if secure_id:
+            headers[COMPUTER_ID_HEADER] = secure_id
+
+        if spool and not isinstance(message, bytes):
+            with tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE) as body:
+                start = time.perf_counter()
+                bpickle.dump(message, body, STREAM_CHUNK_SIZE)
+                if timing is not None:
+                    timing.add("encode", time.perf_counter() - start)
+                    timing.sent_bytes = body.tell()
+                body.seek(0)
+
+                return self._post(
+                    url, on_message, timing, data=body, headers=headers, **kwargs
+                )
+
+        if isinstance(message, bytes):
+            pickled = message
+        else:
+            start = time.perf_counter()
+            pickled = bpickle.dumps(message)
+            if timing is not None:
+                timing.add("encode", time.perf_counter() - start)
+
+        if timing is not None:
+            timing.sent_bytes = len(pickled)
+
+        return self._post(
+            url, on_message, timing, data=pickled, headers=headers, **kwargs
+        )
+
+    def get(
+        self, url: str, on_message: Optional[Callable[[Any], None]] = None, **kwargs
+    ) -> Tuple[int, dict]:
+        timing = RequestTiming("POST", url) if self.timing_hooks else None
+
+        return self._post(url, on_message, timing, headers=API_HEADERS, **kwargs)
+
+    def _post(
+        self,
+        url: str,
+        on_message: Optional[Callable[[Any], None]],
+        timing: Optional[RequestTiming] = None,
+        **kwargs,
+    ) -> Tuple[int, dict]:
+        if timing is None:
+            return self._request(url, on_message, **kwargs)
+
+        try:
+            with timing_request(timing):
+                status_code, payload = self._request(url, on_message, timing, **kwargs)
+        except BaseException as e:
+            timing.error = type(e).__name__
+            raise
+        else:
+            timing.status = status_code
+        finally:
+            timing.finish()
+            for hook in self.timing_hooks:
+                hook(timing)
+
+        return status_code, payload
+
+    def _request(
+        self,
+        url: str,
+        on_message: Optional[Callable[[Any], None]],
+        timing: Optional[RequestTiming] = None,
+        **kwargs,
+    ) -> Tuple[int, dict]:
+        # A timed body is read separately from the request, to time it.
+        stream = on_message is not None or timing is not None
+
+        try:
+            response = self.session.post(url, stream=stream, **kwargs)
+        except (ConnectTimeout, ReadTimeout):
+            logging.error(f"Connection to {url} timed out")
+
+            raise MessageException()
+        except ConnectionError:
+            logging.error(f"Connection to {url} failed")
+            raise MessageException()
+        except SSLError as e:
+            logging.error(e.strerror)
+            raise MessageException()
+        else:
+            if on_message is not None:
+                start = time.perf_counter()
+                payload = self._stream_payload(url, response, on_message)
+                if timing is not None:
+                    # Decoded as it arrives, so counted as downloading.
+                    timing.add("download", time.perf_counter() - start)
+            elif timing is not None:
+                start = time.perf_counter()
+                content = self._read_content(url, response)
+                decoding = time.perf_counter()
+                payload = self._decode(url, response, content)
+                timing.add("download", decoding - start)
+                timing.add("decode", time.perf_counter() - decoding)
+            else:
+                payload = self._decode(url, response, response.content)
+
+            if timing is not None:
+                timing.received_bytes = response.raw.tell()
+
+            return response.status_code, payload
+
+    def _read_content(self, url: str, response: requests.Response) -> bytes:
+        try:
+            return response.content
+        except (ConnectionError, ChunkedEncodingError):
+            logging.error(f"Connection to {url} failed")
+            raise MessageException()
+
+    def _decode(self, url: str, response: requests.Response, content: bytes) -> Any:
+        try:
+            payload, _ = bpickle.loads(content)
+        except (IndexError, ValueError):
+            raise self._decode_error(url, response)
+
+        return payload
+
+    def _stream_payload(
+        self,
+        url: str,
+        response: requests.Response,
+        on_message: Callable[[Any], None],
+    ) -> dict:
+        decoder = bpickle.StreamDecoder(keep_messages=False)
+
+        try:
+            with response:
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    try:
+                        messages = list(decoder.feed(chunk))
+                    except (IndexError, ValueError):
+                        raise self._decode_error(url, response)
+
+                    for message in messages:
+                        on_message(message)
+        except (ConnectionError, ChunkedEncodingError):
+            logging.error(f"Connection to {url} failed")
+            raise MessageException()
+
+        try:
+            return decoder.result()
+        except (IndexError, ValueError):
+            raise self._decode_error(url, response)
+
+    def _decode_error(self, url: str, response: requests.Response) -> MessageException:
+        # Answered with something other than a bpickle, such as a proxy's
+        # error page.
+        logging.error(
+            f"Response {response.status_code} from {url} could not be decoded"
+        )
+
+        return MessageException()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default_client: Optional[MessageClient] = None
+
+
+def get_client() -> MessageClient:
+    """Returns the client shared by the module-level functions, so that
+    every exchange in this process reuses the same connections.
+    """
+    global _default_client
+
+    if _default_client is None:
+        _default_client = MessageClient()
+
+    return _default_client
+
+
+def configure_client(**options) -> MessageClient:
+    """Replaces the shared client with one built from `options`, which are
+    passed on to `MessageClient`.
+    """
+    global _default_client
+
+    if _default_client is not None:
+        _default_client.close()
+
+    _default_client = MessageClient(**options)
+
+    return _default_client
+
+
 def send_message(
     url: str,
-    message: dict,
+    message: Union[dict, bytes],
     secure_id: Optional[str] = None,
     **kwargs,
 ) -> Tuple[int, dict]:
     """
     A thin-ish wrapper around requests that adds some error logging.
     """
-    if not kwargs.get("verify"):
-        warnings.filterwarnings("ignore", message="unverified https")
-
-    pickled = bpickle.dumps(message)
-    headers = API_HEADERS.copy()
-
-    if secure_id:
-        headers[COMPUTER_ID_HEADER] = secure_id
-
-    try:
-        response = requests.post(
-            url,
-            data=pickled,
-            **kwargs,
-            headers=headers,
-        )
-    except (ConnectTimeout, ReadTimeout):
-        logging.error(f"Connection to {url} timed out")
-
-        raise MessageException()
-    except ConnectionError:
-        logging.error(f"Connection to {url} failed")
-        raise MessageException()
-    except SSLError as e:
-        logging.error(e.strerror)
-        raise MessageException()
-    else:
-        payload, _ = bpickle.loads(response.content)
-
-        return response.status_code, payload
+    return get_client().send_message(url, message, secure_id=secure_id, **kwargs)
 
 
 def get(url: str, **kwargs):
-    try:
-        response = requests.post(
-            url,
-            **kwargs,
-            headers=API_HEADERS,
-        )
-    except (ConnectTimeout, ReadTimeout):
-        logging.error(f"Connection to {url} timed out")
-
-        raise MessageException()
-    except ConnectionError:
-        logging.error(f"Connection to {url} failed")
-        raise MessageException()
-    except SSLError as e:
-        logging.error(e.strerror)
-        raise MessageException()
-    else:
-        payload, _ = bpickle.loads(response.content)
-
-        return response.status_code, payload
+    return get_client().get(url, **kwargs)
@@ -0,0 +1,521 @@
+"""Client-side metrics, exported in the Prometheus text format.
+
+`ClientMetrics` holds the metrics the long-running commands record: the
+requests they send, how long those took, the bytes sent and received,
+encoding and decoding time, and how long storage operations took. They
+can be scraped from `MetricsServer`'s "/metrics" endpoint, or written
+periodically to a file for node_exporter's textfile collector by
+`TextfileExporter`.
+"""
+
+import bisect
+import contextlib
+import math
+import os
+import tempfile
+import threading
+import time
+from collections.abc import MutableMapping
+from http.server import BaseHTTPRequestHandler, HTTPStatus, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .timing import RequestTiming
+from .util.stats import LatencyHistogram, PingStats
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Address metrics are served on: the local host only, as they describe the
+# client and its servers.
+DEFAULT_HOST = "127.0.0.1"
+
+# Upper bounds, in seconds, of the histograms' buckets.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _Metric:
+    """A metric family: one value, or set of values, per combination of
+    label values.
+    """
+
+    kind = ""
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str], lock: threading.Lock
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = lock
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.help)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+
+        return lines
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def _label_set(self, values: Tuple[str, ...], **extra: str) -> str:
+        pairs = list(zip(self.labels, values)) + list(extra.items())
+        if not pairs:
+            return ""
+
+        return "{" + ",".join(f'{n}="{_escape_label(v)}"' for n, v in pairs) + "}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{self._label_set(labels)} {_format(value)}"
+
+
+class Histogram(_Metric):
+    """Counts of observations by bucket, along with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+
+        self.buckets = tuple(buckets)
+        # Per label values: the count in each bucket, the last for values
+        # above every bound, then the sum of the observations.
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, seconds: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            counts, total = self._values(labels)
+            counts[index] += 1
+            total[0] += seconds
+
+    def merge(self, latencies: LatencyHistogram, *labels: str):
+        """Adds the latencies recorded in `latencies`.
+
+        Each is counted in the bucket holding the midpoint of its
+        `LatencyHistogram` bucket, so those within about 3% of a bound may
+        be counted in the bucket on its other side.
+        """
+        if not latencies.count:
+            return
+
+        with self._lock:
+            counts, total = self._values(labels)
+            for value, count in latencies.buckets():
+                counts[bisect.bisect_left(self.buckets, value)] += count
+            total[0] += latencies.total
+
+    def _values(self, labels: Tuple[str, ...]) -> Tuple[List[int], List[float]]:
+        values = self.values.get(labels)
+        if values is None:
+            values = self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+
+        return values
+
+    def _samples(self) -> Iterator[str]:
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                label_set = self._label_set(labels, le=_format(bound))
+                yield f"{self.name}_bucket{label_set} {cumulative}"
+
+            yield f"{self.name}_sum{self._label_set(labels)} {_format(total[0])}"
+            yield f"{self.name}_count{self._label_set(labels)} {cumulative}"
+
+
+class Registry:
+    """The metrics to export, rendered in the order they were added.
+
+    Metrics may be recorded from any thread while being rendered from
+    another.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels, self._lock))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labels, self._lock, buckets=buckets))
+
+    def _add(self, metric):
+        if any(existing.name == metric.name for existing in self.metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+
+        self.metrics.append(metric)
+
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+class ClientMetrics:
+    """The metrics of the requests a client sends and the storage it uses.
+
+    Requests are labelled by their kind, such as "ping" or "exchange", and
+    the server they were sent to. An instance is also a `timing.TimingHook`,
+    recording each request a `messages.MessageClient` times.
+    """
+
+    def __init__(self, registry: Optional[Registry] = None):
+        self.registry = registry = registry or Registry()
+
+        self.requests = registry.counter(
+            "lmc_requests_total",
+            "Requests sent, by outcome: the response's status code or the "
+            "error the request failed with.",
+            ("kind", "server", "outcome"),
+        )
+        self.request_duration = registry.histogram(
+            "lmc_request_duration_seconds",
+            "Time from sending each request to receiving its response.",
+            ("kind", "server"),
+        )
+        self.sent_bytes = registry.counter(
+            "lmc_sent_bytes_total",
+            "Bytes of request bodies sent.",
+            ("kind", "server"),
+        )
+        self.received_bytes = registry.counter(
+            "lmc_received_bytes_total",
+            "Bytes of response bodies received.",
+            ("kind", "server"),
+        )
+        self.encode_duration = registry.histogram(
+            "lmc_encode_duration_seconds",
+            "Time spent encoding request bodies.",
+            ("kind",),
+        )
+        self.decode_duration = registry.histogram(
+            "lmc_decode_duration_seconds",
+            "Time spent decoding response bodies.",
+            ("kind",),
+        )
+        self.schedule_lag = registry.histogram(
+            "lmc_schedule_lag_seconds",
+            "How late requests were sent behind their schedule.",
+        )
+        self.storage_duration = registry.histogram(
+            "lmc_storage_duration_seconds",
+            "Time spent on storage operations, by operation. A transaction's "
+            "time includes the reads and writes within it.",
+            ("operation",),
+        )
+
+    def record(
+        self,
+        kind: str,
+        server: str,
+        outcome: str,
+        seconds: float,
+        sent: int = 0,
+        received: int = 0,
+    ):
+        self.requests.inc(kind, server, outcome)
+        self.request_duration.observe(seconds, kind, server)
+        if sent:
+            self.sent_bytes.inc(kind, server, amount=sent)
+        if received:
+            self.received_bytes.inc(kind, server, amount=received)
+
+    def merge_stats(self, kind: str, stats: PingStats):
+        """Records the requests in `stats`, which are broken down by
+        server.
+        """
+        for (server, outcome), count in stats.outcomes.items():
+            self.requests.inc(kind, server, outcome, amount=count)
+
+        for server, latencies in stats.latencies.items():
+            self.request_duration.merge(latencies, kind, server)
+
+        self.schedule_lag.merge(stats.lag)
+
+    def __call__(self, timing: RequestTiming):
+        url = urlsplit(timing.url)
+        kind = "ping" if url.path.startswith("/ping") else "exchange"
+
+        self.record(
+            kind,
+            url.netloc,
+            timing.error or str(timing.status),
+            timing.total,
+            sent=timing.sent_bytes,
+            received=timing.received_bytes,
+        )
+        if timing.encode:
+            self.encode_duration.observe(timing.encode, kind)
+        if timing.decode:
+            self.decode_duration.observe(timing.decode, kind)
+
+    @contextlib.contextmanager
+    def timing_storage(self, operation: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.storage_duration.observe(time.perf_counter() - start, operation)
+
+
+class TimedStorage(MutableMapping):
+    """Wraps a storage backend, recording how long each operation on it
+    takes in `metrics`.
+    """
+
+    def __init__(self, storage: MutableMapping, metrics: ClientMetrics):
+        super().__init__()
+
+        self.storage = storage
+        self.metrics = metrics
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["TimedStorage"]:
+        with self.metrics.timing_storage("transaction"):
+            with self.storage.transaction():
+                yield self
+
+    def get(self, key):
+        with self.metrics.timing_storage("read"):
+            return self.storage.get(key)
+
+    def __getitem__(self, key):
+        with self.metrics.timing_storage("read"):
+            return self.storage[key]
+
+    def __setitem__(self, key, value):
+        with self.metrics.timing_storage("write"):
+            self.storage[key] = value
+
+    def __delitem__(self, key):
+        with self.metrics.timing_storage("write"):
+            del self.storage[key]
+
+    def __contains__(self, key):
+        with self.metrics.timing_storage("read"):
+            return key in self.storage
+
+    def __iter__(self):
+        return iter(self.storage)
+
+    def __len__(self):
+        return len(self.storage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.partition("?")[0] != "/metrics":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        body = self.server.registry.render().encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer:
+    """Serves `registry` at "/metrics" from a background thread.
+
+    Only local connections are accepted unless another `host` is given.
+    """
+
+    def __init__(self, registry: Registry, port: int, host: str = DEFAULT_HOST):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = registry
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+
+        return self
+
+    def close(self):
+        if self._thread.is_alive():
+            self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TextfileExporter:
+    """Writes `registry` to the file at `path` every `interval` seconds,
+    from a background thread, and once more on closing.
+
+    The file is replaced atomically, so the collector never reads a partly
+    written one.
+    """
+
+    def __init__(self, registry: Registry, path: str, interval: float = 15.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "TextfileExporter":
+        self.write()
+        self._thread.start()
+
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp"
+        )
+
+        try:
+            with os.fdopen(fd, "w") as temp_fp:
+                temp_fp.write(self.registry.render())
+
+            os.replace(temp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_path)
+            raise
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+        self.write()
+
+
+def add_metrics_arguments(parser):
+    """Adds the options to export metrics with to `parser`."""
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Port on which to serve metrics at '/metrics', in the Prometheus "
+        "text format.",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default=DEFAULT_HOST,
+        help="Address on which to serve metrics. Only local connections are "
+        "accepted by default.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        help="File to write metrics to every '--metrics-interval' seconds and "
+        "on exiting, for node_exporter's textfile collector.",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=15.0,
+        help="Seconds between writes of '--metrics-file'.",
+    )
+
+
+@contextlib.contextmanager
+def exporting(args) -> Iterator[Optional[ClientMetrics]]:
+    """Exports the metrics recorded within it, as asked by `args`, parsed
+    with the options `add_metrics_arguments` adds.
+
+    Yields the `ClientMetrics` to record, or None if no export was asked
+    for, in which case nothing need be recorded.
+    """
+    if args.metrics_port is None and not args.metrics_file:
+        yield None
+        return
+
+    metrics = ClientMetrics()
+    exporters = []
+
+    try:
+        if args.metrics_port is not None:
+            exporters.append(
+                MetricsServer(
+                    metrics.registry, args.metrics_port, args.metrics_host
+                ).start()
+            )
+        if args.metrics_file:
+            exporters.append(
+                TextfileExporter(
+                    metrics.registry, args.metrics_file, args.metrics_interval
+                ).start()
+            )
+
+        yield metrics
+    finally:
+        for exporter in exporters:
+            exporter.close()
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
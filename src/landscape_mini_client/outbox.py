@@ -0,0 +1,72 @@
+"""A persistent queue of messages waiting to be sent to the server.
+
+Messages stay queued until the server acknowledges them, by answering an
+exchange with a "next-expected-sequence" past them, so none are lost to a
+failed exchange or a server that accepts only part of one.
+"""
+
+from collections.abc import MutableMapping
+from typing import Iterable, List, Optional
+
+from .util import bpickle
+
+
+OUTBOX_KEY = "outbox"
+
+
+class Outbox:
+    """The messages queued in `storage`, oldest first.
+
+    The first pending message is the one the server expects next, so its
+    sequence number is the client's next sequence number.
+    """
+
+    def __init__(self, storage: MutableMapping):
+        self.storage = storage
+
+    def pending(self) -> List[dict]:
+        return list(self.storage.get(OUTBOX_KEY) or [])
+
+    def add(self, messages: Iterable[dict]) -> int:
+        """Queues `messages` after any already pending and returns the
+        number pending.
+        """
+        with self.storage.transaction():
+            queued = self.pending() + list(messages)
+            self.storage[OUTBOX_KEY] = queued
+
+        return len(queued)
+
+    def acknowledge(self, count: int):
+        """Drops the oldest `count` messages, which the server has
+        accepted.
+        """
+        if count <= 0:
+            return
+
+        with self.storage.transaction():
+            self.storage[OUTBOX_KEY] = self.pending()[count:]
+
+    def batch(
+        self, max_messages: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> List[dict]:
+        """Returns the oldest pending messages, as many as fit in
+        `max_messages` messages and `max_bytes` encoded bytes.
+
+        The oldest message is always included, even if it alone is larger
+        than `max_bytes`, so that it can still be sent.
+        """
+        batch = []
+        size = 0
+
+        for message in self.pending()[:max_messages]:
+            size += len(bpickle.dumps(message))
+            if batch and max_bytes is not None and size > max_bytes:
+                break
+
+            batch.append(message)
+
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.storage.get(OUTBOX_KEY) or [])
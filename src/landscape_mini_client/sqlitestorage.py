@@ -0,0 +1,152 @@
+"""SQLite-backed client storage.
+
+One database holds the state of any number of clients, each in its own
+namespace. Every key is a row, so lookups and updates touch only the rows
+they need rather than the whole store.
+"""
+
+import contextlib
+import pickle
+import sqlite3
+from typing import Iterator, List, Mapping, Optional
+
+from collections.abc import MutableMapping
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS storage (
+    client TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (client, key)
+) WITHOUT ROWID
+"""
+_SELECT = "SELECT value FROM storage WHERE client = ? AND key = ?"
+_UPSERT = (
+    "INSERT INTO storage (client, key, value) VALUES (?, ?, ?) "
+    "ON CONFLICT (client, key) DO UPDATE SET value = excluded.value"
+)
+_DELETE = "DELETE FROM storage WHERE client = ? AND key = ?"
+_CLEAR = "DELETE FROM storage WHERE client = ?"
+_KEYS = "SELECT key FROM storage WHERE client = ? ORDER BY key"
+_COUNT = "SELECT COUNT(*) FROM storage WHERE client = ?"
+_CLIENTS = "SELECT DISTINCT client FROM storage ORDER BY client"
+
+DEFAULT_CLIENT = "default"
+
+
+class SQLiteStorage(MutableMapping):
+    """A dictionary of one client's state in a SQLite database.
+
+    Keys are strings and values are pickled. The database is in WAL mode,
+    so readers in other processes don't block on writers. Outside a
+    `transaction`, each change is committed on its own.
+    """
+
+    def __init__(
+        self,
+        loc: str = ".lmc-storage.sqlite",
+        client: str = DEFAULT_CLIENT,
+        connection: Optional[sqlite3.Connection] = None,
+    ):
+        super().__init__()
+
+        self._loc = loc
+        self.client = client
+
+        if connection is None:
+            # Transactions are managed explicitly, see `transaction`.
+            connection = sqlite3.connect(loc, isolation_level=None, timeout=30)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(_SCHEMA)
+
+        self._connection = connection
+
+    def namespace(self, client: str) -> "SQLiteStorage":
+        """Returns the storage of `client` in the same database, sharing
+        this storage's connection.
+        """
+        return SQLiteStorage(self._loc, client, self._connection)
+
+    def clients(self) -> List[str]:
+        """Returns every client with state in the database."""
+        return [row[0] for row in self._connection.execute(_CLIENTS)]
+
+    def get(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            return None
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["SQLiteStorage"]:
+        """Makes the changes within it, to any client sharing this
+        connection, in one transaction committed on leaving it without an
+        exception.
+        """
+        if self._connection.in_transaction:
+            # Part of an enclosing transaction.
+            yield self
+            return
+
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+
+        self._connection.execute("COMMIT")
+
+    def update_many(self, items: Mapping[str, object]):
+        """Stores every item of `items` in one transaction."""
+        with self.transaction():
+            self._connection.executemany(
+                _UPSERT,
+                (
+                    (self.client, _check_key(key), pickle.dumps(value))
+                    for key, value in items.items()
+                ),
+            )
+
+    def close(self):
+        self._connection.close()
+
+    def __getitem__(self, key):
+        row = self._connection.execute(_SELECT, (self.client, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+
+        return pickle.loads(row[0])
+
+    def __contains__(self, key):
+        return (
+            self._connection.execute(_SELECT, (self.client, key)).fetchone() is not None
+        )
+
+    def __iter__(self):
+        return iter([row[0] for row in self._connection.execute(_KEYS, (self.client,))])
+
+    def __len__(self):
+        return self._connection.execute(_COUNT, (self.client,)).fetchone()[0]
+
+    def __setitem__(self, key, value):
+        self._connection.execute(
+            _UPSERT, (self.client, _check_key(key), pickle.dumps(value))
+        )
+
+    def __delitem__(self, key):
+        self._connection.execute(_DELETE, (self.client, key))
+
+    def clear(self):
+        self._connection.execute(_CLEAR, (self.client,))
+
+
+def _check_key(key: str) -> str:
+    if not isinstance(key, str):
+        raise TypeError(
+            f"SQLite storage keys must be strings, not {type(key).__name__}"
+        )
+
+    return key
@@ -1,21 +1,39 @@
+import contextlib
+import fcntl
 import os
 import pickle
-from typing import Any, Mapping
+import tempfile
+from typing import Any, Iterator, Mapping, Optional, Tuple
 
 from collections.abc import MutableMapping
 
 
 class ClientStorage(MutableMapping):
-    """A pickle-file-backed dictionary."""
+    """A pickle-file-backed dictionary.
+
+    The unpickled contents are cached, and only read again once the file's
+    modification time, size or inode changes. Values read from the cache
+    are shared between reads, so changes to them must be stored again.
+
+    Every change is a read-modify-write made while holding a lock on
+    `loc` + ".lock", and replaces the file atomically, so concurrent
+    writers don't lose each other's updates and a crash never leaves a
+    partly written file. Reads don't take the lock.
+    """
 
     def __init__(self, loc: str = ".lmc-storage.pickle"):
         super().__init__()
 
-        if not os.path.exists(loc):
-            with open(loc, "wb") as loc_fp:
-                pickle.dump({}, loc_fp)
-
         self._loc = loc
+        self._cache: Optional[dict] = None
+        self._cache_key: Optional[Tuple[int, int, int]] = None
+        # Contents being changed by the current transaction, if any.
+        self._batch: Optional[dict] = None
+
+        if not os.path.exists(loc):
+            with _locked(loc):
+                if not os.path.exists(loc):
+                    _write_atomic(loc, {})
 
     def get(self, key):
         try:
@@ -23,61 +41,200 @@ class ClientStorage(MutableMapping):
         except KeyError:
             return None
 
-    def _read_loc(self):
-        with open(self._loc, "rb") as loc_fp:
-            return pickle.load(loc_fp)
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["ClientStorage"]:
+        """Holds the lock for the storage file while the changes made
+        within it are collected, then writes them at once on leaving it
+        without an exception.
+
+        The contents are read afresh on entering, so a read-modify-write
+        such as incrementing a counter is safe against other processes.
+        """
+        if self._batch is not None:
+            # Part of an enclosing transaction.
+            yield self
+            return
 
-    def _write_loc(self, payload):
-        with open(self._loc, "wb") as loc_fp:
-            pickle.dump(payload, loc_fp)
+        with _locked(self._loc):
+            self._batch = dict(self._read_loc())
 
-    def __delitem__(self, key):
-        stored = self._read_loc()
+            try:
+                yield self
+            except BaseException:
+                self._batch = None
+                raise
 
-        if key not in stored:
-            return
+            stored, self._batch = self._batch, None
+            self._write_loc(stored)
+
+    def _stat_key(self) -> Tuple[int, int, int]:
+        stat = os.stat(self._loc)
 
-        del stored[key]
-        self._write_loc(stored)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read_loc(self) -> dict:
+        if self._batch is not None:
+            return self._batch
+
+        key = self._stat_key()
+        if key != self._cache_key:
+            with open(self._loc, "rb") as loc_fp:
+                self._cache = pickle.load(loc_fp)
+            self._cache_key = key
+
+        return self._cache
+
+    def _write_loc(self, payload: dict):
+        _write_atomic(self._loc, payload)
+
+        self._cache = payload
+        self._cache_key = self._stat_key()
+
+    def __delitem__(self, key):
+        with self.transaction():
+            self._batch.pop(key, None)
 
     def __getitem__(self, key):
         stored = self._read_loc()
 
         return stored[key]
 
+    def __contains__(self, key):
+        return key in self._read_loc()
+
     def __iter__(self):
-        return iter(self._read_loc())
+        return iter(list(self._read_loc()))
 
     def __len__(self):
         return len(self._read_loc())
 
     def __setitem__(self, key, value):
-        stored = self._read_loc()
-
-        stored[key] = value
-        self._write_loc(stored)
+        with self.transaction():
+            self._batch[key] = value
 
     def clear(self):
-        with open(self._loc, "wb") as loc_fp:
-            pickle.dump({}, loc_fp)
+        with self.transaction():
+            self._batch.clear()
+
+
+STORAGE_HELP = (
+    "File in which to store local registration and message state "
+    "information. Prefix it with 'log:', or end it in '.log', for an "
+    "append-only log, or with 'sqlite:', or end it in '.sqlite' or '.db', "
+    "for a SQLite database, optionally followed by '#CLIENT' to name the "
+    "client within it"
+)
+
+_BACKENDS = ("pickle", "log", "sqlite")
+_EXTENSIONS = {".log": "log", ".sqlite": "sqlite", ".db": "sqlite"}
+
+
+def open_storage(spec: str = ".lmc-storage.pickle") -> MutableMapping:
+    """Opens the storage named by `spec`.
+
+    `spec` is a file name, optionally prefixed with the backend to use:
+    "log:" for a `logstorage.LogStorage`, "sqlite:" for a
+    `sqlitestorage.SQLiteStorage` or "pickle:" for a `ClientStorage`.
+    Without a prefix, the backend is chosen by the file's extension, and
+    is a pickle file for any other. A SQLite file name may be followed by
+    "#" and the client whose state to open.
+    """
+    backend, sep, loc = spec.partition(":")
+    if not sep or backend not in _BACKENDS:
+        loc = spec
+        backend = "pickle"
+        for extension, extension_backend in _EXTENSIONS.items():
+            if spec.partition("#")[0].endswith(extension):
+                backend = extension_backend
+
+    # Imported here, as the other backends share this module's locking.
+    if backend == "log":
+        from .logstorage import LogStorage
+
+        return LogStorage(loc)
+
+    if backend == "sqlite":
+        from .sqlitestorage import DEFAULT_CLIENT, SQLiteStorage
+
+        loc, _, client = loc.partition("#")
+
+        return SQLiteStorage(loc, client or DEFAULT_CLIENT)
+
+    return ClientStorage(loc)
+
+
+def migrate(source: Mapping, target: MutableMapping) -> int:
+    """Copies every item of `source` into `target`, in one transaction if
+    `target` supports them, and returns the number copied.
+    """
+    items = dict(source)
+
+    transaction = getattr(target, "transaction", contextlib.nullcontext)
+    with transaction():
+        for key, value in items.items():
+            target[key] = value
+
+    return len(items)
+
+
+@contextlib.contextmanager
+def _locked(loc: str) -> Iterator[None]:
+    """Holds an exclusive advisory lock on `loc` + ".lock".
+
+    A separate lock file is used because `loc` itself is replaced on every
+    write.
+    """
+    with open(loc + ".lock", "ab") as lock_fp:
+        fcntl.flock(lock_fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+
+def _write_atomic(loc: str, payload: Any) -> None:
+    """Pickles `payload` to a temporary file, syncs it and renames it over
+    `loc`, so that `loc` always holds either the old or the new contents.
+    """
+    directory = os.path.dirname(loc) or "."
+    fd, temp_loc = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(loc)}.", suffix=".tmp"
+    )
+
+    try:
+        with os.fdopen(fd, "wb") as temp_fp:
+            pickle.dump(payload, temp_fp)
+            temp_fp.flush()
+            os.fsync(temp_fp.fileno())
+
+        os.replace(temp_loc, loc)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_loc)
+        raise
+
+    # Make the rename itself durable.
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
 
 def put(item_dict: Mapping[str, Any], loc: str = ".lmc-storage.pickle") -> None:
     """Stores an item in persistent storage."""
-    if not os.path.exists(loc):
-        with open(loc, "wb") as loc_fp:
-            pickle.dump(item_dict, loc_fp)
-    else:
-        with open(loc, "rb") as loc_fp:
-            try:
-                stored = pickle.load(loc_fp)
-            except EOFError:
-                stored = {}
+    with _locked(loc):
+        stored = {}
 
-        stored.update(item_dict)
+        if os.path.exists(loc):
+            with open(loc, "rb") as loc_fp:
+                try:
+                    stored = pickle.load(loc_fp)
+                except EOFError:
+                    pass
 
-        with open(loc, "wb") as loc_fp:
-            pickle.dump(stored, loc_fp)
+        stored.update(item_dict)
+        _write_atomic(loc, stored)
 
 
 def get(item_key, loc: str = ".lmc-storage.pickle") -> any:
@@ -0,0 +1,71 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from ..util.asynchttp import AsyncHTTPClient
+
+
+class AsyncHTTPClientTestCase(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connections = 0
+        self.responses = []
+
+        async def handle(reader, writer):
+            self.connections += 1
+            try:
+                while True:
+                    await reader.readuntil(b"\r\n\r\n")
+                    writer.write(self.responses.pop(0))
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        self.server = await asyncio.start_server(handle, "localhost", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.client = AsyncHTTPClient(limit_per_host=2)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_keep_alive(self):
+        """Tests that sequential requests reuse one connection."""
+        self.responses = [b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"] * 3
+
+        for _ in range(3):
+            response = await self.client.request(
+                "GET", f"http://localhost:{self.port}/ping?insecure_id=1"
+            )
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.body, b"ok")
+
+        self.assertEqual(self.connections, 1)
+
+    async def test_connection_close(self):
+        """
+        Tests that a new connection is opened when the server asks to
+        close the previous one.
+        """
+        self.responses = [
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 0\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n",
+        ]
+
+        for _ in range(2):
+            await self.client.request("GET", f"http://localhost:{self.port}/")
+
+        self.assertEqual(self.connections, 2)
+
+    async def test_chunked(self):
+        """Tests that chunked response bodies are reassembled."""
+        self.responses = [
+            b"HTTP/1.1 404 Not Found\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n"
+        ]
+
+        response = await self.client.request("GET", f"http://localhost:{self.port}/")
+
+        self.assertEqual(response.status, 404)
+        self.assertEqual(response.body, b"abcde")
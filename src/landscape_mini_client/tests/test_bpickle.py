@@ -0,0 +1,252 @@
+import io
+import random
+import time
+from unittest import TestCase
+
+from ..util import bpickle
+
+
+def random_payload(rng: random.Random, depth: int = 0):
+    """Returns a random value made up of every supported type."""
+    kinds = ["str", "bytes", "int", "float", "bool", "none"]
+    if depth < 4:
+        kinds += ["dict", "list", "tuple"] * 2
+
+    kind = rng.choice(kinds)
+    size = rng.randrange(5)
+
+    if kind == "dict":
+        return {
+            random_payload(rng, 4)
+            if rng.random() < 0.2
+            else str(rng.random()): random_payload(rng, depth + 1)
+            for _ in range(size)
+        }
+    if kind == "list":
+        return [random_payload(rng, depth + 1) for _ in range(size)]
+    if kind == "tuple":
+        return tuple(random_payload(rng, depth + 1) for _ in range(size))
+    if kind == "str":
+        return "".join(chr(rng.randrange(1, 0x3000)) for _ in range(size))
+    if kind == "bytes":
+        return bytes(rng.randrange(256) for _ in range(size))
+    if kind == "int":
+        return rng.randrange(-(2**70), 2**70)
+    if kind == "float":
+        return rng.uniform(-1e6, 1e6)
+    if kind == "bool":
+        return rng.random() < 0.5
+
+    return None
+
+
+class DumpsTestCase(TestCase):
+    def test_dumps(self):
+        """Tests the wire format of each supported type."""
+        self.assertEqual(bpickle.dumps(12), b"i12;")
+        self.assertEqual(bpickle.dumps(-3), b"i-3;")
+        self.assertEqual(bpickle.dumps("hi"), b"u2:hi")
+        self.assertEqual(bpickle.dumps([1, "a"]), b"li1;u1:a;")
+        self.assertEqual(bpickle.dumps((1, b"a")), b"ti1;s1:a;")
+        self.assertEqual(bpickle.dumps(True), b"b1")
+        self.assertEqual(bpickle.dumps(False), b"b0")
+        self.assertEqual(bpickle.dumps(1.5), b"f1.5;")
+        self.assertEqual(bpickle.dumps(None), b"n")
+        self.assertEqual(
+            bpickle.dumps({"messages": [{"type": "ping"}]}),
+            b"du8:messagesldu4:typeu4:ping;;;",
+        )
+
+    def test_dumps_unicode_length(self):
+        """Tests that string lengths count encoded bytes, not characters."""
+        self.assertEqual(bpickle.dumps("é"), b"u2:\xc3\xa9")
+
+    def test_dumps_subclass(self):
+        """Tests that subclasses of supported types are encoded."""
+
+        class Message(dict):
+            pass
+
+        self.assertEqual(bpickle.dumps(Message(a=1)), b"du1:ai1;;")
+
+    def test_dumps_unsupported(self):
+        self.assertRaises(ValueError, bpickle.dumps, object())
+        self.assertRaises(ValueError, bpickle.dumps, [1, {"a": object()}])
+
+    def test_dumps_deeply_nested(self):
+        """Tests that nesting deeper than the recursion limit is encoded."""
+        payload = []
+        for _ in range(100000):
+            payload = [payload]
+
+        self.assertEqual(bpickle.dumps(payload), b"l" * 100001 + b";" * 100001)
+
+
+class LoadsTestCase(TestCase):
+    def test_loads(self):
+        """Tests that values are decoded along with their encoded length."""
+        self.assertEqual(bpickle.loads(b"i12;"), (12, 4))
+        self.assertEqual(bpickle.loads(b"u2:hitrailing"), ("hi", 5))
+        self.assertEqual(bpickle.loads(b"s3:abc"), (b"abc", 6))
+        self.assertEqual(bpickle.loads(b"u2:\xc3\xa9"), ("é", 5))
+        self.assertEqual(bpickle.loads(b"li1;u1:a;"), ([1, "a"], 9))
+        self.assertEqual(bpickle.loads(b"ti1;s1:a;"), ((1, b"a"), 9))
+        self.assertEqual(bpickle.loads(b"b1b0"), (True, 2))
+        self.assertEqual(bpickle.loads(b"f-0.25;"), (-0.25, 7))
+        self.assertEqual(bpickle.loads(b"n"), (None, 1))
+
+    def test_round_trip(self):
+        payload = {
+            "server-uuid": "c0ffee",
+            "messages": [
+                {"type": "register", "id": 1, "tags": ["a", "é"]},
+                {"type": "ping", "nested": {"deep": [[1], [2, {"x": -1}]]}},
+            ],
+            "empty": {},
+            "none": [],
+        }
+
+        result, length = bpickle.loads(bpickle.dumps(payload))
+
+        self.assertEqual(result, payload)
+        self.assertEqual(length, len(bpickle.dumps(payload)))
+
+    def test_loads_unknown_typecode(self):
+        self.assertRaises(ValueError, bpickle.loads, b"x1;")
+
+    def test_loads_malformed(self):
+        self.assertRaises(ValueError, bpickle.loads, b";")
+        self.assertRaises(ValueError, bpickle.loads, b"du1:a;")
+        self.assertRaises(ValueError, bpickle.loads_dict, b"li1;;")
+
+    def test_loads_deeply_nested(self):
+        """Tests that nesting deeper than the recursion limit is decoded."""
+        payload, length = bpickle.loads(b"l" * 100000 + b"i1;" + b";" * 100000)
+
+        depth = 0
+        while isinstance(payload, list):
+            (payload,) = payload
+            depth += 1
+
+        self.assertEqual((depth, payload, length), (100000, 1, 200003))
+
+    def test_round_trip_fuzz(self):
+        """Tests that randomly generated payloads survive a round trip."""
+        rng = random.Random(0)
+
+        for _ in range(200):
+            payload = random_payload(rng)
+            encoded = bpickle.dumps(payload)
+
+            self.assertEqual(bpickle.loads(encoded), (payload, len(encoded)))
+
+    def test_loads_buffers(self):
+        """Tests that bytearrays and memoryviews decode like bytes."""
+        encoded = bpickle.dumps({"a": ["b", 1]})
+
+        self.assertEqual(bpickle.loads(bytearray(encoded)), ({"a": ["b", 1]}, 15))
+        self.assertEqual(bpickle.loads(memoryview(encoded)), ({"a": ["b", 1]}, 15))
+
+    def test_loads_dict_and_list(self):
+        self.assertEqual(bpickle.loads_dict(b"du1:ai1;;"), ({"a": 1}, 9))
+        self.assertEqual(bpickle.loads_list(b"li1;i2;;rest"), ([1, 2], 8))
+
+    def test_loads_scales_linearly(self):
+        """Tests that decoding a payload four times the size takes roughly
+        four times as long, rather than the sixteen a decoder that copies
+        the rest of the payload for each value would take.
+        """
+
+        def best_time(messages):
+            encoded = bpickle.dumps(
+                {"messages": [{"type": "ping", "id": i} for i in range(messages)]}
+            )
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                bpickle.loads(encoded)
+                times.append(time.perf_counter() - start)
+
+            return len(encoded), min(times)
+
+        small_size, small_time = best_time(40000)
+        large_size, large_time = best_time(160000)
+
+        self.assertGreater(small_size, 1000000)
+        self.assertGreater(large_size, 4000000)
+        self.assertLess(large_time / small_time, 8)
+
+
+class StreamTestCase(TestCase):
+    payload = {
+        "server-uuid": "c0ffee",
+        "messages": [{"type": "ping", "id": i, "tags": ["é"] * i} for i in range(20)],
+        "next-expected-sequence": 20,
+    }
+
+    def test_iterdumps(self):
+        """Tests that chunks join up to the full encoding, split between
+        messages.
+        """
+        chunks = list(bpickle.iterdumps(self.payload, chunk_size=64))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b"".join(chunks), bpickle.dumps(self.payload))
+
+    def test_dump(self):
+        fp = io.BytesIO()
+        bpickle.dump(self.payload, fp, chunk_size=64)
+
+        self.assertEqual(fp.getvalue(), bpickle.dumps(self.payload))
+
+    def test_stream_decoder(self):
+        """Tests that messages are returned as soon as their last byte is
+        fed, and that the whole payload is available at the end.
+        """
+        encoded = bpickle.dumps(self.payload)
+        first_end = encoded.index(bpickle.dumps(self.payload["messages"][0]))
+        first_end += len(bpickle.dumps(self.payload["messages"][0]))
+        decoder = bpickle.StreamDecoder()
+
+        self.assertEqual(decoder.feed(encoded[: first_end - 1]), [])
+        self.assertEqual(
+            decoder.feed(encoded[first_end - 1 : first_end]),
+            [self.payload["messages"][0]],
+        )
+        self.assertRaises(ValueError, decoder.result)
+
+        messages = [self.payload["messages"][0]]
+        for i in range(first_end, len(encoded)):
+            messages += decoder.feed(encoded[i : i + 1])
+
+        self.assertEqual(messages, self.payload["messages"])
+        self.assertEqual(decoder.result(), self.payload)
+
+    def test_stream_decoder_drops_messages(self):
+        decoder = bpickle.StreamDecoder(keep_messages=False)
+        messages = decoder.feed(bpickle.dumps(self.payload))
+
+        self.assertEqual(messages, self.payload["messages"])
+        self.assertEqual(decoder.result()["messages"], [])
+        self.assertEqual(decoder.result()["next-expected-sequence"], 20)
+
+    def test_stream_decoder_scalar(self):
+        decoder = bpickle.StreamDecoder()
+
+        self.assertEqual(decoder.feed(b"u5:he"), [])
+        self.assertEqual(decoder.feed(b"llo"), [])
+        self.assertEqual(decoder.result(), "hello")
+
+    def test_stream_decoder_fuzz(self):
+        """Tests that random payloads decode the same byte by byte."""
+        rng = random.Random(1)
+
+        for _ in range(50):
+            payload = [random_payload(rng)]
+            encoded = bpickle.dumps(payload)
+            decoder = bpickle.StreamDecoder()
+
+            for i in range(len(encoded)):
+                decoder.feed(encoded[i : i + 1])
+
+            self.assertEqual(decoder.result(), payload)
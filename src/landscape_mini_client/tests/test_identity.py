@@ -0,0 +1,101 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from ..identity import IDENTITY_KEY, Identity, load_identity, store_identity
+from ..storage import ClientStorage
+
+
+class IdentityTestCase(TestCase):
+    def test_pack_unpack(self):
+        """Tests that an identity is unpacked as it was packed."""
+        identity = Identity(
+            "secure-é",
+            2**40,
+            server_host="landscape.example.com",
+            server_port=":8080",
+            server_uuid="c0ffee",
+            next_seq=12,
+            next_tok="token",
+            title="computer-1",
+        )
+
+        self.assertEqual(Identity.unpack(identity.pack()), identity)
+
+    def test_pack_unpack_none(self):
+        identity = Identity("secure", 1)
+
+        unpacked = Identity.unpack(identity.pack())
+
+        self.assertEqual(unpacked, identity)
+        self.assertIsNone(unpacked.next_tok)
+        self.assertEqual(unpacked.title, "")
+
+    def test_unpack_invalid(self):
+        packed = Identity("secure", 1).pack()
+
+        self.assertRaises(ValueError, Identity.unpack, packed[:10])
+        self.assertRaises(ValueError, Identity.unpack, packed[:-1])
+        self.assertRaises(ValueError, Identity.unpack, packed + b"\x00")
+        self.assertRaises(ValueError, Identity.unpack, packed[:17] + b"\xff")
+
+    def test_pack_nul(self):
+        self.assertRaises(ValueError, Identity("secure\x00", 1).pack)
+
+    def test_shared_fields_interned(self):
+        """Tests that unpacked identities share their server's strings."""
+        identity = Identity("secure", 1, server_host="landscape.example.com")
+
+        first = Identity.unpack(identity.pack())
+        second = Identity.unpack(identity.pack())
+
+        self.assertIs(first.server_host, second.server_host)
+
+    def test_no_dict(self):
+        self.assertFalse(hasattr(Identity("secure", 1), "__dict__"))
+
+
+class IdentityStorageTestCase(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.storage = ClientStorage(os.path.join(self.tempdir.name, "storage"))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_load_missing(self):
+        self.assertIsNone(load_identity(self.storage))
+
+    def test_store_load(self):
+        identity = Identity("secure", 1, next_seq=3)
+
+        store_identity(self.storage, identity)
+
+        self.assertEqual(load_identity(self.storage), identity)
+        self.assertIsInstance(self.storage[IDENTITY_KEY], bytes)
+
+    def test_load_legacy(self):
+        """Tests that storage in the older format is read, and replaced by
+        the next store.
+        """
+        self.storage["registration_info"] = {
+            "server_host": "landscape.example.com",
+            "server_port": "",
+            "server_uuid": "c0ffee",
+            "secure_id": "secure",
+            "insecure_id": 1,
+        }
+        self.storage["next_seq"] = 4
+        self.storage["next_tok"] = b"token"
+
+        identity = load_identity(self.storage)
+
+        self.assertEqual(
+            identity,
+            Identity("secure", 1, "landscape.example.com", "", "c0ffee", 4, "token"),
+        )
+
+        store_identity(self.storage, identity)
+
+        self.assertEqual(list(self.storage), [IDENTITY_KEY])
+        self.assertEqual(load_identity(self.storage), identity)
@@ -0,0 +1,159 @@
+import multiprocessing
+import os.path
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ..logstorage import LogStorage
+from ..storage import ClientStorage, open_storage
+
+
+class LogStorageTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.loc = os.path.join(self.tempdir.name, "storage.log")
+
+    def test_mapping(self):
+        storage = LogStorage(self.loc)
+        storage["a"] = 1
+        storage["b"] = {"nested": [1, 2]}
+        storage["a"] = 3
+        del storage["b"]
+        del storage["missing"]
+
+        self.assertEqual(dict(storage), {"a": 3})
+        self.assertEqual(storage.get("b"), None)
+        self.assertNotIn("b", storage)
+        self.assertEqual(len(storage), 1)
+
+    def test_append_only(self):
+        """Tests that a change appends to the log rather than rewriting it."""
+        storage = LogStorage(self.loc)
+        storage["big"] = "x" * 10000
+        size = os.path.getsize(self.loc)
+
+        storage["small"] = 1
+
+        self.assertLess(os.path.getsize(self.loc) - size, 100)
+
+    def test_replay(self):
+        """Tests that a new instance sees the state left by another."""
+        storage = LogStorage(self.loc)
+        storage["a"] = 1
+        storage["b"] = 2
+        storage.clear()
+        storage["c"] = 3
+
+        self.assertEqual(dict(LogStorage(self.loc)), {"c": 3})
+
+    def test_crash_recovery(self):
+        """Tests that a partly written record is dropped on replay, and
+        overwritten by the next change.
+        """
+        storage = LogStorage(self.loc)
+        storage["a"] = 1
+        storage["b"] = 2
+        size = os.path.getsize(self.loc)
+
+        with open(self.loc, "r+b") as log_fp:
+            log_fp.truncate(size - 3)
+
+        recovered = LogStorage(self.loc)
+        self.assertEqual(dict(recovered), {"a": 1})
+
+        recovered["c"] = 3
+        self.assertEqual(dict(LogStorage(self.loc)), {"a": 1, "c": 3})
+
+    def test_other_writer(self):
+        """Tests that changes made by another instance are picked up."""
+        storage = LogStorage(self.loc)
+        storage["a"] = 1
+
+        other = LogStorage(self.loc)
+        other["a"] = 2
+        other.compact()
+        other["b"] = 3
+
+        self.assertEqual(dict(storage), {"a": 2, "b": 3})
+
+    def test_compacted_by_other_process(self):
+        """Tests that a value is read from where it now is in the log if
+        another process compacts the log after it was last checked.
+        """
+        storage = LogStorage(self.loc)
+        storage["padding"] = "x" * 1000
+        storage["value"] = "value"
+        refresh = storage._refresh
+        compacted = []
+
+        def refresh_then_compact():
+            refresh()
+            if not compacted:
+                process = multiprocessing.Process(target=shrink, args=(self.loc,))
+                process.start()
+                process.join()
+                compacted.append(process.exitcode)
+
+        with patch.object(storage, "_refresh", refresh_then_compact):
+            self.assertEqual(storage["value"], "value")
+
+        self.assertEqual(compacted, [0])
+
+    def test_compaction(self):
+        """Tests that the log is compacted once mostly superseded."""
+        storage = LogStorage(self.loc, compact_min_size=10000)
+
+        for i in range(1000):
+            storage["counter"] = i
+        storage["other"] = "value"
+
+        self.assertLess(os.path.getsize(self.loc), 10000)
+        self.assertEqual(dict(LogStorage(self.loc)), {"counter": 999, "other": "value"})
+
+    def test_transaction(self):
+        storage = LogStorage(self.loc)
+        storage["a"] = 1
+
+        with storage.transaction():
+            storage["b"] = 2
+            del storage["a"]
+            self.assertEqual(dict(storage), {"b": 2})
+            self.assertEqual(dict(LogStorage(self.loc)), {"a": 1})
+
+        self.assertEqual(dict(LogStorage(self.loc)), {"b": 2})
+
+        with self.assertRaises(RuntimeError):
+            with storage.transaction():
+                storage.clear()
+                raise RuntimeError()
+
+        self.assertEqual(dict(storage), {"b": 2})
+
+
+def shrink(loc: str):
+    """Shortens the first record of the log at `loc`, moving those after
+    it, by compacting it.
+    """
+    storage = LogStorage(loc)
+    storage["padding"] = ""
+    storage.compact()
+
+
+class OpenStorageTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def test_open_storage(self):
+        """Tests that the backend is chosen by prefix or extension."""
+        path = os.path.join(self.tempdir.name, "storage")
+
+        self.assertIsInstance(open_storage(f"log:{path}"), LogStorage)
+        self.assertIsInstance(open_storage(f"{path}.log"), LogStorage)
+        self.assertIsInstance(open_storage(f"pickle:{path}.log"), ClientStorage)
+        self.assertIsInstance(open_storage(f"{path}.pickle"), ClientStorage)
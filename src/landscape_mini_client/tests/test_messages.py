@@ -1,10 +1,15 @@
-from http.server import HTTPServer, HTTPStatus, BaseHTTPRequestHandler
+from http.server import (
+    HTTPServer,
+    HTTPStatus,
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
 from logging import ERROR
 from time import sleep
 from threading import Thread
 from unittest import TestCase
 
-from ..messages import MessageException, send_message
+from ..messages import MessageClient, MessageException, send_message
 from ..util import bpickle
 
 
@@ -138,3 +143,142 @@ class SendMessageTestCase(TestCase):
             )
 
         self.assertEqual(len(logging.records), 1)
+
+
+class KeepAliveHTTPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    statuses = []
+    client_ports = []
+    bodies = []
+    payload = "test"
+    # Sent instead of the pickled payload, if set.
+    body = None
+
+    def do_POST(self):
+        self.bodies.append(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.client_ports.append(self.client_address[1])
+
+        response = self.body if self.body is not None else bpickle.dumps(self.payload)
+        status = self.statuses.pop(0) if self.statuses else HTTPStatus.OK
+        self.send_response(status)
+        self.send_header("Content-Length", len(response))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class MessageClientTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        KeepAliveHTTPRequestHandler.statuses = []
+        KeepAliveHTTPRequestHandler.client_ports = []
+        KeepAliveHTTPRequestHandler.bodies = []
+        KeepAliveHTTPRequestHandler.payload = "test"
+        KeepAliveHTTPRequestHandler.body = None
+
+        self.server = ThreadingHTTPServer(("localhost", 0), KeepAliveHTTPRequestHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://localhost:{self.server.server_port}/message-system"
+
+    def test_connection_reuse(self):
+        """Tests that consecutive messages are sent over one connection."""
+        with MessageClient() as client:
+            for _ in range(3):
+                status_code, payload = client.send_message(
+                    self.url, {"messages": []}, verify=False
+                )
+                self.assertEqual(status_code, 200)
+
+        self.assertEqual(len(KeepAliveHTTPRequestHandler.client_ports), 3)
+        self.assertEqual(len(set(KeepAliveHTTPRequestHandler.client_ports)), 1)
+
+    def test_retry_status(self):
+        """Tests that responses with a retryable status are retried."""
+        KeepAliveHTTPRequestHandler.statuses = [HTTPStatus.SERVICE_UNAVAILABLE]
+
+        with MessageClient(retries=2, retry_statuses=[503]) as client:
+            status_code, payload = client.send_message(
+                self.url, {"messages": []}, verify=False
+            )
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(KeepAliveHTTPRequestHandler.client_ports), 2)
+
+    def test_no_retry_by_default(self):
+        """Tests that a failing status is returned as-is by default."""
+        KeepAliveHTTPRequestHandler.statuses = [HTTPStatus.SERVICE_UNAVAILABLE]
+
+        with MessageClient() as client:
+            status_code, _ = client.get(self.url)
+
+        self.assertEqual(status_code, 503)
+
+    def test_on_message(self):
+        """Tests that messages in a streamed response are passed to the
+        callback rather than returned.
+        """
+        messages = [{"type": "ping", "id": i} for i in range(100)]
+        KeepAliveHTTPRequestHandler.payload = {"messages": messages, "next": 1}
+        received = []
+
+        with MessageClient() as client:
+            status_code, payload = client.send_message(
+                self.url, {"messages": []}, on_message=received.append, verify=False
+            )
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(payload, {"messages": [], "next": 1})
+        self.assertEqual(received, messages)
+
+    def test_spool(self):
+        """Tests that a spooled message is sent with the same encoding."""
+        message = {"messages": [{"type": "ping", "id": i} for i in range(100)]}
+
+        with MessageClient() as client:
+            status_code, _ = client.send_message(
+                self.url, message, spool=True, verify=False
+            )
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(KeepAliveHTTPRequestHandler.bodies, [bpickle.dumps(message)])
+
+    def test_pre_encoded(self):
+        """Tests that an already encoded message is sent as it is."""
+        with MessageClient() as client:
+            client.send_message(self.url, b"du1:ai1;;", verify=False)
+
+        self.assertEqual(KeepAliveHTTPRequestHandler.bodies, [b"du1:ai1;;"])
+
+    def test_undecodable(self):
+        """Tests that we log an error and raise a MessageException if the
+        response isn't a bpickle, such as a proxy's error page.
+        """
+        KeepAliveHTTPRequestHandler.statuses = [HTTPStatus.BAD_GATEWAY] * 3
+        KeepAliveHTTPRequestHandler.body = b"<html>Bad Gateway</html>"
+        self.addCleanup(setattr, KeepAliveHTTPRequestHandler, "body", None)
+
+        for kwargs in (
+            {},
+            {"on_message": lambda message: None},
+            {"timing_hooks": [lambda timing: None]},
+        ):
+            with self.subTest(kwargs=list(kwargs)):
+                on_message = kwargs.pop("on_message", None)
+
+                with MessageClient(**kwargs) as client, self.assertLogs(
+                    level=ERROR
+                ) as logging:
+                    self.assertRaises(
+                        MessageException,
+                        client.send_message,
+                        self.url,
+                        {"messages": []},
+                        on_message=on_message,
+                        verify=False,
+                    )
+
+                self.assertEqual(len(logging.records), 1)
@@ -0,0 +1,209 @@
+import os
+import tempfile
+import urllib.error
+import urllib.request
+from argparse import Namespace
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from unittest import TestCase
+
+from ..messages import MessageClient
+from ..metrics import (
+    ClientMetrics,
+    MetricsServer,
+    Registry,
+    TextfileExporter,
+    TimedStorage,
+    exporting,
+)
+from ..storage import ClientStorage
+from ..util import bpickle
+from ..util.stats import LatencyHistogram
+from .test_messages import KeepAliveHTTPRequestHandler
+
+
+class RegistryTestCase(TestCase):
+    def test_render(self):
+        """Tests that metrics are rendered in the Prometheus text format."""
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests.", ("outcome",))
+        duration = registry.histogram(
+            "duration_seconds", "Duration.", buckets=(0.1, 1.0)
+        )
+
+        requests.inc("200")
+        requests.inc("200")
+        requests.inc('a "quoted"\nerror')
+        for seconds in (0.05, 0.1, 0.5, 2.0):
+            duration.observe(seconds)
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{outcome="200"} 2\n'
+            'requests_total{outcome="a \\"quoted\\"\\nerror"} 1\n'
+            "# HELP duration_seconds Duration.\n"
+            "# TYPE duration_seconds histogram\n"
+            'duration_seconds_bucket{le="0.1"} 2\n'
+            'duration_seconds_bucket{le="1"} 3\n'
+            'duration_seconds_bucket{le="+Inf"} 4\n'
+            "duration_seconds_sum 2.65\n"
+            "duration_seconds_count 4\n",
+        )
+
+    def test_duplicate_name(self):
+        registry = Registry()
+        registry.counter("requests_total", "Requests.")
+
+        with self.assertRaises(ValueError):
+            registry.histogram("requests_total", "Requests.")
+
+    def test_merge(self):
+        """Tests that a latency histogram's counts are added to the
+        buckets holding them.
+        """
+        histogram = Registry().histogram("duration_seconds", "", buckets=(0.01, 0.1))
+        latencies = LatencyHistogram()
+        for seconds in (0.001, 0.002, 0.05, 0.5):
+            latencies.record(seconds)
+
+        histogram.merge(latencies)
+        histogram.merge(LatencyHistogram())
+
+        counts, total = histogram.values[()]
+        self.assertEqual(counts, [2, 1, 1])
+        self.assertAlmostEqual(total[0], 0.553)
+
+
+class ClientMetricsTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        KeepAliveHTTPRequestHandler.statuses = []
+        KeepAliveHTTPRequestHandler.client_ports = []
+        KeepAliveHTTPRequestHandler.bodies = []
+        KeepAliveHTTPRequestHandler.payload = "test"
+
+        self.server = ThreadingHTTPServer(("localhost", 0), KeepAliveHTTPRequestHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        self.netloc = f"localhost:{self.server.server_port}"
+
+        self.metrics = ClientMetrics()
+
+    def test_timing_hook(self):
+        """Tests that the requests a client times are recorded, with the
+        bytes they sent and received.
+        """
+        received = len(bpickle.dumps(KeepAliveHTTPRequestHandler.payload))
+
+        with MessageClient(timing_hooks=[self.metrics]) as client:
+            client.send_message(
+                f"http://{self.netloc}/message-system", {"messages": []}
+            )
+            client.get(f"http://{self.netloc}/ping?insecure_id=1")
+
+        self.assertEqual(
+            self.metrics.requests.values,
+            {
+                ("exchange", self.netloc, "200"): 1,
+                ("ping", self.netloc, "200"): 1,
+            },
+        )
+        self.assertEqual(
+            self.metrics.sent_bytes.values,
+            {("exchange", self.netloc): len(KeepAliveHTTPRequestHandler.bodies[0])},
+        )
+        self.assertEqual(
+            self.metrics.received_bytes.values,
+            {("exchange", self.netloc): received, ("ping", self.netloc): received},
+        )
+        self.assertIn(("exchange",), self.metrics.encode_duration.values)
+        self.assertIn(("ping",), self.metrics.decode_duration.values)
+
+    def test_timed_storage(self):
+        """Tests that storage operations are timed by operation, and
+        transactions still apply.
+        """
+        storage = TimedStorage(
+            ClientStorage(os.path.join(tempfile.mkdtemp(), "storage")), self.metrics
+        )
+
+        storage["key"] = 1
+        with storage.transaction():
+            storage["key"] = storage["key"] + 1
+
+        self.assertEqual(storage.get("key"), 2)
+        self.assertIsNone(storage.get("missing"))
+        self.assertEqual(
+            {
+                labels: sum(counts)
+                for labels, (counts, _) in self.metrics.storage_duration.values.items()
+            },
+            {("write",): 2, ("read",): 3, ("transaction",): 1},
+        )
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.metrics = ClientMetrics()
+        self.metrics.record("ping", "localhost", "200", 0.01)
+
+    def test_server(self):
+        server = MetricsServer(self.metrics.registry, 0, "localhost").start()
+        self.addCleanup(server.close)
+        url = f"http://localhost:{server.port}"
+
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            body = response.read().decode()
+
+        self.assertIn(
+            'lmc_requests_total{kind="ping",server="localhost",outcome="200"} 1',
+            body,
+        )
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")
+
+    def test_server_local(self):
+        """Tests that metrics are only served locally by default."""
+        server = MetricsServer(self.metrics.registry, 0)
+        self.addCleanup(server.close)
+
+        self.assertEqual(server.httpd.server_address[0], "127.0.0.1")
+
+    def test_textfile(self):
+        """Tests that the file is written on starting and again on closing,
+        without leaving temporary files behind.
+        """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "lmc.prom")
+        exporter = TextfileExporter(self.metrics.registry, path, 60).start()
+
+        with open(path) as fp:
+            self.assertIn('outcome="200"} 1\n', fp.read())
+
+        self.metrics.record("ping", "localhost", "200", 0.01)
+        exporter.close()
+
+        with open(path) as fp:
+            self.assertIn('outcome="200"} 2\n', fp.read())
+        self.assertEqual(os.listdir(directory), ["lmc.prom"])
+
+    def test_exporting(self):
+        """Tests that metrics are only recorded if exporting them was asked
+        for.
+        """
+        args = Namespace(metrics_port=None, metrics_file=None, metrics_interval=15)
+
+        with exporting(args) as metrics:
+            self.assertIsNone(metrics)
+
+        args.metrics_file = os.path.join(tempfile.mkdtemp(), "lmc.prom")
+        with exporting(args) as metrics:
+            metrics.record("ping", "localhost", "200", 0.01)
+
+        with open(args.metrics_file) as fp:
+            self.assertIn("lmc_requests_total", fp.read())
@@ -0,0 +1,188 @@
+import http.client
+import time
+from unittest import TestCase
+
+from ..commands.pingspam import pingspam
+from ..messages import MessageClient
+from ..util import bpickle
+from ..util.mockserver import Faults, MockServer, running
+
+
+REGISTRATION = {"messages": [{"type": "register", "computer_title": "test"}]}
+
+
+class MockServerTestCase(TestCase):
+    def start(self, faults: Faults = Faults()) -> str:
+        """Starts a server with `faults` and returns its URL."""
+        self.server = MockServer(faults, seed=1)
+        context = running(self.server)
+        port = context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+
+        self.client = MessageClient()
+        self.addCleanup(self.client.close)
+
+        return f"http://localhost:{port}"
+
+    def register(self, url: str) -> dict:
+        status, payload = self.client.send_message(
+            f"{url}/message-system", REGISTRATION
+        )
+        self.assertEqual(status, 200)
+
+        return payload["messages"][0]
+
+    def test_register(self):
+        """Tests that each registration is issued its own IDs."""
+        url = self.start()
+
+        first = self.register(url)
+        second = self.register(url)
+
+        self.assertEqual(first["type"], "set-id")
+        self.assertEqual((first["insecure-id"], second["insecure-id"]), (1, 2))
+        self.assertNotEqual(first["id"], second["id"])
+        self.assertEqual(self.server.clients[first["id"].decode()].title, "test")
+
+    def test_exchange_sequence(self):
+        """Tests that messages are only accepted if they follow on from the
+        client's sequence, which the server tracks.
+        """
+        url = self.start()
+        secure_id = self.register(url)["id"].decode()
+
+        def exchange(sequence: int) -> int:
+            status, payload = self.client.send_message(
+                f"{url}/message-system",
+                {"sequence": sequence, "messages": [{"type": "test"}] * 3},
+                secure_id=secure_id,
+            )
+            self.assertEqual(status, 200)
+            self.assertTrue(payload["next-exchange-token"])
+
+            return payload["next-expected-sequence"]
+
+        self.assertEqual(exchange(0), 3)
+        self.assertEqual(exchange(3), 6)
+        # Out of sequence, so nothing is accepted.
+        self.assertEqual(exchange(10), 6)
+        self.assertEqual(self.server.stats.messages, 6)
+
+    def test_unknown_id(self):
+        url = self.start()
+
+        _, payload = self.client.send_message(
+            f"{url}/message-system",
+            {"sequence": 0, "messages": []},
+            secure_id="unknown",
+        )
+
+        self.assertEqual(payload["messages"], [{"type": "unknown-id"}])
+
+    def test_ping(self):
+        """Tests that pings say whether messages are waiting, until they are
+        delivered by an exchange.
+        """
+        url = self.start()
+        registration = self.register(url)
+        ping_url = f"{url}/ping?insecure_id={registration['insecure-id']}"
+
+        self.assertEqual(self.client.get(ping_url), (200, {"messages": False}))
+
+        client = self.server.clients[registration["id"].decode()]
+        self.server.queue(client, [{"type": "test"}])
+        self.assertEqual(self.client.get(ping_url), (200, {"messages": True}))
+
+        _, payload = self.client.send_message(
+            f"{url}/message-system",
+            {"sequence": 0, "messages": []},
+            secure_id=client.secure_id,
+        )
+        self.assertEqual(payload["messages"], [{"type": "test"}])
+        self.assertEqual(self.client.get(ping_url), (200, {"messages": False}))
+
+    def test_faults(self):
+        """Tests that responses are delayed, failed and padded as
+        configured.
+        """
+        url = self.start(Faults(latency=0.05, payload_size=1000))
+        secure_id = self.register(url)["id"].decode()
+
+        start = time.monotonic()
+        _, payload = self.client.send_message(
+            f"{url}/message-system",
+            {"sequence": 0, "messages": []},
+            secure_id=secure_id,
+        )
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(payload["messages"][0]["data"], b"x" * 1000)
+
+        connection = http.client.HTTPConnection(url[len("http://") :])
+        self.addCleanup(connection.close)
+
+        for status in (500, 599):
+            with self.subTest(status=status):
+                self.server.faults = Faults(error_rate=1, error_status=status)
+                connection.request("GET", "/ping?insecure_id=1")
+                response = connection.getresponse()
+
+                self.assertEqual(response.status, status)
+                self.assertEqual(response.getheader("Content-Type"), "text/html")
+                self.assertIn(str(status).encode(), response.read())
+
+        self.assertEqual(self.server.stats.errors, 2)
+
+    def test_chunked(self):
+        """Tests that chunked request bodies are read, and bad requests are
+        rejected.
+        """
+        url = self.start()
+        connection = http.client.HTTPConnection(url[len("http://") :])
+        self.addCleanup(connection.close)
+
+        connection.request(
+            "POST",
+            "/message-system",
+            body=iter([bpickle.dumps(REGISTRATION)]),
+            encode_chunked=True,
+        )
+        response = connection.getresponse()
+        payload, _ = bpickle.loads(response.read())
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(payload["messages"][0]["type"], "set-id")
+
+        for path, body, status in [
+            ("/message-system", b"not bpickle", 400),
+            ("/ping", b"", 400),
+            ("/other", b"", 404),
+        ]:
+            with self.subTest(path=path):
+                connection.request("POST", path, body=body)
+                response = connection.getresponse()
+                response.read()
+
+                self.assertEqual(response.status, status)
+
+    def test_pingspam(self):
+        """Tests that pingspam's backends can all be run against the
+        server.
+        """
+        url = self.start()
+
+        for backend in ("requests", "async", "pipelined"):
+            with self.subTest(backend=backend):
+                stats, _ = pingspam(
+                    [url[len("http://") :]],
+                    ["1", "2"],
+                    workers=1,
+                    backend=backend,
+                    concurrency=4,
+                    report_interval=0.1,
+                    count=20,
+                )
+
+                self.assertEqual(
+                    list(stats.outcomes_by_server().values()), [{"200": 20}]
+                )
@@ -0,0 +1,58 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from ..outbox import Outbox
+from ..storage import ClientStorage
+from ..util import bpickle
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.storage = ClientStorage(os.path.join(self.tempdir.name, "storage"))
+        self.outbox = Outbox(self.storage)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_add(self):
+        """Tests that messages are queued in order and kept in storage."""
+        self.assertEqual(self.outbox.add([{"type": "a"}]), 1)
+        self.assertEqual(self.outbox.add([{"type": "b"}, {"type": "c"}]), 3)
+
+        outbox = Outbox(ClientStorage(self.storage._loc))
+
+        self.assertEqual(len(outbox), 3)
+        self.assertEqual(
+            [message["type"] for message in outbox.pending()], ["a", "b", "c"]
+        )
+
+    def test_acknowledge(self):
+        self.outbox.add([{"type": "a"}, {"type": "b"}, {"type": "c"}])
+
+        self.outbox.acknowledge(0)
+        self.outbox.acknowledge(2)
+
+        self.assertEqual(self.outbox.pending(), [{"type": "c"}])
+
+    def test_batch_max_messages(self):
+        self.outbox.add([{"n": n} for n in range(5)])
+
+        self.assertEqual(self.outbox.batch(max_messages=2), [{"n": 0}, {"n": 1}])
+        self.assertEqual(len(self.outbox.batch()), 5)
+
+    def test_batch_max_bytes(self):
+        """Tests that a batch stops before the message that would take it
+        over budget, but always holds at least one message.
+        """
+        messages = [{"data": "x" * 100} for _ in range(5)]
+        self.outbox.add(messages)
+        size = len(bpickle.dumps(messages[0]))
+
+        self.assertEqual(len(self.outbox.batch(max_bytes=size * 3)), 3)
+        self.assertEqual(len(self.outbox.batch(max_bytes=size * 3 - 1)), 2)
+        self.assertEqual(len(self.outbox.batch(max_bytes=1)), 1)
+
+    def test_batch_empty(self):
+        self.assertEqual(self.outbox.batch(), [])
@@ -0,0 +1,166 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from ..util.asynchttp import HTTPProtocolError
+from ..util.rawhttp import PipelinedPool, ResponseParser
+
+
+class ResponseParserTestCase(TestCase):
+    def test_pipelined(self):
+        """Tests that several responses in one chunk are all parsed."""
+        parser = ResponseParser()
+
+        responses = parser.feed(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+            b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"
+        )
+
+        self.assertEqual([r.status for r in responses], [200, 404])
+        self.assertEqual(responses[0].body, b"ok")
+
+    def test_split(self):
+        """Tests that responses split across chunks are reassembled."""
+        parser = ResponseParser()
+        data = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello" * 2
+
+        responses = []
+        for i in range(len(data)):
+            responses.extend(parser.feed(data[i : i + 1]))
+
+        self.assertEqual([r.body for r in responses], [b"hello", b"hello"])
+
+    def test_chunked(self):
+        parser = ResponseParser()
+
+        self.assertEqual(
+            parser.feed(
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nab"
+            ),
+            [],
+        )
+        responses = parser.feed(b"c\r\n0\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n")
+
+        self.assertEqual(responses[0].body, b"abc")
+        self.assertEqual(responses[1].status, 204)
+
+    def test_malformed(self):
+        """Tests that unparseable lengths are protocol errors."""
+        for response in (
+            b"HTTP/1.1 200 OK\r\nContent-Length: ten\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: -1\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nxyz\r\n",
+        ):
+            with self.subTest(response=response):
+                self.assertRaises(HTTPProtocolError, ResponseParser().feed, response)
+
+    def test_connection_close(self):
+        """
+        Tests that a close-delimited body is completed at EOF and the
+        connection is flagged as closing.
+        """
+        parser = ResponseParser()
+
+        self.assertEqual(parser.feed(b"HTTP/1.0 200 OK\r\n\r\nbody"), [])
+        self.assertTrue(parser.closing)
+        self.assertEqual(parser.eof()[0].body, b"body")
+
+
+class PipelinedPoolTestCase(IsolatedAsyncioTestCase):
+    async def test_pipelining(self):
+        """
+        Tests that requests are written without waiting for responses,
+        and each caller gets its own response back.
+        """
+        received = asyncio.Event()
+
+        async def handle(reader, writer):
+            requests = []
+            while len(requests) < 3:
+                requests.append(await reader.readuntil(b"\r\n\r\n"))
+            received.set()
+
+            for request in requests:
+                insecure_id = request.split(b"=", 1)[1].split(b" ", 1)[0]
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s"
+                    % (len(insecure_id), insecure_id)
+                )
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, "localhost", 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        port = server.sockets[0].getsockname()[1]
+
+        pool = PipelinedPool("localhost", port, connections=1, depth=3)
+        self.addCleanup(pool.close)
+
+        responses = await asyncio.gather(
+            *(
+                pool.send(b"GET /ping?insecure_id=%d HTTP/1.1\r\n\r\n" % i)
+                for i in range(3)
+            )
+        )
+
+        self.assertTrue(received.is_set())
+        self.assertEqual([r.body for r in responses], [b"0", b"1", b"2"])
+
+    async def test_malformed_response(self):
+        """Tests that a response that can't be parsed fails the requests
+        waiting on the connection, rather than leaving them waiting.
+        """
+
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nxyz\r\n"
+            )
+            await writer.drain()
+
+        server = await asyncio.start_server(handle, "localhost", 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        port = server.sockets[0].getsockname()[1]
+
+        pool = PipelinedPool("localhost", port, connections=1)
+        self.addCleanup(pool.close)
+
+        with self.assertRaises(HTTPProtocolError):
+            await asyncio.wait_for(
+                pool.send(b"GET /ping?insecure_id=1 HTTP/1.1\r\n\r\n"), 5
+            )
+
+    async def test_unsolicited_response(self):
+        """Tests that a response nobody asked for closes the connection,
+        rather than raising from the protocol's callbacks.
+        """
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            # Answered twice, as if the second were a 408 sent on timing
+            # the connection out.
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok" * 2)
+            await writer.drain()
+            await reader.read()
+
+        server = await asyncio.start_server(handle, "localhost", 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        port = server.sockets[0].getsockname()[1]
+
+        pool = PipelinedPool("localhost", port, connections=1)
+        self.addCleanup(pool.close)
+
+        for _ in range(2):
+            response = await asyncio.wait_for(
+                pool.send(b"GET /ping?insecure_id=1 HTTP/1.1\r\n\r\n"), 5
+            )
+            self.assertEqual(response.body, b"ok")
+            await asyncio.sleep(0.05)
+
+        self.assertEqual(errors, [])
@@ -0,0 +1,79 @@
+import os.path
+import tempfile
+from itertools import islice
+from unittest import TestCase
+
+from ..util.schedule import RateSchedule, parse_schedule
+
+
+class RateScheduleTestCase(TestCase):
+    def test_linear(self):
+        """Tests that rates are interpolated between points."""
+        schedule = RateSchedule.linear(100, 200, 10)
+
+        self.assertEqual(schedule.rate_at(0), 100)
+        self.assertEqual(schedule.rate_at(5), 150)
+        self.assertEqual(schedule.rate_at(60), 200)
+
+    def test_steps(self):
+        """Tests that each step's rate is held for its duration."""
+        schedule = RateSchedule.steps([10, 20, 30], 5)
+
+        self.assertEqual(schedule.rate_at(4.9), 10)
+        self.assertEqual(schedule.rate_at(5), 20)
+        self.assertEqual(schedule.rate_at(14), 30)
+        self.assertEqual(schedule.duration, 15)
+
+    def test_send_times(self):
+        """Tests that send times are spaced by the inverse of the rate."""
+        schedule = RateSchedule.constant(4)
+
+        times = list(islice(schedule.send_times(), 5))
+
+        self.assertEqual(times, [0.0, 0.25, 0.5, 0.75, 1.0])
+
+    def test_send_times_zero_rate(self):
+        """
+        Tests that a zero rate sends nothing until the rate picks up, and
+        ends the schedule once it's over.
+        """
+        schedule = RateSchedule([(0, 0), (1, 0), (1, 2), (2, 2), (2, 0)])
+
+        times = list(schedule.send_times())
+
+        self.assertEqual(len(times), 2)
+        self.assertGreaterEqual(times[0], 1)
+
+    def test_scaled(self):
+        """Tests that scaling multiplies every rate."""
+        schedule = RateSchedule.linear(100, 200, 10).scaled(0.5)
+
+        self.assertEqual(schedule.rate_at(10), 100)
+
+
+class ParseScheduleTestCase(TestCase):
+    def test_linear(self):
+        schedule = parse_schedule("linear:10:110:100")
+
+        self.assertEqual(schedule.rate_at(50), 60)
+
+    def test_step(self):
+        schedule = parse_schedule("step:100,200:30")
+
+        self.assertEqual(schedule.rate_at(45), 200)
+
+    def test_file(self):
+        """Tests that schedules are read from 'SECONDS RATE' lines."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "profile")
+            with open(path, "w") as fp:
+                fp.write("# warm up\n0 10\n\n60 1000\n")
+
+            schedule = parse_schedule(f"file:{path}")
+
+        self.assertEqual(schedule.points, [(0.0, 10.0), (60.0, 1000.0)])
+
+    def test_invalid(self):
+        """Tests that malformed and unknown ramps raise ValueError."""
+        self.assertRaises(ValueError, parse_schedule, "linear:10")
+        self.assertRaises(ValueError, parse_schedule, "sine:1:2")
@@ -0,0 +1,92 @@
+import os.path
+import tempfile
+from unittest import TestCase
+
+from ..sqlitestorage import SQLiteStorage
+from ..storage import ClientStorage, migrate, open_storage
+
+
+class SQLiteStorageTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.loc = os.path.join(self.tempdir.name, "storage.sqlite")
+
+    def open(self, client="default"):
+        storage = SQLiteStorage(self.loc, client)
+        self.addCleanup(storage.close)
+
+        return storage
+
+    def test_mapping(self):
+        storage = self.open()
+        storage["a"] = 1
+        storage["b"] = {"nested": [1, 2]}
+        storage["a"] = 3
+        del storage["b"]
+        del storage["missing"]
+
+        self.assertEqual(dict(storage), {"a": 3})
+        self.assertEqual(storage.get("b"), None)
+        self.assertNotIn("b", storage)
+        self.assertEqual(len(storage), 1)
+        self.assertEqual(dict(self.open()), {"a": 3})
+
+    def test_string_keys(self):
+        storage = self.open()
+
+        self.assertRaises(TypeError, storage.__setitem__, 1, "value")
+
+    def test_namespaces(self):
+        """Tests that each client's state is kept apart."""
+        storage = self.open("web-01")
+        other = storage.namespace("web-02")
+        storage["secure_id"] = "one"
+        other["secure_id"] = "two"
+        other.clear()
+        other["next_seq"] = 5
+
+        self.assertEqual(dict(storage), {"secure_id": "one"})
+        self.assertEqual(dict(self.open("web-02")), {"next_seq": 5})
+        self.assertEqual(storage.clients(), ["web-01", "web-02"])
+
+    def test_transaction(self):
+        storage = self.open()
+        storage["a"] = 1
+
+        with self.assertRaises(RuntimeError):
+            with storage.transaction():
+                storage["a"] = 2
+                storage.namespace("other")["b"] = 3
+                raise RuntimeError()
+
+        self.assertEqual(storage["a"], 1)
+        self.assertEqual(storage.clients(), ["default"])
+
+        with storage.transaction():
+            storage.update_many({"a": 4, "c": 5})
+
+        self.assertEqual(dict(self.open()), {"a": 4, "c": 5})
+
+    def test_migrate(self):
+        """Tests that a pickle file's contents are copied into a client's
+        namespace.
+        """
+        pickle_loc = os.path.join(self.tempdir.name, "storage.pickle")
+        source = ClientStorage(pickle_loc)
+        source["registered"] = True
+        source["registration_info"] = {"secure_id": "abc"}
+
+        copied = migrate(source, open_storage(f"sqlite:{self.loc}#web-01"))
+
+        self.assertEqual(copied, 2)
+        self.assertEqual(dict(self.open("web-01")), dict(source))
+
+    def test_open_storage(self):
+        storage = open_storage(f"{self.loc}#web-01")
+        self.addCleanup(storage.close)
+
+        self.assertIsInstance(storage, SQLiteStorage)
+        self.assertEqual(storage.client, "web-01")
@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest import TestCase
+
+from ..__main__ import COMMANDS
+
+
+PACKAGE = __package__.rpartition(".")[0]
+# The directory from which `PACKAGE` is importable.
+ROOT = os.path.dirname(__file__)
+for _ in range(PACKAGE.count(".") + 2):
+    ROOT = os.path.dirname(ROOT)
+
+# Most seconds any command may take to start, well above the ~0.2 seconds
+# the slowest takes, so that only a regression such as importing every
+# command's dependencies up front fails it.
+STARTUP_CEILING = 1.5
+# Modules only the commands exchanging messages need.
+HEAVY_MODULES = ("requests", "urllib3", "asyncio", "multiprocessing", "sqlite3")
+
+# Loads a command as the dispatcher does to show its help, then reports
+# which of `HEAVY_MODULES` that imported.
+LOAD_COMMAND = """
+import json, sys
+from {package}.__main__ import main
+sys.argv = ["landscape-mini-client"] + {args!r}
+main()
+print(json.dumps([module for module in {heavy!r} if module in sys.modules]))
+"""
+
+
+def run_command(*args: str):
+    """Starts the CLI with `args` in a fresh interpreter and returns how
+    long it took and the heavy modules it imported.
+    """
+    code = LOAD_COMMAND.format(package=PACKAGE, args=list(args), heavy=HEAVY_MODULES)
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    return elapsed, json.loads(result.stdout.splitlines()[-1])
+
+
+class StartupTestCase(TestCase):
+    def test_startup_ceiling(self):
+        """Tests that every command starts in under the ceiling."""
+        for group in COMMANDS.values():
+            for name, _, _ in group:
+                with self.subTest(command=name):
+                    elapsed = min(run_command(name, "--help")[0] for _ in range(2))
+
+                    self.assertLess(elapsed, STARTUP_CEILING)
+
+    def test_help_imports_no_commands(self):
+        """Tests that listing the commands imports none of their
+        dependencies.
+        """
+        _, imported = run_command("--help")
+
+        self.assertEqual(imported, [])
+
+    def test_storage_commands_import_no_network(self):
+        for name in ("clear-storage", "migrate-storage"):
+            with self.subTest(command=name):
+                _, imported = run_command(name, "--help")
+
+                self.assertEqual(imported, [])
+
+    def test_command_metadata(self):
+        """Tests that each command is listed under its own name and help
+        message.
+        """
+        for group in COMMANDS.values():
+            for name, help_msg, target in group:
+                with self.subTest(command=name):
+                    module_name, _, class_name = target.partition(":")
+                    module = __import__(
+                        f"{PACKAGE}.commands{module_name}", fromlist=[class_name]
+                    )
+                    command = getattr(module, class_name)
+
+                    self.assertEqual(command.name, name)
+                    self.assertEqual(command.help_msg, help_msg)
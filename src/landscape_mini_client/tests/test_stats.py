@@ -0,0 +1,124 @@
+from unittest import TestCase
+
+from ..util.stats import LatencyHistogram, PingStats, RateTracker
+
+
+class RateTrackerTestCase(TestCase):
+    def test_sample(self):
+        """
+        Tests that instantaneous, windowed and average rates are derived
+        from the sampled totals.
+        """
+        tracker = RateTracker(window=2.0, now=0.0)
+
+        tracker.sample(100, now=1.0)
+        tracker.sample(300, now=2.0)
+        sample = tracker.sample(400, now=3.0)
+
+        self.assertEqual(sample.total, 400)
+        self.assertEqual(sample.instant, 100.0)
+        self.assertEqual(sample.windowed, 150.0)
+        self.assertAlmostEqual(sample.average, 400 / 3)
+
+    def test_sample_no_elapsed_time(self):
+        """Tests that a zero-length interval reports a zero rate."""
+        tracker = RateTracker(now=5.0)
+
+        sample = tracker.sample(10, now=5.0)
+
+        self.assertEqual(sample.instant, 0.0)
+        self.assertEqual(sample.average, 0.0)
+
+
+class LatencyHistogramTestCase(TestCase):
+    def test_percentile(self):
+        """
+        Tests that percentiles are reported within the histogram's
+        precision.
+        """
+        histogram = LatencyHistogram()
+
+        for millis in range(1, 1001):
+            histogram.record(millis / 1000)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.5 * 0.03)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, delta=0.99 * 0.03)
+        self.assertEqual(histogram.percentile(100), 1.0)
+
+    def test_small_values_exact(self):
+        """Tests that latencies of a few microseconds are kept exactly."""
+        histogram = LatencyHistogram()
+
+        histogram.record(0.000010)
+
+        self.assertEqual(histogram.percentile(50), 0.000010)
+
+    def test_merge(self):
+        """
+        Tests that merging two histograms is the same as recording
+        everything in one.
+        """
+        first = LatencyHistogram()
+        second = LatencyHistogram()
+        both = LatencyHistogram()
+
+        for value in (0.001, 0.002, 0.5):
+            first.record(value)
+            both.record(value)
+        for value in (0.004, 3.0):
+            second.record(value)
+            both.record(value)
+
+        first.merge(second)
+
+        self.assertEqual(first.counts, both.counts)
+        self.assertEqual(first.count, 5)
+        self.assertEqual(first.min, 0.001)
+        self.assertEqual(first.max, 3.0)
+
+    def test_empty(self):
+        """Tests that an empty histogram reports zero latency."""
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+
+
+class PingStatsTestCase(TestCase):
+    def test_merge(self):
+        """Tests that outcomes and latencies are merged per server."""
+        first = PingStats()
+        first.record("a", "200", 0.001)
+        first.record("b", "ConnectionError", 0.002)
+
+        second = PingStats()
+        second.record("a", "200", 0.003)
+        second.record("a", "503", 0.004)
+
+        first.merge(second)
+
+        self.assertEqual(first.count, 4)
+        self.assertEqual(
+            first.outcomes_by_server(),
+            {"a": {"200": 2, "503": 1}, "b": {"ConnectionError": 1}},
+        )
+        self.assertEqual(first.latencies["a"].count, 3)
+        self.assertEqual(first.latency().count, 4)
+
+    def test_summary(self):
+        """
+        Tests that the summary includes throughput, errors and a per-server
+        breakdown.
+        """
+        stats = PingStats()
+        stats.record("a", "200", 0.001)
+        stats.record("a", "503", 0.002)
+        stats.record("b", "ReadTimeout", 0.003)
+
+        summary = stats.summary(elapsed=2.0)
+
+        self.assertEqual(summary["pings"], 3)
+        self.assertEqual(summary["throughput"], 1.5)
+        self.assertEqual(summary["errors"], 2)
+        self.assertEqual(summary["outcomes"], {"200": 1, "503": 1, "ReadTimeout": 1})
+        self.assertEqual(summary["servers"]["a"]["errors"], 1)
+        self.assertIn("p99.9", summary["latency_ms"])
+        self.assertNotIn("schedule_lag_ms", summary)
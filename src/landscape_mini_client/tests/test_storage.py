@@ -1,7 +1,9 @@
+import multiprocessing
 import os.path
 import pickle
 import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 
 from .. import storage
 
@@ -102,3 +104,114 @@ class GetTestCase(TestCase):
         result = storage.get("test", tempfile)
 
         self.assertIsNone(result)
+
+
+class ClientStorageTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.loc = os.path.join(self.tempdir.name, "storage.pickle")
+
+        load_patch = patch("pickle.load", side_effect=pickle.load)
+        self.load_mock = load_patch.start()
+        self.addCleanup(load_patch.stop)
+
+    def test_read_cache(self):
+        """Tests that the file isn't unpickled again while unchanged."""
+        client_storage = storage.ClientStorage(self.loc)
+        client_storage["test"] = "item"
+        self.load_mock.reset_mock()
+
+        for _ in range(5):
+            self.assertEqual(client_storage["test"], "item")
+            self.assertIn("test", client_storage)
+            self.assertEqual(len(client_storage), 1)
+
+        self.assertEqual(self.load_mock.call_count, 0)
+
+    def test_read_cache_invalidated(self):
+        """Tests that the file is read again after another writer changes it."""
+        client_storage = storage.ClientStorage(self.loc)
+        client_storage["test"] = "item"
+
+        other = storage.ClientStorage(self.loc)
+        other["test"] = "changed"
+        stat = os.stat(self.loc)
+        os.utime(self.loc, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+        self.load_mock.reset_mock()
+
+        self.assertEqual(client_storage["test"], "changed")
+        self.assertEqual(self.load_mock.call_count, 1)
+
+    def test_transaction(self):
+        """Tests that changes in a transaction are written at once."""
+        client_storage = storage.ClientStorage(self.loc)
+
+        with patch.object(
+            client_storage, "_write_loc", wraps=client_storage._write_loc
+        ) as write_mock:
+            with client_storage.transaction():
+                client_storage["a"] = 1
+                client_storage["b"] = 2
+                del client_storage["a"]
+
+                self.assertEqual(client_storage.get("b"), 2)
+                self.assertEqual(storage.get("b", self.loc), None)
+
+        self.assertEqual(write_mock.call_count, 1)
+        self.assertEqual(storage.get("b", self.loc), 2)
+        self.assertEqual(dict(client_storage), {"b": 2})
+
+    def test_transaction_error(self):
+        """Tests that changes are discarded if the transaction fails."""
+        client_storage = storage.ClientStorage(self.loc)
+        client_storage["a"] = 1
+
+        with self.assertRaises(RuntimeError):
+            with client_storage.transaction():
+                client_storage["a"] = 2
+                raise RuntimeError()
+
+        self.assertEqual(client_storage["a"], 1)
+        self.assertEqual(storage.get("a", self.loc), 1)
+
+    def test_write_failure(self):
+        """Tests that a failed write leaves the previous contents intact and
+        no temporary files behind.
+        """
+        client_storage = storage.ClientStorage(self.loc)
+        client_storage["a"] = 1
+
+        with patch("pickle.dump", side_effect=OSError("No space left on device")):
+            self.assertRaises(OSError, client_storage.__setitem__, "a", 2)
+
+        self.assertEqual(storage.get("a", self.loc), 1)
+        self.assertEqual(
+            sorted(os.listdir(self.tempdir.name)),
+            ["storage.pickle", "storage.pickle.lock"],
+        )
+
+    def test_concurrent_transactions(self):
+        """Tests that increments from several processes are all kept."""
+        storage.ClientStorage(self.loc)["count"] = 0
+
+        processes = [
+            multiprocessing.Process(target=increment, args=(self.loc, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual(storage.ClientStorage(self.loc)["count"], 200)
+
+
+def increment(loc: str, times: int):
+    client_storage = storage.ClientStorage(loc)
+
+    for _ in range(times):
+        with client_storage.transaction():
+            client_storage["count"] += 1
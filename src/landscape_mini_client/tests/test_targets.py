@@ -0,0 +1,75 @@
+from collections import Counter
+from itertools import islice
+from unittest import TestCase
+
+from ..util.targets import TargetTable, parse_insecure_ids, parse_servers
+
+
+class TargetTableTestCase(TestCase):
+    def test_url(self):
+        table = TargetTable(["a:8080", "b"], ["1", "22"])
+
+        self.assertEqual(table.url(0, 1), "http://a:8080/ping?insecure_id=22")
+
+    def test_request(self):
+        """Tests that encoded requests carry the ID and the Host header."""
+        table = TargetTable(["a:8080", "b"], ["1", "22"])
+
+        self.assertEqual(
+            table.request(1, 0),
+            b"GET /ping?insecure_id=1 HTTP/1.1\r\nHost: b\r\n\r\n",
+        )
+
+    def test_picker_seed(self):
+        """Tests that the same seed picks the same targets."""
+        table = TargetTable(["a", "b", "c"], [str(i) for i in range(100)])
+
+        first = list(islice(table.picker(seed=42, batch_size=7), 50))
+        second = list(islice(table.picker(seed=42, batch_size=7), 50))
+        other = list(islice(table.picker(seed=43, batch_size=7), 50))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_picker_weights(self):
+        """Tests that servers are picked in proportion to their weights."""
+        table = TargetTable(["a", "b"], ["1"], weights=[3, 1])
+
+        picked = Counter(s for s, _ in islice(table.picker(seed=1), 20000))
+
+        self.assertAlmostEqual(picked[0] / 20000, 0.75, delta=0.02)
+
+    def test_picker_zero_weight(self):
+        """Tests that a server with no weight is never picked."""
+        table = TargetTable(["a", "b"], ["1", "2"], weights=[0, 1])
+
+        picked = {s for s, _ in islice(table.picker(), 1000)}
+
+        self.assertEqual(picked, {1})
+
+    def test_empty(self):
+        self.assertRaises(ValueError, TargetTable, [], ["1"])
+
+
+class ParseTestCase(TestCase):
+    def test_parse_servers(self):
+        """Tests that weights default to 1 and comments are skipped."""
+        servers, weights = parse_servers(["# comment\n", "a:80 2\n", "\n", "b\n"])
+
+        self.assertEqual(servers, ["a:80", "b"])
+        self.assertEqual(weights, [2.0, 1.0])
+
+    def test_parse_servers_unweighted(self):
+        servers, weights = parse_servers(["a\n", "b\n"])
+
+        self.assertEqual(servers, ["a", "b"])
+        self.assertIsNone(weights)
+
+    def test_parse_servers_bad_weight(self):
+        """Tests that weights must be finite numbers above 0."""
+        for weight in ("heavy", "0", "-1", "nan", "inf"):
+            with self.subTest(weight=weight):
+                self.assertRaises(ValueError, parse_servers, [f"a {weight}\n"])
+
+    def test_parse_insecure_ids(self):
+        self.assertEqual(parse_insecure_ids(["1\n", "\n", " 2 \n"]), ["1", "2"])
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+from ..util import bpickle
+from ..util.templates import MessageTemplate, Slot, TemplateCache
+
+
+class MessageTemplateTestCase(TestCase):
+    message = {
+        "server-uuid": "c0ffee",
+        "sequence": Slot("sequence"),
+        "messages": [{"type": "ping", "timestamp": Slot("timestamp"), "id": 1}],
+    }
+
+    def test_render(self):
+        """Tests that rendering matches encoding the filled-in message."""
+        template = MessageTemplate(self.message)
+
+        self.assertEqual(template.slots, ["sequence", "timestamp"])
+        self.assertEqual(
+            template.render(sequence=7, timestamp=[1, "é"]),
+            bpickle.dumps(
+                {
+                    "server-uuid": "c0ffee",
+                    "sequence": 7,
+                    "messages": [{"type": "ping", "timestamp": [1, "é"], "id": 1}],
+                }
+            ),
+        )
+
+    def test_render_missing_value(self):
+        template = MessageTemplate(self.message)
+
+        self.assertRaises(ValueError, template.render, sequence=7)
+
+    def test_slot_as_key_value(self):
+        """Tests that a slot can appear anywhere a string can."""
+        template = MessageTemplate([Slot("a"), {"b": Slot("a")}])
+
+        self.assertEqual(template.render(a="x"), bpickle.dumps(["x", {"b": "x"}]))
+
+    def test_no_slots(self):
+        template = MessageTemplate({"a": 1})
+
+        self.assertEqual(template.render(), bpickle.dumps({"a": 1}))
+
+
+class TemplateCacheTestCase(TestCase):
+    def test_get(self):
+        """Tests that a template is built only once per shape."""
+        cache = TemplateCache()
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {"n": Slot("n")}
+
+        self.assertEqual(cache.render("shape", build, n=1), bpickle.dumps({"n": 1}))
+        self.assertEqual(cache.render("shape", build, n=2), bpickle.dumps({"n": 2}))
+        self.assertEqual((len(builds), cache.hits, cache.misses), (1, 1, 1))
+
+    def test_eviction(self):
+        """Tests that the least recently used template is evicted."""
+        cache = TemplateCache(maxsize=2)
+        cache.get("a", lambda: "a")
+        cache.get("b", lambda: "b")
+        cache.get("a", lambda: "a")
+        cache.get("c", lambda: "c")
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("a", lambda: "new a").render(), b"u1:a")
+        self.assertEqual(cache.get("b", lambda: "new b").render(), b"u5:new b")
@@ -0,0 +1,146 @@
+import json
+import os
+import socket
+import tempfile
+from http.server import ThreadingHTTPServer
+from logging import INFO
+from threading import Thread
+from unittest import TestCase
+
+from requests.adapters import HTTPAdapter
+
+from ..messages import MessageClient, MessageException
+from ..timing import (
+    PHASES,
+    JSONLinesTrace,
+    RequestTiming,
+    TimingAdapter,
+    log_timing,
+)
+from .test_messages import KeepAliveHTTPRequestHandler
+
+
+class TimingTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+
+        KeepAliveHTTPRequestHandler.statuses = []
+        KeepAliveHTTPRequestHandler.client_ports = []
+        KeepAliveHTTPRequestHandler.bodies = []
+        KeepAliveHTTPRequestHandler.payload = "test"
+
+        self.server = ThreadingHTTPServer(("localhost", 0), KeepAliveHTTPRequestHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://localhost:{self.server.server_port}/message-system"
+
+        self.timings = []
+
+    def test_phases(self):
+        """Tests that each phase of a request on a new connection is timed,
+        and only the connection phases are left out once it is reused.
+        """
+        with MessageClient(timing_hooks=[self.timings.append]) as client:
+            for _ in range(2):
+                client.send_message(self.url, {"messages": []}, verify=False)
+
+        first, second = self.timings
+
+        self.assertEqual(first.status, 200)
+        self.assertIsNone(first.error)
+        self.assertEqual(first.new_connections, 1)
+        self.assertFalse(first.reused)
+        for phase in ("encode", "dns", "connect", "upload", "ttfb", "decode"):
+            with self.subTest(phase=phase):
+                self.assertGreater(getattr(first, phase), 0)
+        # Plain HTTP has no handshake.
+        self.assertEqual(first.tls, 0)
+        self.assertLessEqual(
+            sum(getattr(first, phase) for phase in PHASES), first.total
+        )
+
+        self.assertTrue(second.reused)
+        self.assertEqual(second.established, 0)
+        self.assertGreater(second.ttfb, 0)
+
+    def test_streamed(self):
+        """Tests that a streamed response is timed as it is downloaded."""
+        KeepAliveHTTPRequestHandler.payload = {"messages": [{"type": "ping"}] * 10}
+
+        with MessageClient(timing_hooks=[self.timings.append]) as client:
+            client.send_message(
+                self.url, {"messages": []}, on_message=lambda _: None, verify=False
+            )
+
+        (timing,) = self.timings
+
+        self.assertEqual(timing.status, 200)
+        self.assertGreater(timing.download, 0)
+        self.assertEqual(timing.decode, 0)
+
+    def test_failure(self):
+        """Tests that hooks are called for failed requests too, with the
+        error they failed with.
+        """
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+
+        with MessageClient(timing_hooks=[self.timings.append]) as client:
+            with self.assertRaises(MessageException):
+                with self.assertLogs(level="ERROR"):
+                    client.get(f"http://localhost:{port}/ping")
+
+        (timing,) = self.timings
+
+        self.assertIsNone(timing.status)
+        self.assertEqual(timing.error, "MessageException")
+        self.assertGreater(timing.connect, 0)
+        self.assertGreater(timing.total, 0)
+
+    def test_no_hooks(self):
+        """Tests that requests are not timed without any hooks."""
+        with MessageClient() as client:
+            client.send_message(self.url, {"messages": []}, verify=False)
+
+            adapter = client.session.get_adapter(self.url)
+
+        self.assertIs(type(adapter), HTTPAdapter)
+
+        with MessageClient(timing_hooks=[self.timings.append]) as client:
+            adapter = client.session.get_adapter(self.url)
+
+        self.assertIsInstance(adapter, TimingAdapter)
+
+    def test_json_lines_trace(self):
+        """Tests that each timing is appended to the trace as a line of
+        JSON.
+        """
+        path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+        trace = JSONLinesTrace(path)
+        self.addCleanup(trace.close)
+
+        with MessageClient(timing_hooks=[trace]) as client:
+            for _ in range(2):
+                client.send_message(self.url, {"messages": []}, verify=False)
+
+        with open(path) as fp:
+            lines = [json.loads(line) for line in fp]
+
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["url"], self.url)
+        self.assertEqual(lines[0]["status"], 200)
+        self.assertEqual([line["reused"] for line in lines], [False, True])
+        self.assertEqual(set(lines[0]["phases_ms"]), set(PHASES))
+
+    def test_log_timing(self):
+        timing = RequestTiming("POST", self.url)
+        timing.add("ttfb", 0.0125)
+        timing.status = 200
+        timing.finish()
+
+        with self.assertLogs(level=INFO) as logs:
+            log_timing(timing)
+
+        self.assertIn(f"POST {self.url} 200", logs.output[0])
+        self.assertIn("ttfb 12.5", logs.output[0])
@@ -0,0 +1,263 @@
+"""Per-phase timing of the requests a `messages.MessageClient` makes.
+
+Each request's time is broken down into the phases in `PHASES`: encoding
+the message, resolving the server's name, connecting, the TLS handshake,
+sending the request, waiting for the response to start (time to first
+byte), receiving its body and decoding it. Connection phases are only
+timed for requests that open a new connection, rather than reusing one.
+
+The connection phases are timed by the urllib3 connection classes that
+`TimingAdapter` installs, which add to the `RequestTiming` of the request
+being made in the current context.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Iterator, List, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+
+PHASES = ("encode", "dns", "connect", "tls", "upload", "ttfb", "download", "decode")
+
+TRACE_HELP = (
+    "File to append the time each phase of every request took to, as JSON "
+    "lines. Each request's timing is also logged"
+)
+
+
+class RequestTiming:
+    """The time, in seconds, each phase of a request took.
+
+    `error` is the name of the exception the request failed with, if any.
+    """
+
+    __slots__ = (
+        "method",
+        "url",
+        "start",
+        "status",
+        "error",
+        "new_connections",
+        "sent_bytes",
+        "received_bytes",
+        "total",
+        "_started",
+    ) + PHASES
+
+    def __init__(self, method: str, url: str):
+        self.method = method
+        self.url = url
+        self.start = time.time()
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.new_connections = 0
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.total = 0.0
+        self._started = time.perf_counter()
+
+        for phase in PHASES:
+            setattr(self, phase, 0.0)
+
+    def add(self, phase: str, seconds: float):
+        setattr(self, phase, getattr(self, phase) + seconds)
+
+    def finish(self):
+        self.total = time.perf_counter() - self._started
+
+    @property
+    def reused(self) -> bool:
+        """Whether the request was sent over an already open connection."""
+        return not self.new_connections
+
+    @property
+    def established(self) -> float:
+        """Time spent opening connections."""
+        return self.dns + self.connect + self.tls
+
+    def as_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "method": self.method,
+            "url": self.url,
+            "status": self.status,
+            "error": self.error,
+            "reused": self.reused,
+            "sent_bytes": self.sent_bytes,
+            "received_bytes": self.received_bytes,
+            "total_ms": self.total * 1000,
+            "phases_ms": {phase: getattr(self, phase) * 1000 for phase in PHASES},
+        }
+
+    def describe(self) -> str:
+        outcome = self.error or self.status
+        phases = ", ".join(
+            f"{phase} {getattr(self, phase) * 1000:.1f}"
+            for phase in PHASES
+            if getattr(self, phase)
+        )
+
+        return (
+            f"{self.method} {self.url} {outcome} in {self.total * 1000:.1f} ms "
+            f"({phases})"
+        )
+
+
+TimingHook = Callable[[RequestTiming], None]
+
+_current: "contextvars.ContextVar[Optional[RequestTiming]]" = contextvars.ContextVar(
+    "request_timing", default=None
+)
+
+
+@contextlib.contextmanager
+def timing_request(timing: RequestTiming) -> Iterator[RequestTiming]:
+    """Makes `timing` the one that requests made within it add to."""
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+class _TimedConnection:
+    """Times the phases of a urllib3 connection's requests into the
+    current `RequestTiming`, if there is one.
+    """
+
+    def _new_conn(self):
+        timing = _current.get()
+        if timing is None:
+            return super()._new_conn()
+
+        timing.new_connections += 1
+        host = self._dns_host
+
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(
+                host, self.port, allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except OSError:
+            # Connecting fails the same way, raising urllib3's exception.
+            addresses = [(None, None, None, None, (host,))]
+        resolved = time.perf_counter()
+        timing.add("dns", resolved - start)
+
+        # Connect to each resolved address in turn, as urllib3 would,
+        # rather than resolving the name again.
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address[4][0]
+                try:
+                    return super()._new_conn()
+                except NewConnectionError:
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+            timing.add("connect", time.perf_counter() - resolved)
+
+    def request(self, *args, **kwargs):
+        timing = _current.get()
+        if timing is None:
+            return super().request(*args, **kwargs)
+
+        # Plain HTTP connections connect while sending their first request.
+        established = timing.established
+        start = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timing.add("upload", elapsed - (timing.established - established))
+
+    def getresponse(self, *args, **kwargs):
+        timing = _current.get()
+        if timing is None:
+            return super().getresponse(*args, **kwargs)
+
+        start = time.perf_counter()
+        response = super().getresponse(*args, **kwargs)
+        timing.add("ttfb", time.perf_counter() - start)
+
+        return response
+
+
+class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    def connect(self):
+        timing = _current.get()
+        if timing is None:
+            return super().connect()
+
+        connecting = timing.dns + timing.connect
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            elapsed = time.perf_counter() - start
+            timing.add("tls", elapsed - (timing.dns + timing.connect - connecting))
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimingAdapter(HTTPAdapter):
+    """An `HTTPAdapter` whose connections time their phases."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def log_timing(timing: RequestTiming):
+    """Logs `timing` as a single line."""
+    logging.info(timing.describe())
+
+
+class JSONLinesTrace:
+    """Appends each timing it is called with to the file at `path`, as a
+    line of JSON.
+    """
+
+    def __init__(self, path: str):
+        self._fp = open(path, "a")
+        self._lock = threading.Lock()
+
+    def __call__(self, timing: RequestTiming):
+        line = json.dumps(timing.as_dict())
+
+        with self._lock:
+            self._fp.write(line + "\n")
+            self._fp.flush()
+
+    def close(self):
+        self._fp.close()
+
+
+def trace_hooks(path: str) -> List[TimingHook]:
+    """Returns the hooks that log each timing and append it to `path`."""
+    return [log_timing, JSONLinesTrace(path)]
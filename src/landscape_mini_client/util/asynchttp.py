@@ -0,0 +1,242 @@
+"""Minimal asyncio HTTP/1.1 client with keep-alive connection pooling.
+
+Only what the mini client needs is implemented: a request line, a few
+headers, an optional body, and a response read back via Content-Length,
+chunked transfer-encoding or connection close.
+"""
+
+import asyncio
+import ssl
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class HTTPResponse(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class HTTPProtocolError(Exception):
+    """Raised when the server sends something we can't parse."""
+
+    pass
+
+
+# What sending a request may raise: connection failures, including the
+# server closing the connection mid-response, timeouts and malformed
+# responses.
+REQUEST_ERRORS = (
+    OSError,
+    EOFError,
+    ValueError,
+    asyncio.TimeoutError,
+    asyncio.LimitOverrunError,
+    HTTPProtocolError,
+)
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[HTTPResponse, bool]:
+    """Reads one response from `reader`.
+
+    Returns the response and whether the connection may be reused.
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+
+    try:
+        version, status, _ = (status_line + " ").split(" ", 2)
+        status = int(status)
+    except ValueError:
+        raise HTTPProtocolError(f"Bad status line: {status_line!r}")
+
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == "HTTP/1.1"
+    connection = headers.get("connection", "").lower()
+    if connection == "close":
+        keep_alive = False
+    elif connection == "keep-alive":
+        keep_alive = True
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            size = int(size_line.split(b";", 1)[0], 16)
+            if size == 0:
+                # Skip any trailers.
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif status in (204, 304) or 100 <= status < 200:
+        body = b""
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    return HTTPResponse(status, headers, body), keep_alive
+
+
+class ConnectionPool:
+    """Keep-alive connections to a single host, with at most `limit`
+    requests in flight at once.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        limit: int = 100,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+
+        self._semaphore = asyncio.Semaphore(limit)
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+        default_port = DEFAULT_PORTS["https" if ssl_context else "http"]
+        self.host_header = host if port == default_port else f"{host}:{port}"
+
+    async def _connect(self):
+        return await asyncio.open_connection(
+            self.host,
+            self.port,
+            ssl=self.ssl_context,
+        )
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b"",
+    ) -> HTTPResponse:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host_header}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body or method in ("POST", "PUT"):
+            lines.append(f"Content-Length: {len(body)}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        return await self.send(request)
+
+    async def send(self, request: bytes) -> HTTPResponse:
+        """Sends a complete, pre-encoded HTTP/1.1 `request` and reads back
+        the response.
+        """
+        async with self._semaphore:
+            return await self._send(request)
+
+    async def _send(self, request: bytes) -> HTTPResponse:
+        reused = bool(self._idle)
+
+        while True:
+            reader, writer = self._idle.pop() if self._idle else await self._connect()
+
+            try:
+                writer.write(request)
+                await writer.drain()
+                response, keep_alive = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The server may have closed an idle keep-alive
+                    # connection; retry once on a fresh one.
+                    reused = False
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+
+            return response
+
+    def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class AsyncHTTPClient:
+    """Dispatches requests to per-host `ConnectionPool`s."""
+
+    def __init__(self, limit_per_host: int = 100, verify: bool = True):
+        self.limit_per_host = limit_per_host
+        self.verify = verify
+
+        self._pools: Dict[Tuple[str, str, int], ConnectionPool] = {}
+        self._ssl_context = None
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            context = ssl.create_default_context()
+            if not self.verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            self._ssl_context = context
+
+        return self._ssl_context
+
+    def pool(self, scheme: str, host: str, port: Optional[int] = None):
+        """Returns the connection pool for `scheme://host:port`."""
+        port = port or DEFAULT_PORTS[scheme]
+        key = (scheme, host, port)
+
+        if key not in self._pools:
+            self._pools[key] = ConnectionPool(
+                host,
+                port,
+                limit=self.limit_per_host,
+                ssl_context=self._get_ssl_context() if scheme == "https" else None,
+            )
+
+        return self._pools[key]
+
+    def pool_for_url(self, url: str) -> Tuple[ConnectionPool, str]:
+        """Returns the connection pool and request path for `url`."""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        return self.pool(parts.scheme, parts.hostname, parts.port), path
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        body: bytes = b"",
+        timeout: Optional[float] = None,
+    ) -> HTTPResponse:
+        pool, path = self.pool_for_url(url)
+
+        return await asyncio.wait_for(
+            pool.request(method, path, headers=headers, body=body),
+            timeout,
+        )
+
+    async def close(self):
+        for pool in self._pools.values():
+            pool.close()
+
+        self._pools.clear()
@@ -1,105 +1,448 @@
-"""Simple pickler based on landscape.lib.bpickle."""
+"""Simple pickler based on landscape.lib.bpickle.
 
-from typing import List, Mapping, Tuple, Union
+Encoding dispatches on the exact type of each value through a table of
+encoders, which all append to a single output buffer. Decoding dispatches
+on the raw typecode byte and walks the payload by offset, so no part of it
+is copied more than once. Neither recurses into containers: each keeps its
+own stack of open containers, so nesting depth is limited only by memory.
 
+`iterdumps` and `StreamDecoder` do the same a piece at a time, for bodies
+too large to hold or wait for in one go.
+"""
 
-def dumps(payload: Union[dict, list, str, int]) -> bytes:
-    if isinstance(payload, dict):
-        return _dumps_dict(payload)
+import itertools
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-    if isinstance(payload, list):
-        return _dumps_list(payload)
 
-    if isinstance(payload, str):
-        return f"u{len(payload)}:{payload}".encode()
+DICT = b"d"
+LIST = b"l"
+TUPLE = b"t"
+END = b";"
 
-    if isinstance(payload, bytes):
-        return f"b{len(payload)}:".encode() + payload
+_DICT_CODE = ord("d")
+_LIST_CODE = ord("l")
+_TUPLE_CODE = ord("t")
+_END_CODE = ord(";")
+_UNICODE_CODE = ord("u")
+_INT_CODE = ord("i")
+_CONTAINER_CODES = frozenset((_DICT_CODE, _LIST_CODE, _TUPLE_CODE))
 
-    if isinstance(payload, int):
-        return f"i{payload};".encode()
 
+def dumps(payload: Any) -> bytes:
+    out = bytearray()
+    _dump(payload, out)
 
-def _dumps_dict(payload: Mapping[str, Union[dict, list, str, int]]) -> bytes:
-    pickled = [b"d"]
+    return bytes(out)
 
-    for k, v in payload.items():
-        pickled.append(f"u{len(k)}:{k}".encode())
-        pickled.append(dumps(v))
 
-    pickled.append(b";")
-    pickled = b"".join(pickled)
+def _dump(payload: Any, out: bytearray) -> None:
+    encoders = _ENCODERS
+    # Iterators over the values of each container still being encoded.
+    stack = [iter((payload,))]
 
-    return pickled
+    while stack:
+        for value in stack[-1]:
+            cls = type(value)
 
+            # Strings and ints make up most of any message, so skip the
+            # dispatch for them.
+            if cls is str:
+                encoded = value.encode()
+                out += b"u%d:%b" % (len(encoded), encoded)
+                continue
+            if cls is int:
+                out += b"i%d;" % value
+                continue
 
-def _dumps_list(payload: List[Union[dict, list, str, int]]) -> bytes:
-    pickled = [b"l"]
+            try:
+                encoder = encoders[cls]
+            except KeyError:
+                encoder = _find_encoder(cls)
 
-    for v in payload:
-        pickled.append(dumps(v))
+            values = encoder(value, out)
+            if values is not None:
+                # Carry on with this container's parent once it's done.
+                stack.append(values)
+                break
+        else:
+            stack.pop()
+            if stack:
+                out += END
 
-    pickled.append(b";")
-    pickled = b"".join(pickled)
 
-    return pickled
+# Scalar encoders return None; container encoders return an iterator over
+# the values to encode after them.
 
 
-def loads(payload: bytes) -> Tuple[Union[dict, list, str, int], int]:
-    typecode = chr(payload[0])
+def _dump_dict(payload: dict, out: bytearray) -> Iterator[Any]:
+    out += DICT
 
-    if typecode == "d":
-        return loads_dict(payload)
+    return itertools.chain.from_iterable(payload.items())
 
-    if typecode == "l":
-        return loads_list(payload)
 
-    if typecode == "u":
-        length, rest = payload[1:].split(b":", maxsplit=1)
-        length = int(length)
-        string = rest[:length].decode()
-        return string, length + len(f"u{length}:")
+def _dump_list(payload: list, out: bytearray) -> Iterator[Any]:
+    out += LIST
 
-    if typecode == "s":
-        length, rest = payload[1:].split(b":", maxsplit=1)
-        length = int(length)
-        bytestring = rest[:length]
-        return bytestring, length + len(f"s{length}:")
+    return iter(payload)
 
-    if typecode == "b":
-        length = payload.find(b";", 1)
-        number = int(payload[1:length])
-        return bool(number), len(f"b{number}")
 
-    if typecode == "i":
-        length = payload.find(b";", 1)
-        number = int(payload[1:length])
-        return number, len(f"i{number};")
+def _dump_tuple(payload: tuple, out: bytearray) -> Iterator[Any]:
+    out += TUPLE
 
+    return iter(payload)
 
-def loads_dict(payload: bytes) -> Tuple[dict, int]:
-    index = 1
-    result = {}
 
-    while chr(payload[index]) != ";":
-        key, inc = loads(payload[index:])
-        index += inc
-        value, inc = loads(payload[index:])
-        index += inc
+def _dump_str(payload: str, out: bytearray) -> None:
+    encoded = payload.encode()
+    out += b"u%d:%b" % (len(encoded), encoded)
+
+
+def _dump_bytes(payload: bytes, out: bytearray) -> None:
+    out += b"s%d:%b" % (len(payload), payload)
+
+
+def _dump_int(payload: int, out: bytearray) -> None:
+    out += b"i%d;" % payload
+
+
+def _dump_bool(payload: bool, out: bytearray) -> None:
+    out += b"b1" if payload else b"b0"
+
+
+def _dump_float(payload: float, out: bytearray) -> None:
+    out += b"f%r;" % payload
+
+
+def _dump_none(payload: None, out: bytearray) -> None:
+    out += b"n"
+
+
+_ENCODERS: Dict[type, Callable[[Any, bytearray], Optional[Iterator[Any]]]] = {
+    dict: _dump_dict,
+    list: _dump_list,
+    tuple: _dump_tuple,
+    str: _dump_str,
+    bytes: _dump_bytes,
+    int: _dump_int,
+    bool: _dump_bool,
+    float: _dump_float,
+    type(None): _dump_none,
+}
+
+
+def _find_encoder(cls: type) -> Callable[[Any, bytearray], Optional[Iterator[Any]]]:
+    """Finds, and caches, the encoder for a subclass of a supported type."""
+    for base in (dict, list, tuple, str, bytes, int, float):
+        if issubclass(cls, base):
+            _ENCODERS[cls] = _ENCODERS[base]
+            return _ENCODERS[base]
+
+    raise ValueError(f"Can't bpickle objects of type {cls.__name__}")
+
+
+def iterdumps(payload: Any, chunk_size: int = 65536) -> Iterator[bytes]:
+    """Yields the encoding of `payload` in chunks of about `chunk_size`
+    bytes.
+
+    Only the top two levels of `payload`, such as an exchange and its
+    messages list, are split between chunks, so each message is encoded
+    whole.
+    """
+    out = bytearray()
+
+    yield from _iterdump(payload, out, chunk_size, 2)
+
+    if out:
+        yield bytes(out)
+
 
-        result[key] = value
+def _iterdump(
+    payload: Any, out: bytearray, chunk_size: int, depth: int
+) -> Iterator[bytes]:
+    if not depth or not isinstance(payload, (dict, list, tuple)):
+        _dump(payload, out)
+    else:
+        if isinstance(payload, dict):
+            out += DICT
+            values = itertools.chain.from_iterable(payload.items())
+        else:
+            out += LIST if isinstance(payload, list) else TUPLE
+            values = payload
 
-    return result, index + 1
+        for value in values:
+            yield from _iterdump(value, out, chunk_size, depth - 1)
+
+            if len(out) >= chunk_size:
+                yield bytes(out)
+                out.clear()
+
+        out += END
+
+
+def dump(payload: Any, fp: IO[bytes], chunk_size: int = 65536) -> None:
+    """Encodes `payload` into the file-like `fp` a chunk at a time."""
+    for chunk in iterdumps(payload, chunk_size):
+        fp.write(chunk)
+
+
+def loads(payload: bytes) -> Tuple[Any, int]:
+    """Decodes the value at the start of `payload`.
+
+    Returns the value and the number of bytes it was encoded in.
+    """
+    return _load(*_buffers(payload), 0)
+
+
+def loads_dict(payload: bytes) -> Tuple[dict, int]:
+    return _load_container(payload, _DICT_CODE)
 
 
 def loads_list(payload: bytes) -> Tuple[list, int]:
-    index = 1
-    result = []
+    return _load_container(payload, _LIST_CODE)
+
+
+def _load_container(payload: bytes, code: int) -> Tuple[Any, int]:
+    data, view = _buffers(payload)
+    if data[0] != code:
+        raise ValueError(f"Expected bpickle typecode {chr(code)!r}")
+
+    return _load(data, view, 0)
+
+
+def _buffers(payload: bytes) -> Tuple[bytes, memoryview]:
+    """Returns `payload` as bytes, for searching, and a memoryview over it,
+    for slicing without copying.
+    """
+    if not isinstance(payload, bytes):
+        payload = bytes(payload)
+
+    return payload, memoryview(payload)
+
+
+def _load(data: bytes, view: memoryview, pos: int) -> Tuple[Any, int]:
+    index = data.index
+    # The typecode and values decoded so far of each open container, and
+    # the values of the innermost one.
+    stack: List[Tuple[int, list]] = []
+    values: Optional[list] = None
+
+    while True:
+        code = data[pos]
+
+        # As in `_dump`, strings and ints skip the dispatch.
+        if code == _UNICODE_CODE:
+            colon = index(b":", pos + 1)
+            end = colon + 1 + int(data[pos + 1 : colon])
+            value = str(view[colon + 1 : end], "utf-8")
+            pos = end
+        elif code == _INT_CODE:
+            end = index(b";", pos + 1)
+            value = int(data[pos + 1 : end])
+            pos = end + 1
+        elif code in _CONTAINER_CODES:
+            values = []
+            stack.append((code, values))
+            pos += 1
+            continue
+        elif code == _END_CODE:
+            if not stack:
+                raise ValueError(f"Unexpected bpickle container end at {pos}")
+
+            value = _build(*stack.pop())
+            values = stack[-1][1] if stack else None
+            pos += 1
+        else:
+            try:
+                decoder = _DECODERS[code]
+            except KeyError:
+                raise ValueError(
+                    f"Unknown bpickle typecode {data[pos:pos + 1]!r} at {pos}"
+                )
+
+            value, pos = decoder(data, view, pos)
+
+        if values is None:
+            return value, pos
+
+        values.append(value)
+
+
+def _build(code: int, values: list) -> Union[dict, list, tuple]:
+    """Builds a decoded container from its typecode and values."""
+    if code == _LIST_CODE:
+        return values
+    if code == _TUPLE_CODE:
+        return tuple(values)
+    if len(values) % 2:
+        raise ValueError("Missing bpickle dict value")
+
+    items = iter(values)
+
+    return dict(zip(items, items))
+
+
+# The scalar decoders below all take the payload as bytes and as a
+# memoryview, plus the offset of the value to decode, and return the
+# decoded value and the offset just past it.
+
+
+def _load_unicode(data: bytes, view: memoryview, pos: int) -> Tuple[str, int]:
+    colon = data.index(b":", pos + 1)
+    end = colon + 1 + int(data[pos + 1 : colon])
+
+    return str(view[colon + 1 : end], "utf-8"), end
+
+
+def _load_bytes(data: bytes, view: memoryview, pos: int) -> Tuple[bytes, int]:
+    colon = data.index(b":", pos + 1)
+    end = colon + 1 + int(data[pos + 1 : colon])
+
+    return bytes(view[colon + 1 : end]), end
+
+
+def _load_bool(data: bytes, view: memoryview, pos: int) -> Tuple[bool, int]:
+    return data[pos + 1] != ord("0"), pos + 2
+
+
+def _load_int(data: bytes, view: memoryview, pos: int) -> Tuple[int, int]:
+    end = data.index(b";", pos + 1)
+
+    return int(data[pos + 1 : end]), end + 1
+
+
+def _load_float(data: bytes, view: memoryview, pos: int) -> Tuple[float, int]:
+    end = data.index(b";", pos + 1)
+
+    return float(data[pos + 1 : end]), end + 1
+
+
+def _load_none(data: bytes, view: memoryview, pos: int) -> Tuple[None, int]:
+    return None, pos + 1
+
+
+_DECODERS: Dict[int, Callable[[bytes, memoryview, int], Tuple[Any, int]]] = {
+    ord("u"): _load_unicode,
+    ord("s"): _load_bytes,
+    ord("b"): _load_bool,
+    ord("i"): _load_int,
+    ord("f"): _load_float,
+    ord("n"): _load_none,
+}
+
+# Encoded length of scalars whose typecode alone determines it, for
+# StreamDecoder.
+_FIXED_LENGTHS = {ord("b"): 2, ord("n"): 1}
+_TERMINATED_CODES = frozenset((ord("i"), ord("f")))
+_PREFIXED_CODES = frozenset((ord("u"), ord("s")))
+
+
+class StreamDecoder:
+    """Incremental decoder for a payload that arrives in chunks.
+
+    Chunks are passed to `feed` as they arrive, which returns each item of
+    the top-level "messages" list completed by them, and `result` returns
+    the whole payload once it is complete. With `keep_messages` off, items
+    returned by `feed` are left out of the result, so that a large batch
+    of messages never has to be held at once.
+    """
+
+    def __init__(self, keep_messages: bool = True):
+        self.keep_messages = keep_messages
+        self.done = False
+
+        self._buffer = bytearray()
+        # Buffer length needed before the next value can be decoded.
+        self._needed = 0
+        # The typecode and values decoded so far of each open container,
+        # outermost first, as in `_load`.
+        self._stack: List[Tuple[int, list]] = []
+        self._result: Any = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self._buffer += chunk
+
+        if self.done or len(self._buffer) < self._needed:
+            return []
+
+        data, view = _buffers(self._buffer)
+        messages: List[Any] = []
+        pos = 0
+
+        while not self.done and pos < len(data):
+            code = data[pos]
+
+            if code in _CONTAINER_CODES:
+                self._stack.append((code, []))
+                pos += 1
+            elif code == _END_CODE:
+                if not self._stack:
+                    raise ValueError("Unexpected bpickle container end")
+
+                self._add(_build(*self._stack.pop()), messages)
+                pos += 1
+            else:
+                if not self._complete(data, pos):
+                    break
+
+                value, pos = _DECODERS[code](data, view, pos)
+                self._add(value, messages)
+
+        del self._buffer[:pos]
+        self._needed = max(self._needed - pos, 0)
+
+        return messages
 
-    while chr(payload[index]) != ";":
-        value, inc = loads(payload[index:])
-        index += inc
+    def result(self) -> Any:
+        """Returns the decoded payload, or raises ValueError if it hasn't
+        been fed in full.
+        """
+        if not self.done:
+            raise ValueError("Incomplete bpickle payload")
 
-        result.append(value)
+        return self._result
 
-    return result, index + 1
+    def _complete(self, data: bytes, pos: int) -> bool:
+        """Returns whether the scalar at `pos` has fully arrived."""
+        code = data[pos]
+
+        if code in _PREFIXED_CODES:
+            colon = data.find(b":", pos + 1)
+            if colon < 0:
+                return False
+            end = colon + 1 + int(data[pos + 1 : colon])
+        elif code in _TERMINATED_CODES:
+            return data.find(b";", pos + 1) >= 0
+        elif code in _FIXED_LENGTHS:
+            end = pos + _FIXED_LENGTHS[code]
+        else:
+            raise ValueError(f"Unknown bpickle typecode {data[pos:pos + 1]!r}")
+
+        if end > len(data):
+            self._needed = end
+            return False
+
+        return True
+
+    def _add(self, value: Any, messages: List[Any]):
+        stack = self._stack
+
+        if not stack:
+            self._result = value
+            self.done = True
+            return
+
+        code, values = stack[-1]
+
+        # Items of a list that is the value of the top-level "messages" key.
+        if (
+            len(stack) == 2
+            and code == _LIST_CODE
+            and stack[0][0] == _DICT_CODE
+            and stack[0][1][-1:] == ["messages"]
+            and len(stack[0][1]) % 2
+        ):
+            messages.append(value)
+            if not self.keep_messages:
+                return
+
+        values.append(value)
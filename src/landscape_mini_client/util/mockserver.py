@@ -0,0 +1,397 @@
+"""Minimal asyncio stand-in for a Landscape Server, for benchmarking and
+testing the client without one.
+
+Only what the mini client exercises is implemented: registration and
+message exchanges on "/message-system", in bpickle, and pings on
+"/ping?insecure_id=". Clients are issued secure and insecure IDs on
+registering, and their exchange sequences are tracked as a server would.
+`Faults` adds latency, errors and padding to the responses.
+"""
+
+import asyncio
+import contextlib
+import random
+import threading
+from http import HTTPStatus
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from . import bpickle
+
+
+COMPUTER_ID_HEADER = "x-computer-id"
+SERVER_API = b"3.3"
+
+# Requests are rejected rather than read past this size.
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class Faults(NamedTuple):
+    """Misbehaviour to inject into every response.
+
+    Each response is delayed by `latency` seconds, give or take up to
+    `jitter`, and a `error_rate` fraction of requests are answered with
+    `error_status`, a 4xx or 5xx status, and an HTML error page, as a proxy
+    in front of a server would, instead of being handled. Exchange
+    responses carry an extra message holding `payload_size` bytes of data.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = HTTPStatus.SERVICE_UNAVAILABLE
+    payload_size: int = 0
+
+
+class MockClient:
+    """What the server knows of a registered client."""
+
+    __slots__ = ("secure_id", "insecure_id", "title", "next_seq", "pending")
+
+    def __init__(self, secure_id: str, insecure_id: int, title: str = ""):
+        self.secure_id = secure_id
+        self.insecure_id = insecure_id
+        self.title = title
+        self.next_seq = 0
+        # Messages to deliver to the client in its next exchange.
+        self.pending: List[dict] = []
+
+
+class ServerStats:
+    """Counts of the requests a `MockServer` handled."""
+
+    __slots__ = (
+        "requests",
+        "registrations",
+        "exchanges",
+        "pings",
+        "messages",
+        "errors",
+    )
+
+    def __init__(self):
+        self.requests = 0
+        self.registrations = 0
+        self.exchanges = 0
+        self.pings = 0
+        self.messages = 0
+        self.errors = 0
+
+    def describe(self) -> str:
+        return (
+            f"{self.requests} requests: {self.registrations} registrations, "
+            f"{self.exchanges} exchanges of {self.messages} messages, "
+            f"{self.pings} pings, {self.errors} injected errors."
+        )
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class MockServer:
+    """A Landscape Server stand-in, serving each connection as keep-alive
+    HTTP/1.1 on the event loop it is started from.
+
+    The same server, and so the same clients, can listen on several ports,
+    such as one for message exchanges and another for pings. `seed` makes
+    the IDs it issues, and which requests fail, reproducible.
+    """
+
+    def __init__(
+        self,
+        faults: Faults = Faults(),
+        server_uuid: str = "mock-server-uuid",
+        seed: Optional[int] = None,
+    ):
+        self.faults = faults
+        self.server_uuid = server_uuid.encode()
+        self.clients: Dict[str, MockClient] = {}
+        self.clients_by_insecure_id: Dict[int, MockClient] = {}
+        self.stats = ServerStats()
+        self.rng = random.Random(seed)
+        self._servers: List[asyncio.AbstractServer] = []
+        # The writer of each connection being served, by its task.
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def listen(self, host: str = "localhost", port: int = 0) -> int:
+        """Starts accepting connections on `host` and `port`, and returns the
+        port, which is picked by the system if `port` is 0.
+        """
+        server = await asyncio.start_server(self._serve, host, port)
+        self._servers.append(server)
+
+        return server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stops listening, and closes every open connection."""
+        for server in self._servers:
+            server.close()
+
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+        for server in self._servers:
+            await server.wait_closed()
+
+        self._servers = []
+
+    def register(self, title: str = "") -> MockClient:
+        insecure_id = len(self.clients) + 1
+        client = MockClient(f"{self.rng.getrandbits(128):032x}", insecure_id, title)
+        self.clients[client.secure_id] = client
+        self.clients_by_insecure_id[insecure_id] = client
+
+        return client
+
+    def queue(self, client: MockClient, messages: List[dict]):
+        """Queues `messages` for `client`, so that its pings say there are
+        messages waiting for it.
+        """
+        client.pending.extend(messages)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    method, target, headers, body, keep_alive = await _read_request(
+                        reader
+                    )
+                except asyncio.IncompleteReadError:
+                    return
+                except (_BadRequest, asyncio.LimitOverrunError, ValueError):
+                    status, payload, keep_alive = HTTPStatus.BAD_REQUEST, b"", False
+                else:
+                    status, payload = await self.respond(method, target, headers, body)
+
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def respond(
+        self, method: str, target: str, headers: Dict[str, str], body: bytes
+    ) -> Tuple[int, bytes]:
+        """Returns the status and body of the response to a request, after
+        the configured latency.
+        """
+        faults = self.faults
+        self.stats.requests += 1
+
+        delay = faults.latency
+        if faults.jitter:
+            delay += self.rng.uniform(-faults.jitter, faults.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if faults.error_rate and self.rng.random() < faults.error_rate:
+            self.stats.errors += 1
+            return faults.error_status, _error_page(faults.error_status)
+
+        url = urlsplit(target)
+        try:
+            if url.path == "/message-system" and method == "POST":
+                payload = self.exchange(headers.get(COMPUTER_ID_HEADER), body)
+            elif url.path == "/ping" and method in ("GET", "POST"):
+                payload = self.ping(url.query or body.decode("latin-1"))
+            else:
+                return HTTPStatus.NOT_FOUND, b""
+        except _BadRequest:
+            return HTTPStatus.BAD_REQUEST, b""
+
+        return HTTPStatus.OK, bpickle.dumps(payload)
+
+    def exchange(self, secure_id: Optional[str], body: bytes) -> dict:
+        """Handles a message exchange, registering the client if it sends a
+        registration.
+        """
+        try:
+            request, _ = bpickle.loads(body)
+            messages = request["messages"]
+        except (IndexError, KeyError, TypeError, ValueError):
+            raise _BadRequest()
+
+        client = self.clients.get(secure_id) if secure_id else None
+
+        if client is None:
+            registration = next(
+                (
+                    message
+                    for message in messages
+                    if isinstance(message, dict) and message.get("type") == "register"
+                ),
+                None,
+            )
+            if registration is None:
+                return {
+                    "server-uuid": self.server_uuid,
+                    "messages": [{"type": "unknown-id"}],
+                }
+
+            self.stats.registrations += 1
+            client = self.register(registration.get("computer_title", ""))
+
+            return {
+                "server-uuid": self.server_uuid,
+                "server-api": SERVER_API,
+                "messages": [
+                    {
+                        "type": "set-id",
+                        "id": client.secure_id.encode(),
+                        "insecure-id": client.insecure_id,
+                    }
+                ],
+                "next-expected-sequence": 0,
+            }
+
+        self.stats.exchanges += 1
+
+        # Messages are only accepted if they follow on from those already
+        # accepted. Otherwise the client resynchronizes from the
+        # next expected sequence.
+        if request.get("sequence") == client.next_seq:
+            client.next_seq += len(messages)
+            self.stats.messages += len(messages)
+
+        delivered, client.pending = client.pending, []
+        if self.faults.payload_size:
+            delivered.append(
+                {"type": "mock-payload", "data": b"x" * self.faults.payload_size}
+            )
+
+        return {
+            "server-uuid": self.server_uuid,
+            "server-api": SERVER_API,
+            "messages": delivered,
+            "next-expected-sequence": client.next_seq,
+            "next-exchange-token": b"%016x" % self.rng.getrandbits(64),
+        }
+
+    def ping(self, query: str) -> dict:
+        """Answers whether the client with the insecure ID in `query` has
+        messages waiting for it.
+        """
+        self.stats.pings += 1
+
+        try:
+            insecure_id = int(parse_qs(query)["insecure_id"][0])
+        except (KeyError, ValueError):
+            raise _BadRequest()
+
+        client = self.clients_by_insecure_id.get(insecure_id)
+
+        return {"messages": bool(client and client.pending)}
+
+
+async def _read_request(
+    reader: asyncio.StreamReader,
+) -> Tuple[str, str, Dict[str, str], bytes, bool]:
+    """Reads one request from `reader`.
+
+    Returns its method, target, headers, body, and whether the connection
+    may be reused after it.
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+
+    try:
+        method, target, version = request_line.split(" ")
+    except ValueError:
+        raise _BadRequest()
+
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == "HTTP/1.1"
+    connection = headers.get("connection", "").lower()
+    if connection == "close":
+        keep_alive = False
+    elif connection == "keep-alive":
+        keep_alive = True
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        size = 0
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            chunk_size = int(size_line.split(b";", 1)[0], 16)
+            if chunk_size == 0:
+                # Skip any trailers.
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                break
+
+            size += chunk_size
+            if size > MAX_BODY_SIZE:
+                raise _BadRequest()
+
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readexactly(2)
+
+        body = b"".join(chunks)
+    else:
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_SIZE:
+            raise _BadRequest()
+
+        body = await reader.readexactly(length)
+
+    return method, target, headers, body, keep_alive
+
+
+def _reason(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        # Not a standard status, so it has no reason phrase to give.
+        return ""
+
+
+def _error_page(status: int) -> bytes:
+    return f"<html><body><h1>{status} {_reason(status)}</h1></body></html>".encode()
+
+
+def _response(status: int, body: bytes, keep_alive: bool) -> bytes:
+    # Only successful responses carry a bpickled payload.
+    content_type = (
+        "application/octet-stream" if status == HTTPStatus.OK else "text/html"
+    )
+    head = [
+        f"HTTP/1.1 {status} {_reason(status)}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+    ]
+    if not keep_alive:
+        head.append("Connection: close")
+
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+
+@contextlib.contextmanager
+def running(
+    server: MockServer, host: str = "localhost", port: int = 0
+) -> Iterator[int]:
+    """Runs `server` on an event loop of its own, in a background thread,
+    while within it. Yields the port it is listening on.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield asyncio.run_coroutine_threadsafe(server.listen(host, port), loop).result()
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -0,0 +1,302 @@
+"""Pipelined HTTP/1.1 over persistent asyncio connections.
+
+Requests are written, pre-encoded, straight to the socket without waiting
+for earlier responses, and responses are parsed incrementally out of a
+single receive buffer as they arrive.
+"""
+
+import asyncio
+import collections
+import ssl
+from typing import Deque, List, Optional, Tuple
+
+from .asynchttp import HTTPProtocolError, HTTPResponse
+
+
+class ResponseParser:
+    """Incremental HTTP/1.1 response parser.
+
+    Bytes are passed to `feed` as they arrive, which returns every response
+    completed by them.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # Start of the first unparsed response in the buffer.
+        self._pos = 0
+        # (status, headers, body start, content length or None) of a
+        # response whose head has been parsed but whose body hasn't arrived.
+        self._head: Optional[Tuple[int, dict, int, Optional[int]]] = None
+        self.closing = False
+
+    def feed(self, data: bytes) -> List[HTTPResponse]:
+        self._buffer += data
+        responses = []
+
+        while True:
+            response = self._parse_one()
+            if response is None:
+                break
+
+            responses.append(response)
+
+        # Drop parsed responses once per feed rather than once per response.
+        if self._pos:
+            del self._buffer[: self._pos]
+            if self._head is not None:
+                status, headers, start, length = self._head
+                self._head = (status, headers, start - self._pos, length)
+            self._pos = 0
+
+        return responses
+
+    def eof(self) -> List[HTTPResponse]:
+        """Completes a response delimited by the connection closing."""
+        if self._head is None or self._head[3] is not None:
+            return []
+
+        status, headers, start, _ = self._head
+        self._head = None
+
+        return [HTTPResponse(status, headers, bytes(self._buffer[start:]))]
+
+    def _parse_one(self) -> Optional[HTTPResponse]:
+        buffer = self._buffer
+
+        if self._head is None:
+            end = buffer.find(b"\r\n\r\n", self._pos)
+            if end < 0:
+                return None
+
+            self._head = self._parse_head(bytes(buffer[self._pos : end]), end + 4)
+
+        status, headers, start, length = self._head
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            result = self._parse_chunked(start)
+            if result is None:
+                return None
+            body, consumed = result
+        elif length is None:
+            # Delimited by the connection closing; see `eof`.
+            return None
+        else:
+            consumed = start + length
+            if len(buffer) < consumed:
+                return None
+            body = bytes(buffer[start:consumed])
+
+        self._pos = consumed
+        self._head = None
+
+        return HTTPResponse(status, headers, body)
+
+    def _parse_head(self, head: bytes, start: int):
+        lines = head.split(b"\r\n")
+
+        try:
+            version, status, *_ = lines[0].split(b" ", 2)
+            status = int(status)
+        except ValueError:
+            raise HTTPProtocolError(f"Bad status line: {lines[0]!r}")
+
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower().decode("latin-1")] = value.strip().decode(
+                "latin-1"
+            )
+
+        if headers.get("connection", "").lower() == "close" or version == b"HTTP/1.0":
+            self.closing = True
+
+        if "content-length" in headers:
+            try:
+                length = int(headers["content-length"])
+            except ValueError:
+                length = -1
+            if length < 0:
+                raise HTTPProtocolError(
+                    f"Bad Content-Length: {headers['content-length']!r}"
+                )
+        elif status in (204, 304) or 100 <= status < 200:
+            length = 0
+        else:
+            length = None
+
+        return status, headers, start, length
+
+    def _parse_chunked(self, start: int) -> Optional[Tuple[bytes, int]]:
+        buffer = self._buffer
+        chunks = []
+        pos = start
+
+        while True:
+            line_end = buffer.find(b"\r\n", pos)
+            if line_end < 0:
+                return None
+
+            size_line = bytes(buffer[pos:line_end])
+            try:
+                size = int(size_line.split(b";", 1)[0], 16)
+            except ValueError:
+                size = -1
+            if size < 0:
+                raise HTTPProtocolError(f"Bad chunk size: {size_line!r}")
+            pos = line_end + 2
+
+            if size == 0:
+                trailer_end = buffer.find(b"\r\n\r\n", pos - 2)
+                if trailer_end < 0:
+                    return None
+                return b"".join(chunks), trailer_end + 4
+
+            if len(buffer) < pos + size + 2:
+                return None
+
+            chunks.append(bytes(buffer[pos : pos + size]))
+            pos += size + 2
+
+
+class PipelinedConnection(asyncio.Protocol):
+    """A single connection with up to `depth` requests in flight.
+
+    Responses arrive in request order, so each one resolves the oldest
+    waiting future.
+    """
+
+    def __init__(self, depth: int):
+        self.transport: Optional[asyncio.Transport] = None
+        self.closed = False
+
+        self._parser = ResponseParser()
+        self._waiting: Deque[asyncio.Future] = collections.deque()
+        self._slots = asyncio.Semaphore(depth)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        try:
+            self._resolve(self._parser.feed(data))
+        except HTTPProtocolError as err:
+            self._fail(err)
+            self.transport.close()
+            return
+
+        if self._parser.closing:
+            self.closed = True
+
+    def connection_lost(self, exc):
+        self.closed = True
+
+        try:
+            self._resolve(self._parser.eof())
+        except HTTPProtocolError:
+            # Nobody is left waiting to be told.
+            pass
+
+        self._fail(exc or ConnectionResetError("Connection closed by server"))
+
+    def _resolve(self, responses: List[HTTPResponse]):
+        """Passes each of `responses` to the oldest request waiting."""
+        for response in responses:
+            if not self._waiting:
+                # Such as a server's 408 before closing an idle connection.
+                raise HTTPProtocolError(
+                    f"Unsolicited response with status {response.status}"
+                )
+
+            future = self._waiting.popleft()
+            if not future.done():
+                future.set_result(response)
+
+    def _fail(self, exc: Exception):
+        self.closed = True
+
+        while self._waiting:
+            future = self._waiting.popleft()
+            if not future.done():
+                future.set_exception(exc)
+
+    async def send(self, request: bytes) -> HTTPResponse:
+        async with self._slots:
+            if self.closed:
+                raise ConnectionResetError("Connection closed by server")
+
+            future = asyncio.get_running_loop().create_future()
+            self._waiting.append(future)
+            self.transport.write(request)
+
+            return await future
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class PipelinedPool:
+    """Spreads requests to one host over `connections` pipelined
+    connections, reconnecting any that the server closes.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        connections: int = 1,
+        depth: int = 16,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.depth = depth
+        self.ssl_context = ssl_context
+
+        self._slots: List[Optional[asyncio.Task]] = [None] * connections
+        self._next = 0
+
+    async def _connect(self) -> PipelinedConnection:
+        loop = asyncio.get_running_loop()
+        _, protocol = await loop.create_connection(
+            lambda: PipelinedConnection(self.depth),
+            self.host,
+            self.port,
+            ssl=self.ssl_context,
+        )
+
+        return protocol
+
+    async def _connection(self) -> PipelinedConnection:
+        slot = self._next
+        self._next = (slot + 1) % len(self._slots)
+
+        task = self._slots[slot]
+        if task is None or (
+            task.done()
+            and (task.cancelled() or task.exception() or task.result().closed)
+        ):
+            task = self._slots[slot] = asyncio.ensure_future(self._connect())
+
+        # Other requests may be waiting on the same connection attempt, so
+        # a timeout in this one mustn't cancel it.
+        return await asyncio.shield(task)
+
+    async def send(self, request: bytes) -> HTTPResponse:
+        """Sends a complete, pre-encoded HTTP/1.1 `request` and waits for
+        its response.
+        """
+        connection = await self._connection()
+
+        return await connection.send(request)
+
+    def close(self):
+        for task in self._slots:
+            if task is None:
+                continue
+            if task.done() and not task.cancelled() and not task.exception():
+                task.result().close()
+            else:
+                task.cancel()
+
+        self._slots = [None] * len(self._slots)
@@ -0,0 +1,138 @@
+"""Target-rate schedules for open-loop load generation."""
+
+import bisect
+from typing import Iterator, List, Sequence, Tuple
+
+
+class RateSchedule:
+    """A target rate, in requests per second, as a function of elapsed
+    time.
+
+    The schedule is a list of `(seconds, rate)` points with the rate
+    linearly interpolated between them. Two points at the same time make a
+    step. Before the first point the first rate applies, and after the last
+    point the last rate is held.
+    """
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        if not points:
+            raise ValueError("A rate schedule needs at least one point")
+
+        points = sorted(points, key=lambda point: point[0])
+        for seconds, rate in points:
+            if seconds < 0 or rate < 0:
+                raise ValueError(f"Invalid schedule point: {seconds} {rate}")
+
+        self.points: List[Tuple[float, float]] = points
+        self._times = [seconds for seconds, _ in points]
+
+    @classmethod
+    def constant(cls, rate: float) -> "RateSchedule":
+        return cls([(0.0, rate)])
+
+    @classmethod
+    def linear(cls, start: float, end: float, seconds: float) -> "RateSchedule":
+        return cls([(0.0, start), (seconds, end)])
+
+    @classmethod
+    def steps(cls, rates: Sequence[float], seconds: float) -> "RateSchedule":
+        """Holds each of `rates` in turn for `seconds`."""
+        points = []
+        for i, rate in enumerate(rates):
+            points.append((i * seconds, rate))
+            points.append(((i + 1) * seconds, rate))
+
+        return cls(points)
+
+    @property
+    def duration(self) -> float:
+        """Seconds until the last point of the schedule."""
+        return self._times[-1]
+
+    def rate_at(self, seconds: float) -> float:
+        index = bisect.bisect_right(self._times, seconds)
+
+        if index == 0:
+            return self.points[0][1]
+        if index == len(self.points):
+            return self.points[-1][1]
+
+        start_time, start_rate = self.points[index - 1]
+        end_time, end_rate = self.points[index]
+
+        fraction = (seconds - start_time) / (end_time - start_time)
+        return start_rate + (end_rate - start_rate) * fraction
+
+    def scaled(self, factor: float) -> "RateSchedule":
+        """Returns this schedule with every rate multiplied by `factor`."""
+        return RateSchedule([(t, rate * factor) for t, rate in self.points])
+
+    def send_times(self, idle_step: float = 0.01) -> Iterator[float]:
+        """Yields the intended send time, in seconds from the start, of
+        every request in the schedule.
+
+        While the target rate is zero, time advances in `idle_step`
+        increments until it isn't.
+        """
+        seconds = 0.0
+
+        while True:
+            rate = self.rate_at(seconds)
+
+            if rate <= 0:
+                if seconds >= self.duration:
+                    return
+                seconds += idle_step
+                continue
+
+            yield seconds
+            seconds += 1 / rate
+
+
+def parse_schedule(spec: str) -> RateSchedule:
+    """Parses a `--ramp` specification.
+
+    Supported forms are:
+
+    - `linear:START:END:SECONDS`, ramping from START to END pings/s
+    - `step:RATE[,RATE...]:SECONDS`, holding each RATE for SECONDS
+    - `file:PATH`, reading `SECONDS RATE` lines from PATH. Blank lines and
+      lines starting with '#' are ignored.
+    """
+    kind, _, rest = spec.partition(":")
+
+    try:
+        if kind == "linear":
+            start, end, seconds = rest.split(":")
+            return RateSchedule.linear(float(start), float(end), float(seconds))
+
+        if kind == "step":
+            rates, seconds = rest.split(":")
+            return RateSchedule.steps(
+                [float(rate) for rate in rates.split(",")], float(seconds)
+            )
+    except ValueError:
+        raise ValueError(f"Invalid {kind} ramp: '{spec}'")
+
+    if kind == "file":
+        return _read_schedule(rest)
+
+    raise ValueError(f"Unknown ramp type '{kind}'. Use linear, step or file.")
+
+
+def _read_schedule(path: str) -> RateSchedule:
+    points = []
+
+    with open(path) as schedule_fp:
+        for lineno, line in enumerate(schedule_fp, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            try:
+                seconds, rate = line.split()
+                points.append((float(seconds), float(rate)))
+            except ValueError:
+                raise ValueError(f"{path}:{lineno}: expected 'SECONDS RATE'")
+
+    return RateSchedule(points)
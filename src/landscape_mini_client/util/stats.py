@@ -0,0 +1,254 @@
+"""Helpers for aggregating load-generation statistics."""
+
+import collections
+import time
+from typing import Counter, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class RateSample(NamedTuple):
+    total: int
+    instant: float
+    windowed: float
+    average: float
+
+    def describe(self, unit: str = "pings") -> str:
+        return (
+            f"{self.instant:.0f} {unit}/s now, {self.windowed:.0f} {unit}/s "
+            f"windowed, {self.average:.0f} {unit}/s average. "
+            f"{self.total} {unit} sent."
+        )
+
+
+class RateTracker:
+    """Derives rates from periodic samples of a monotonically increasing
+    total.
+
+    `instant` is the rate since the previous sample, `windowed` is the rate
+    over roughly the last `window` seconds and `average` is the rate since
+    the tracker was created.
+    """
+
+    def __init__(self, window: float = 10.0, now: Optional[float] = None):
+        self.window = window
+
+        start = time.monotonic() if now is None else now
+        self._start = start
+        self._samples = collections.deque([(start, 0)])
+
+    def sample(self, total: int, now: Optional[float] = None) -> RateSample:
+        now = time.monotonic() if now is None else now
+
+        last_time, last_total = self._samples[-1]
+        self._samples.append((now, total))
+
+        # Keep one sample at or beyond the window edge to measure from.
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+        first_time, first_total = self._samples[0]
+
+        return RateSample(
+            total=total,
+            instant=_rate(total - last_total, now - last_time),
+            windowed=_rate(total - first_total, now - first_time),
+            average=_rate(total, now - self._start),
+        )
+
+
+def _rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+
+class LatencyHistogram:
+    """A log-bucketed histogram of latencies.
+
+    Latencies are recorded in whole microseconds. Values below
+    2**SUB_BUCKET_BITS are kept exactly; above that every power of two is
+    split into 2**(SUB_BUCKET_BITS - 1) buckets, so reported values are
+    within about 3% of the recorded ones and the number of buckets grows
+    only with the logarithm of the largest latency. Histograms merge by
+    adding bucket counts, so per-worker histograms can be combined.
+    """
+
+    SUB_BUCKET_BITS = 6
+
+    def __init__(self):
+        self.counts: Counter[int] = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        micros = max(int(seconds * 1_000_000), 0)
+
+        self.counts[self._index(micros)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.min = seconds if self.min is None else min(self.min, seconds)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        """Returns the latency, in seconds, at `percentile` (0-100)."""
+        if not self.count:
+            return 0.0
+
+        rank = max(percentile / 100 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+
+        return self.max
+
+    def buckets(self) -> Iterator[Tuple[float, int]]:
+        """Yields the midpoint, in seconds, and count of each bucket holding
+        any latencies, in order.
+        """
+        for index in sorted(self.counts):
+            yield min(self._value(index), self.max), self.counts[index]
+
+    def percentiles(self, percentiles: Iterable[float] = PERCENTILES):
+        return {p: self.percentile(p) for p in percentiles}
+
+    def summary(self) -> Dict[str, float]:
+        """Returns the mean, extremes and percentiles in milliseconds."""
+        summary = {
+            "mean": self.mean * 1000,
+            "min": (self.min or 0.0) * 1000,
+            "max": self.max * 1000,
+        }
+        for p, value in self.percentiles().items():
+            summary[f"p{p:g}"] = value * 1000
+
+        return summary
+
+    def describe(self) -> str:
+        parts = [
+            f"p{p:g}={value * 1000:.1f}ms" for p, value in self.percentiles().items()
+        ]
+        return " ".join(parts)
+
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        shift = micros.bit_length() - cls.SUB_BUCKET_BITS
+        if shift <= 0:
+            return micros
+
+        return (shift << (cls.SUB_BUCKET_BITS - 1)) + (micros >> shift)
+
+    @classmethod
+    def _value(cls, index: int) -> float:
+        """Returns the midpoint, in seconds, of the bucket at `index`."""
+        half = 1 << (cls.SUB_BUCKET_BITS - 1)
+        if index < 2 * half:
+            return index / 1_000_000
+
+        shift = (index >> (cls.SUB_BUCKET_BITS - 1)) - 1
+        mantissa = index - (shift << (cls.SUB_BUCKET_BITS - 1))
+
+        return ((mantissa << shift) + (1 << (shift - 1))) / 1_000_000
+
+
+class PingStats:
+    """Latencies and outcomes of pings, broken down by server.
+
+    An outcome is the response's status code, or the name of the exception
+    class raised while sending the ping. `lag` holds how late each ping was
+    sent relative to its schedule, when there is one.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, LatencyHistogram] = {}
+        self.outcomes: Counter[Tuple[str, str]] = collections.Counter()
+        self.lag = LatencyHistogram()
+
+    def record(self, server: str, outcome: str, latency: float) -> None:
+        histogram = self.latencies.get(server)
+        if histogram is None:
+            histogram = self.latencies[server] = LatencyHistogram()
+
+        histogram.record(latency)
+        self.outcomes[(server, outcome)] += 1
+
+    def merge(self, other: "PingStats") -> None:
+        for server, histogram in other.latencies.items():
+            self.latencies.setdefault(server, LatencyHistogram()).merge(histogram)
+
+        self.outcomes.update(other.outcomes)
+        self.lag.merge(other.lag)
+
+    @property
+    def count(self) -> int:
+        return sum(self.outcomes.values())
+
+    def __bool__(self) -> bool:
+        return bool(self.outcomes)
+
+    def latency(self) -> LatencyHistogram:
+        """Returns the latencies of all servers merged together."""
+        merged = LatencyHistogram()
+        for histogram in self.latencies.values():
+            merged.merge(histogram)
+
+        return merged
+
+    def outcomes_by_server(self) -> Dict[str, Dict[str, int]]:
+        by_server: Dict[str, Dict[str, int]] = {}
+        for (server, outcome), count in sorted(self.outcomes.items()):
+            by_server.setdefault(server, {})[outcome] = count
+
+        return by_server
+
+    def summary(self, elapsed: float) -> dict:
+        """Returns a JSON-serializable summary of a run lasting `elapsed`
+        seconds, overall and per server.
+
+        Any outcome other than a 2xx status code counts as an error.
+        """
+        by_server = self.outcomes_by_server()
+        totals: Counter[str] = collections.Counter()
+        for outcomes in by_server.values():
+            totals.update(outcomes)
+
+        summary = _summarize(self.latency(), totals, elapsed)
+        summary["duration"] = elapsed
+        if self.lag.count:
+            summary["schedule_lag_ms"] = self.lag.summary()
+
+        summary["servers"] = {
+            server: _summarize(self.latencies[server], outcomes, elapsed)
+            for server, outcomes in by_server.items()
+        }
+
+        return summary
+
+
+def _summarize(
+    latency: LatencyHistogram, outcomes: Dict[str, int], elapsed: float
+) -> dict:
+    pings = sum(outcomes.values())
+    successes = sum(n for outcome, n in outcomes.items() if outcome.startswith("2"))
+
+    return {
+        "pings": pings,
+        "throughput": _rate(pings, elapsed),
+        "errors": pings - successes,
+        "latency_ms": latency.summary(),
+        "outcomes": dict(outcomes),
+    }
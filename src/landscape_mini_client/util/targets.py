@@ -0,0 +1,114 @@
+"""Precomputed ping targets for load generation."""
+
+import itertools
+import math
+import random
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+
+PING_PATH = "/ping?insecure_id="
+
+
+class TargetTable:
+    """Ping URLs and encoded request lines for every server and insecure ID,
+    prepared once so that sending a ping only has to join two pieces.
+
+    Targets are picked by index, with servers weighted by `weights` (all
+    equal by default) and insecure IDs picked uniformly.
+    """
+
+    def __init__(
+        self,
+        servers: Sequence[str],
+        insecure_ids: Sequence[str],
+        weights: Optional[Sequence[float]] = None,
+    ):
+        if not servers or not insecure_ids:
+            raise ValueError("At least one server and insecure ID are required")
+        if weights is not None and len(weights) != len(servers):
+            raise ValueError("Each server needs exactly one weight")
+
+        self.servers = list(servers)
+        self.insecure_ids = list(insecure_ids)
+        self.weights = list(weights) if weights is not None else None
+
+        self.url_prefixes = [f"http://{server}{PING_PATH}" for server in servers]
+        self.encoded_ids = [insecure_id.encode() for insecure_id in insecure_ids]
+        self._request_prefix = f"GET {PING_PATH}".encode()
+        self._request_suffixes = [
+            f" HTTP/1.1\r\nHost: {server}\r\n\r\n".encode() for server in servers
+        ]
+
+    def url(self, server_index: int, id_index: int) -> str:
+        return self.url_prefixes[server_index] + self.insecure_ids[id_index]
+
+    def request(self, server_index: int, id_index: int) -> bytes:
+        """Returns the encoded HTTP/1.1 ping request for a target."""
+        return b"".join(
+            (
+                self._request_prefix,
+                self.encoded_ids[id_index],
+                self._request_suffixes[server_index],
+            )
+        )
+
+    def picker(
+        self, seed: Union[int, str, None] = None, batch_size: int = 4096
+    ) -> Iterator[Tuple[int, int]]:
+        """Yields `(server_index, id_index)` pairs forever.
+
+        Indices are drawn `batch_size` at a time, and the same `seed` always
+        yields the same sequence.
+        """
+        rng = random.Random(seed)
+        server_indices = range(len(self.servers))
+        id_indices = range(len(self.insecure_ids))
+        cum_weights = list(itertools.accumulate(self.weights)) if self.weights else None
+
+        while True:
+            if len(self.servers) == 1:
+                servers = itertools.repeat(0, batch_size)
+            else:
+                servers = rng.choices(
+                    server_indices, cum_weights=cum_weights, k=batch_size
+                )
+            ids = rng.choices(id_indices, k=batch_size)
+
+            yield from zip(servers, ids)
+
+
+def parse_servers(lines: Sequence[str]) -> Tuple[List[str], Optional[List[float]]]:
+    """Parses lines of `HOST[:PORT] [WEIGHT]`.
+
+    Blank lines and lines starting with '#' are skipped. Returns the
+    servers and their weights, or None for the weights if none were given.
+    """
+    servers = []
+    weights = []
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        server, _, weight = line.partition(" ")
+        servers.append(server)
+        try:
+            value = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            value = math.nan
+        # Anything else would leave the pickers nothing, or nonsense, to
+        # choose by.
+        if not (math.isfinite(value) and value > 0):
+            raise ValueError(f"Invalid weight for server {server}: '{weight}'")
+        weights.append(value)
+
+    if all(weight == 1.0 for weight in weights):
+        return servers, None
+
+    return servers, weights
+
+
+def parse_insecure_ids(lines: Sequence[str]) -> List[str]:
+    """Parses line-separated insecure IDs, skipping blank lines."""
+    return [line.strip() for line in lines if line.strip()]
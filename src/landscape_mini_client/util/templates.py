@@ -0,0 +1,110 @@
+"""Pre-encoded message templates for messages sent over and over.
+
+A template is a message with a `Slot` in place of each value that changes
+from one send to the next. It is encoded once, and rendering it only
+encodes the slot values and joins them with the cached fragments.
+"""
+
+import collections
+import re
+import uuid
+from typing import Any, Callable, Dict, Hashable, List
+
+from . import bpickle
+
+
+# Marks slot values apart from any real string in a message.
+_SLOT_TOKEN = uuid.uuid4().hex
+_SLOT_PATTERN = re.compile(rb"u\d+:\x00" + _SLOT_TOKEN.encode() + rb"([^\x00]*)\x00")
+
+
+class Slot(str):
+    """Placeholder for the value called `name` in a template.
+
+    Slots are strings, so a template is encoded like any other message.
+    """
+
+    def __new__(cls, name: str) -> "Slot":
+        if "\x00" in name:
+            raise ValueError(f"Invalid slot name: {name!r}")
+
+        slot = super().__new__(cls, f"\x00{_SLOT_TOKEN}{name}\x00")
+        slot.name = name
+
+        return slot
+
+
+class MessageTemplate:
+    """A message encoded once, with its slots filled in by `render`."""
+
+    def __init__(self, message: Any):
+        parts = _SLOT_PATTERN.split(bpickle.dumps(message))
+
+        # Encoded fragments either side of each slot, in order.
+        self.fragments: List[bytes] = parts[::2]
+        self.slots: List[str] = [name.decode() for name in parts[1::2]]
+
+    def render(self, **values: Any) -> bytes:
+        """Returns the encoded message with each slot replaced by the
+        keyword argument of the same name.
+        """
+        fragments = self.fragments
+        parts = [fragments[0]]
+
+        for name, fragment in zip(self.slots, fragments[1:]):
+            try:
+                value = values[name]
+            except KeyError:
+                raise ValueError(f"No value given for template slot '{name}'")
+
+            parts.append(bpickle.dumps(value))
+            parts.append(fragment)
+
+        return b"".join(parts)
+
+
+class TemplateCache:
+    """Least-recently-used cache of up to `maxsize` templates.
+
+    Templates are keyed by message shape: any hashable value that
+    identifies a message's unchanging parts, such as its type and the
+    values of its fixed fields.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._templates: Dict[Hashable, MessageTemplate] = collections.OrderedDict()
+
+    def get(self, shape: Hashable, build: Callable[[], Any]) -> MessageTemplate:
+        """Returns the template for `shape`, creating it from the message
+        returned by `build` if it isn't cached.
+        """
+        templates = self._templates
+
+        try:
+            template = templates[shape]
+        except KeyError:
+            self.misses += 1
+        else:
+            self.hits += 1
+            templates.move_to_end(shape)
+
+            return template
+
+        template = templates[shape] = MessageTemplate(build())
+        if len(templates) > self.maxsize:
+            templates.popitem(last=False)
+
+        return template
+
+    def render(self, shape: Hashable, build: Callable[[], Any], **values) -> bytes:
+        return self.get(shape, build).render(**values)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def clear(self):
+        self._templates.clear()